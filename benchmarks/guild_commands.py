@@ -0,0 +1,392 @@
+"""Latency, allocations and event loop blocking of Utility and Moderation commands on synthetic guilds.
+
+Builds real discord.py ``Guild`` state of the requested sizes, then calls
+the command callbacks directly with a mocked ``Interaction`` and a fake
+HTTP client, so only the bot's own work is measured. For every command
+it reports the first (cold) call, the median of the warm calls, the
+longest stretch the event loop was blocked, and the peak memory a warm
+call allocated. Run from the repository root:
+
+    python -m benchmarks.guild_commands [--members 1000 10000 100000] [--repeat 5]
+
+``--save-baseline`` stores the results; later runs compare against them
+and exit with status 1 if a command got slower or allocates more than
+``--tolerance`` allows. 500k member guilds need several GiB of memory.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import discord
+
+from cogs.Moderation.plugin import Moderate
+from cogs.Utility.plugin import Utility
+from core import Bot
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "guild_commands.json")
+
+GUILD_ID = 1 << 40
+OWNER_ID = GUILD_ID + 1
+MODERATOR_ID = GUILD_ID + 2
+BOT_ID = GUILD_ID + 3
+FIRST_MEMBER_ID = GUILD_ID + 1000
+# Role ids are offsets from the guild id, channels and emojis live further out.
+ADMIN_ROLE = GUILD_ID + 1
+BIG_ROLE = GUILD_ID + 2
+SMALL_ROLE = GUILD_ID + 3
+FIRST_CHANNEL_ID = 2 << 40
+FIRST_EMOJI_ID = 3 << 40
+
+# Absolute slack under which a difference from the baseline is noise.
+NOISE_SECONDS = 0.0005
+NOISE_BYTES = 64 * 1024
+
+
+class FakeHTTP:
+    """The HTTP routes the benchmarked commands reach, answering instantly."""
+
+    async def kick(self, user_id: int, guild_id: int, reason: Optional[str] = None) -> None:
+        await asyncio.sleep(0)
+
+    async def ban(self, user_id: int, guild_id: int, *args: Any, **kwargs: Any) -> None:
+        await asyncio.sleep(0)
+
+    async def bulk_ban(self, guild_id: int, user_ids: List[int], *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        await asyncio.sleep(0)
+        return {"banned_users": [str(i) for i in user_ids], "failed_users": []}
+
+    async def edit_member(self, guild_id: int, user_id: int, **fields: Any) -> Dict[str, Any]:
+        await asyncio.sleep(0)
+        return member_payload(user_id, [], datetime.now(timezone.utc))
+
+
+class FakeMessage:
+    async def edit(self, **kwargs: Any) -> "FakeMessage":
+        await asyncio.sleep(0)
+        return self
+
+
+class FakeResponse:
+    def __init__(self) -> None:
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, *args: Any, **kwargs: Any) -> None:
+        self._done = True
+        await asyncio.sleep(0)
+
+    async def defer(self, **kwargs: Any) -> None:
+        self._done = True
+        await asyncio.sleep(0)
+
+
+class FakeFollowup:
+    async def send(self, *args: Any, **kwargs: Any) -> FakeMessage:
+        await asyncio.sleep(0)
+        return FakeMessage()
+
+
+class FakeInteraction:
+    """Just enough of :class:`discord.Interaction` for command callbacks."""
+
+    def __init__(self, bot: Bot, guild: discord.Guild, channel: discord.abc.GuildChannel) -> None:
+        self.client = bot
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = channel
+        self.user = guild.get_member(MODERATOR_ID)
+        self.extras: Dict[str, Any] = {}
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+    async def original_response(self) -> FakeMessage:
+        return FakeMessage()
+
+
+def user_payload(user_id: int, bot: bool = False) -> Dict[str, Any]:
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id % 1_000_000}",
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": None,
+        "bot": bot
+    }
+
+
+def member_payload(user_id: int, roles: List[int], joined: datetime, bot: bool = False) -> Dict[str, Any]:
+    return {
+        "user": user_payload(user_id, bot),
+        "roles": [str(r) for r in roles],
+        "joined_at": joined.isoformat(),
+        "deaf": False,
+        "mute": False,
+        "flags": 0
+    }
+
+
+def role_payload(role_id: int, name: str, position: int, permissions: int = 0) -> Dict[str, Any]:
+    return {
+        "id": str(role_id),
+        "name": name,
+        "position": position,
+        "permissions": str(permissions),
+        "color": 0,
+        "hoist": False,
+        "managed": False,
+        "mentionable": False
+    }
+
+
+def guild_payload(members: int, roles: int, channels: int, emojis: int, rng: random.Random) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    admin = discord.Permissions.all().value
+    role_ids = [GUILD_ID + 10 + i for i in range(roles)]
+    categories = [FIRST_CHANNEL_ID + i for i in range(max(channels // 50, 1))]
+
+    def member_data() -> Iterator[Dict[str, Any]]:
+        yield member_payload(OWNER_ID, [ADMIN_ROLE], now - timedelta(days=1000))
+        yield member_payload(MODERATOR_ID, [ADMIN_ROLE], now - timedelta(days=500))
+        yield member_payload(BOT_ID, [ADMIN_ROLE], now - timedelta(days=500), bot=True)
+        for i in range(members):
+            assigned = rng.sample(role_ids, k=min(rng.randint(0, 3), len(role_ids)))
+            if rng.random() < 0.5:
+                assigned.append(BIG_ROLE)
+            if rng.random() < 0.001:
+                assigned.append(SMALL_ROLE)
+            joined = now - timedelta(seconds=rng.random() * 365 * 86400)
+            yield member_payload(FIRST_MEMBER_ID + i, assigned, joined, bot=rng.random() < 0.02)
+
+    def presence_data() -> Iterator[Dict[str, Any]]:
+        for i in range(members):
+            status = rng.choice(("online", "idle", "dnd", "offline", "offline", "offline"))
+            if status != "offline":
+                yield {
+                    "user": {"id": str(FIRST_MEMBER_ID + i)},
+                    "status": status,
+                    "activities": [],
+                    "client_status": {"desktop": status}
+                }
+
+    channel_data = [
+        {"id": str(channel_id), "type": 4, "name": f"category-{i}", "position": i, "permission_overwrites": []}
+        for i, channel_id in enumerate(categories)
+    ]
+    for i in range(channels):
+        channel_data.append({
+            "id": str(FIRST_CHANNEL_ID + len(categories) + i),
+            "type": 2 if i % 10 == 9 else 0,
+            "name": f"channel-{i}",
+            "position": i,
+            "parent_id": str(categories[i % len(categories)]),
+            "permission_overwrites": [],
+            "topic": None,
+            "nsfw": False,
+            "bitrate": 64000,
+            "user_limit": 0
+        })
+
+    return {
+        "id": str(GUILD_ID),
+        "name": f"Benchmark {members}",
+        "owner_id": str(OWNER_ID),
+        "member_count": members + 3,
+        "features": ["COMMUNITY", "NEWS"],
+        "roles": [
+            role_payload(GUILD_ID, "@everyone", 0),
+            role_payload(ADMIN_ROLE, "Admin", roles + 3, admin),
+            role_payload(BIG_ROLE, "Member", 2),
+            role_payload(SMALL_ROLE, "Muted", 1),
+            *(role_payload(role_id, f"role-{i}", 3 + i) for i, role_id in enumerate(role_ids))
+        ],
+        "channels": channel_data,
+        "emojis": [
+            {"id": str(FIRST_EMOJI_ID + i), "name": f"emoji_{i}", "animated": False, "available": True, "roles": []}
+            for i in range(emojis)
+        ],
+        # Generators keep the payload of a 500k member guild out of memory.
+        "members": member_data(),
+        "presences": presence_data()
+    }
+
+
+class Result(NamedTuple):
+    cold: float
+    warm: float
+    blocking: float
+    peak: int
+
+
+class BlockingProbe:
+    """Longest time the event loop went without running a ``sleep(0)`` heartbeat."""
+
+    def __init__(self) -> None:
+        self.longest = 0.0
+        self._task: Optional[asyncio.Task[None]] = None
+
+    async def _run(self) -> None:
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            self.longest = max(self.longest, now - last)
+            last = now
+
+    async def __aenter__(self) -> "BlockingProbe":
+        self._task = asyncio.create_task(self._run())
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        assert self._task is not None
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+Case = Tuple[str, Callable[[FakeInteraction], Awaitable[Any]]]
+
+
+def cases(bot: Bot, guild: discord.Guild) -> List[Case]:
+    utility = Utility(bot)
+    moderation = Moderate(bot)
+    big_role = guild.get_role(BIG_ROLE)
+    small_role = guild.get_role(SMALL_ROLE)
+    member = guild.get_member(FIRST_MEMBER_ID)
+    channel = next(c for c in guild.text_channels)
+
+    def call(cog: Any, command: discord.app_commands.Command, *args: Any) -> Callable[[FakeInteraction], Awaitable[Any]]:
+        return lambda interaction: command.callback(cog, interaction, *args)
+
+    return [
+        ("serverinfo", call(utility, Utility.serverinfo)),
+        ("userinfo", call(utility, Utility.userinfo, member)),
+        ("roleinfo", call(utility, Utility.role_info_command, big_role)),
+        ("channelinfo", call(utility, Utility.channel_info_command, channel)),
+        ("serverroles", call(utility, Utility.server_roles_command)),
+        ("channels", call(utility, Utility.server_channels_command)),
+        ("emojis", call(utility, Utility.server_emojis_command)),
+        ("serverchannelsbytype", call(utility, Utility.server_channels_by_type_command)),
+        ("serverfeatures", call(utility, Utility.server_features_command)),
+        ("membercount", call(utility, Utility.member_count_command, big_role)),
+        ("memberlist", call(utility, Utility.member_list_command, big_role)),
+        ("membercountbystatus", call(utility, Utility.member_count_by_status_command, "online")),
+        ("memberjoined", call(utility, Utility.member_joined_command, member)),
+        ("masskick small role", call(moderation, Moderate.mass_kick_command, None, small_role, None, None)),
+        ("massban joined 1h", call(moderation, Moderate.mass_ban_command, None, None, "1h", None)),
+        ("masstimeout big role", call(moderation, Moderate.mass_timeout_command, None, big_role, None, None, None))
+    ]
+
+
+async def measure(
+    bot: Bot,
+    guild: discord.Guild,
+    run: Callable[[FakeInteraction], Awaitable[Any]],
+    repeat: int
+) -> Result:
+    channel = guild.text_channels[0]
+    timings: List[float] = []
+    longest = 0.0
+    for _ in range(repeat + 1):
+        async with BlockingProbe() as probe:
+            started = time.perf_counter()
+            await run(FakeInteraction(bot, guild, channel))
+            timings.append(time.perf_counter() - started)
+        longest = max(longest, probe.longest)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    await run(FakeInteraction(bot, guild, channel))
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return Result(timings[0], statistics.median(timings[1:]), longest, peak)
+
+
+async def run_size(members: int, args: argparse.Namespace) -> Dict[str, Result]:
+    bot = Bot(database=":memory:")
+    state = bot._connection
+    state.http = FakeHTTP()  # type: ignore
+    state.user = discord.ClientUser(state=state, data=user_payload(BOT_ID, bot=True))  # type: ignore
+
+    started = time.perf_counter()
+    guild = discord.Guild(
+        data=guild_payload(members, args.roles, args.channels, args.emojis, random.Random(members)),  # type: ignore
+        state=state
+    )
+    state._add_guild(guild)
+    print(f"\n{members} members, {len(guild.roles)} roles, {len(guild.channels)} channels, "
+          f"{len(guild.emojis)} emojis (built in {time.perf_counter() - started:.1f}s)")
+    print(f"{'command':<24}{'cold':>10}{'warm':>10}{'blocking':>10}{'peak':>10}")
+
+    results: Dict[str, Result] = {}
+    for name, run in cases(bot, guild):
+        result = results[name] = await measure(bot, guild, run, args.repeat)
+        print(f"{name:<24}{result.cold * 1000:>8.2f}ms{result.warm * 1000:>8.2f}ms"
+              f"{result.blocking * 1000:>8.2f}ms{result.peak / 1024:>7.0f}KiB")
+
+    await bot.db.close()
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Result]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions: List[str] = []
+    for size, commands in results.items():
+        for name, result in commands.items():
+            old = baseline.get(size, {}).get(name)
+            if old is None:
+                continue
+            for field, noise in (("warm", NOISE_SECONDS), ("blocking", NOISE_SECONDS), ("peak", NOISE_BYTES)):
+                now, then = getattr(result, field), old[field]
+                if now > then * (1 + tolerance) and now - then > noise:
+                    regressions.append(f"{size} members, {name}: {field} {then:.6g} -> {now:.6g}")
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    results = {str(members): await run_size(members, args) for members in args.members}
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({size: {name: r._asdict() for name, r in commands.items()} for size, commands in results.items()},
+                      f, indent=2)
+        print(f"\nbaseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nno baseline at {args.baseline}, run with --save-baseline to record one")
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regressions over {args.tolerance:.0%}:")
+        print("\n".join(f"  {line}" for line in regressions))
+        return 1
+    print(f"\nno regressions over {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--roles", type=int, default=2000)
+    parser.add_argument("--channels", type=int, default=1000)
+    parser.add_argument("--emojis", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    sys.exit(asyncio.run(main(parser.parse_args())))
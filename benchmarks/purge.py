@@ -0,0 +1,199 @@
+"""Messages deleted per second by the purge engine against a mock Discord HTTP API.
+
+The mock serves channel history and the bulk and single delete routes with
+a fixed latency, and enforces a per-route rate limit by answering 429 with
+Retry-After the way Discord does. Run from the repository root:
+
+    python -m benchmarks.purge [--recent 3000] [--old 100]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+import discord
+from aiohttp import web
+
+from cogs.Moderation.purge import PurgeEngine, PurgeFilter, PurgeJob
+
+
+class Bucket:
+    def __init__(self, rate: int, per: float) -> None:
+        self.rate = rate
+        self.per = per
+        self.window = 0.0
+        self.used = 0
+
+    def retry_after(self) -> float:
+        now = time.monotonic()
+        if now - self.window >= self.per:
+            self.window, self.used = now, 0
+        if self.used < self.rate:
+            self.used += 1
+            return 0.0
+        return self.per - (now - self.window)
+
+
+class MockDiscord:
+    def __init__(self, recent: int, old: int, latency: float) -> None:
+        self.latency = latency
+        self.buckets = {"bulk": Bucket(1, 1.0), "delete": Bucket(5, 1.0)}
+        now = datetime.now(timezone.utc)
+        self.messages: Dict[int, Dict[str, Any]] = {}
+        total = recent + old
+        for i in range(total):
+            created = now - (timedelta(days=30) if i < old else timedelta(seconds=total - i))
+            message_id = discord.utils.time_snowflake(created) + i
+            self.messages[message_id] = {
+                "id": message_id,
+                "created_at": created,
+                "bot": random.random() < 0.5,
+                "content": f"message {i}"
+            }
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/channels/1/messages", self.history)
+        app.router.add_post("/channels/1/messages/bulk-delete", self.bulk_delete)
+        app.router.add_delete("/channels/1/messages/{id}", self.delete)
+        return app
+
+    async def _limited(self, route: str) -> Optional[web.Response]:
+        await asyncio.sleep(self.latency)
+        retry_after = self.buckets[route].retry_after()
+        if retry_after:
+            return web.json_response(
+                {"retry_after": retry_after}, status=429, headers={"Retry-After": f"{retry_after:.3f}"}
+            )
+        return None
+
+    async def history(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.latency)
+        before = int(request.query.get("before", 2 ** 63))
+        limit = int(request.query.get("limit", 100))
+        ids = sorted((i for i in self.messages if i < before), reverse=True)[:limit]
+        return web.json_response([
+            {**self.messages[i], "created_at": self.messages[i]["created_at"].isoformat()} for i in ids
+        ])
+
+    async def bulk_delete(self, request: web.Request) -> web.Response:
+        limited = await self._limited("bulk")
+        if limited:
+            return limited
+        for message_id in (await request.json())["messages"]:
+            self.messages.pop(int(message_id), None)
+        return web.Response(status=204)
+
+    async def delete(self, request: web.Request) -> web.Response:
+        limited = await self._limited("delete")
+        if limited:
+            return limited
+        if self.messages.pop(int(request.match_info["id"]), None) is None:
+            return web.Response(status=404)
+        return web.Response(status=204)
+
+
+class Client:
+    """The slice of discord.py's channel and message API the engine uses, over the mock."""
+
+    def __init__(self, session: aiohttp.ClientSession, base: str) -> None:
+        self.session = session
+        self.base = base
+
+    async def request(self, method: str, path: str, **kwargs: Any) -> Any:
+        while True:
+            async with self.session.request(method, self.base + path, **kwargs) as response:
+                if response.status == 429:
+                    await asyncio.sleep(float(response.headers["Retry-After"]))
+                    continue
+                if response.status == 404:
+                    raise discord.NotFound(response, "Unknown Message")
+                if response.status == 200:
+                    return await response.json()
+                return None
+
+    async def history(self, *, limit: Optional[int], before: Any = None, after: Any = None,
+                      oldest_first: bool = False) -> AsyncIterator[Any]:
+        cursor = before.id if before is not None else None
+        remaining = limit
+        while remaining is None or remaining > 0:
+            params = {"limit": str(min(100, remaining or 100))}
+            if cursor:
+                params["before"] = str(cursor)
+            page = await self.request("GET", "/channels/1/messages", params=params)
+            if not page:
+                return
+            for data in page:
+                cursor = data["id"]
+                yield self.message(data)
+            if remaining is not None:
+                remaining -= len(page)
+
+    def message(self, data: Dict[str, Any]) -> Any:
+        message_id = data["id"]
+        return SimpleNamespace(
+            id=message_id,
+            created_at=datetime.fromisoformat(data["created_at"]),
+            author=SimpleNamespace(id=1, bot=data["bot"]),
+            content=data["content"],
+            attachments=[],
+            delete=lambda: self.request("DELETE", f"/channels/1/messages/{message_id}")
+        )
+
+    async def delete_messages(self, messages: List[Any]) -> None:
+        await self.request(
+            "POST", "/channels/1/messages/bulk-delete", json={"messages": [m.id for m in messages]}
+        )
+
+
+async def one_by_one(channel: Client, job: PurgeJob) -> None:
+    """What deleting every match individually, in history order, achieves."""
+    async for message in channel.history(limit=job.limit):
+        job.scanned += 1
+        if job.filter(message):
+            await message.delete()
+            job.deleted += 1
+
+
+async def run_case(name: str, recent: int, old: int, latency: float, engine: bool) -> None:
+    mock = MockDiscord(recent, old, latency)
+    runner = web.AppRunner(mock.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    async with aiohttp.ClientSession() as session:
+        channel = Client(session, f"http://127.0.0.1:{port}")
+        job = PurgeJob(1, recent + old, PurgeFilter(bots_only=True))
+        started = time.perf_counter()
+        if engine:
+            await PurgeEngine().run(channel, job)
+        else:
+            await one_by_one(channel, job)
+        elapsed = time.perf_counter() - started
+
+    await runner.cleanup()
+    print(f"{name:<12} deleted {job.deleted:>5} of {job.scanned} scanned in {elapsed:6.2f}s "
+          f"-> {job.deleted / elapsed:7.1f} messages/s")
+
+
+async def main(recent: int, old: int, latency: float) -> None:
+    random.seed(0)
+    await run_case("engine", recent, old, latency, engine=True)
+    random.seed(0)
+    await run_case("one-by-one", min(recent, 200), min(old, 20), latency, engine=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recent", type=int, default=3000)
+    parser.add_argument("--old", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.03)
+    args = parser.parse_args()
+    asyncio.run(main(args.recent, args.old, args.latency))
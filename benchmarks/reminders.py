@@ -0,0 +1,94 @@
+"""Memory and wakeup accuracy of the reminder scheduler at 100k pending reminders.
+
+Run from the repository root:
+
+    python -m benchmarks.reminders [--pending 100000] [--probes 1000]
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import List
+
+from core.reminders import SCHEMA, Reminder, ReminderScheduler
+from core.storage import Database
+
+
+async def sleeping_tasks_baseline(count: int) -> int:
+    """Memory held by the old one-``asyncio.sleep``-per-reminder approach."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = [asyncio.create_task(asyncio.sleep(86400)) for _ in range(count)]
+    await asyncio.sleep(0)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return used
+
+
+async def run(pending: int, probes: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "reminders.sqlite3")
+    db = Database(path)
+    lateness: List[float] = []
+    done = asyncio.Event()
+
+    async def deliver(user_id: int, reminders: List[Reminder]) -> None:
+        now = time.time()
+        lateness.extend(now - r.due for r in reminders)
+        if len(lateness) >= probes:
+            done.set()
+
+    await db.executescript(SCHEMA)
+    start = time.time()
+    started = time.perf_counter()
+    await db.executemany(
+        "INSERT INTO reminders (user_id, channel_id, due, message, created) VALUES (?, ?, ?, ?, ?)",
+        ((i % 50_000, None, start + 86400 + i, f"reminder {i}", start) for i in range(pending))
+    )
+    print(f"seeded {pending} rows in {time.perf_counter() - started:.2f}s")
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    scheduler = ReminderScheduler(db, deliver)
+    started = time.perf_counter()
+    await scheduler.start()
+    load = time.perf_counter() - started
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"loaded {len(scheduler)} reminders in {load:.2f}s, {used / 1024 / 1024:.1f} MiB "
+          f"({used / max(len(scheduler), 1):.0f} B/reminder)")
+
+    baseline = await sleeping_tasks_baseline(pending)
+    print(f"asyncio.sleep baseline: {baseline / 1024 / 1024:.1f} MiB "
+          f"({baseline / pending:.0f} B/reminder)")
+
+    started = time.perf_counter()
+    for i in range(probes):
+        await scheduler.add(i, None, 0.2 + 2.0 * i / probes, f"probe {i}")
+    print(f"scheduled {probes} probes in {time.perf_counter() - started:.2f}s")
+
+    await asyncio.wait_for(done.wait(), timeout=30)
+    await scheduler.close()
+    await db.close()
+
+    lateness.sort()
+    print(
+        f"wakeup lateness over {len(lateness)} probes: "
+        f"p50={statistics.median(lateness) * 1000:.1f}ms "
+        f"p99={lateness[int(len(lateness) * 0.99) - 1] * 1000:.1f}ms "
+        f"max={lateness[-1] * 1000:.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pending", type=int, default=100_000)
+    parser.add_argument("--probes", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.pending, args.probes))
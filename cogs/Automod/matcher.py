@@ -0,0 +1,189 @@
+from __future__ import annotations
+import asyncio
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+from logging import getLogger
+log = getLogger(__name__)
+
+
+__all__ = ("Automaton", "TermMatcher", "format_term", "parse_term")
+
+
+def parse_term(term: str) -> Tuple[str, bool, bool]:
+    """Split a banned term into its text and whether each end is a wildcard.
+
+    Terms match whole words, like Discord's own keyword filter: ``*bad``
+    also matches at the end of a word, ``bad*`` at its start and ``*bad*``
+    anywhere.
+    """
+    term = term.strip().casefold()
+    prefix = term.startswith("*")
+    suffix = term.endswith("*") and len(term) > 1
+    return term.strip("*"), prefix, suffix
+
+
+def format_term(key: str, prefix: bool, suffix: bool) -> str:
+    return f"{'*' if prefix else ''}{key}{'*' if suffix else ''}"
+
+
+class Automaton:
+    """Aho-Corasick automaton over a fixed set of strings.
+
+    One pass over a text finds every occurrence of every string, however
+    many strings there are. Each node's outputs already include those of
+    its failure chain, so a match never walks that chain.
+    """
+
+    __slots__ = ("goto", "fail", "out", "size")
+
+    def __init__(self, keys: Iterable[str]) -> None:
+        self.goto: List[Dict[str, int]] = [{}]
+        self.out: List[Tuple[str, ...]] = [()]
+        self.size = 0
+        for key in keys:
+            if not key:
+                continue
+            node = 0
+            for ch in key:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = self.goto[node][ch] = len(self.goto)
+                    self.goto.append({})
+                    self.out.append(())
+                node = nxt
+            if not self.out[node]:
+                self.out[node] = (key,)
+                self.size += 1
+
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(ch, 0)
+                if self.out[self.fail[child]]:
+                    self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def search(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield ``(end, key)`` for every occurrence, ``end`` being exclusive."""
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for key in out[node]:
+                    yield i + 1, key
+
+
+_EMPTY = Automaton(())
+
+
+class TermMatcher:
+    """Banned terms of one guild.
+
+    The bulk of the terms live in one large automaton. Terms added since
+    it was built go into a small second automaton that is rebuilt on every
+    edit, and removed terms are only dropped from the live set, so an edit
+    never rebuilds the large one. Once ``rebuild_at`` edits piled up,
+    :attr:`needs_compaction` is set and the owner should call
+    :meth:`compact`, which folds everything into a new large automaton.
+    """
+
+    def __init__(self, terms: Iterable[str] = (), *, rebuild_at: int = 64) -> None:
+        self.rebuild_at = rebuild_at
+        # Term text -> the (prefix wildcard, suffix wildcard) forms it was added with.
+        self._terms: Dict[str, Set[Tuple[bool, bool]]] = {}
+        for term in terms:
+            self._add(term)
+        self._main = Automaton(self._terms)
+        self._main_keys: FrozenSet[str] = frozenset(self._terms)
+        self._pending = _EMPTY
+        self._removed = 0
+
+    def __len__(self) -> int:
+        return sum(len(forms) for forms in self._terms.values())
+
+    def __iter__(self) -> Iterator[str]:
+        for key, forms in sorted(self._terms.items()):
+            for prefix, suffix in sorted(forms):
+                yield format_term(key, prefix, suffix)
+
+    def __contains__(self, term: str) -> bool:
+        key, prefix, suffix = parse_term(term)
+        return (prefix, suffix) in self._terms.get(key, ())
+
+    @property
+    def needs_compaction(self) -> bool:
+        return len(self._pending) + self._removed >= self.rebuild_at
+
+    def _add(self, term: str) -> bool:
+        key, prefix, suffix = parse_term(term)
+        if not key:
+            return False
+        forms = self._terms.setdefault(key, set())
+        if (prefix, suffix) in forms:
+            return False
+        forms.add((prefix, suffix))
+        return True
+
+    def add(self, term: str) -> bool:
+        """Add a term, returning False if it was already there or is empty."""
+        if not self._add(term):
+            return False
+        key = parse_term(term)[0]
+        if key not in self._main_keys:
+            self._pending = Automaton(k for k in self._terms if k not in self._main_keys)
+        return True
+
+    def remove(self, term: str) -> bool:
+        key, prefix, suffix = parse_term(term)
+        forms = self._terms.get(key)
+        if not forms or (prefix, suffix) not in forms:
+            return False
+        forms.discard((prefix, suffix))
+        if not forms:
+            del self._terms[key]
+            if key in self._main_keys:
+                self._removed += 1
+            else:
+                self._pending = Automaton(k for k in self._terms if k not in self._main_keys)
+        return True
+
+    async def compact(self) -> None:
+        """Rebuild the large automaton from the live terms.
+
+        The automaton is built in a worker thread and swapped in once it is
+        complete. Terms edited while it was being built stay pending.
+        """
+        keys = frozenset(self._terms)
+        main = await asyncio.to_thread(Automaton, keys)
+        self._main, self._main_keys = main, keys
+        self._removed = sum(1 for key in keys if key not in self._terms)
+        self._pending = Automaton(k for k in self._terms if k not in keys)
+
+    def match(self, text: str) -> Optional[str]:
+        """The first term found in ``text``, as it was added, or None."""
+        if not self._terms:
+            return None
+        text = text.casefold()
+        for automaton in (self._main, self._pending):
+            for end, key in automaton.search(text):
+                forms = self._terms.get(key)
+                if not forms:
+                    continue
+                start = end - len(key)
+                starts_word = start == 0 or not text[start - 1].isalnum()
+                ends_word = end == len(text) or not text[end].isalnum()
+                for prefix, suffix in forms:
+                    if (prefix or starts_word) and (suffix or ends_word):
+                        return format_term(key, prefix, suffix)
+        return None
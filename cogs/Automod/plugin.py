@@ -0,0 +1,226 @@
+from __future__ import annotations
+import asyncio
+import time
+import discord
+from core import Bot, Embed, GuildSettings, Paginator
+from datetime import timedelta
+from discord import app_commands, Interaction, Member, Permissions
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from .. import Plugin
+from .matcher import TermMatcher, format_term, parse_term
+from .spam import SpamLimits, SpamTracker
+from logging import getLogger
+log = getLogger(__name__)
+
+if TYPE_CHECKING:
+    from cogs.Moderation.plugin import Moderate
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS automod_terms (
+    guild_id INTEGER NOT NULL,
+    term TEXT NOT NULL,
+    PRIMARY KEY (guild_id, term)
+) WITHOUT ROWID;
+"""
+
+MAX_TERMS = 20_000
+
+
+def split_terms(terms: str) -> List[str]:
+    """Normalized terms of a comma separated list, without duplicates."""
+    seen: Dict[str, None] = {}
+    for term in terms.split(","):
+        key, prefix, suffix = parse_term(term)
+        if key:
+            seen[format_term(key, prefix, suffix)] = None
+    return list(seen)
+
+
+class Automod(Plugin):
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+        self.spam = SpamTracker()
+        self.terms: Dict[int, TermMatcher] = {}
+        self._loading: Dict[int, asyncio.Task[TermMatcher]] = {}
+        # (guild id, user id) -> monotonic time until which further violations aren't actioned.
+        self._actioned: Dict[Tuple[int, int], float] = {}
+        self._compacting: Dict[int, asyncio.Task[None]] = {}
+
+    async def cog_load(self) -> None:
+        await self.bot.db.executescript(SCHEMA)
+        if not self.bot.intents.message_content:
+            log.warning("The message content intent is off, automod can only check mentions.")
+        await super().cog_load()
+
+    async def cog_unload(self) -> None:
+        for task in list(self._compacting.values()):
+            task.cancel()
+
+    async def get_terms(self, guild_id: int) -> TermMatcher:
+        """The banned terms of a guild, read from disk the first time they are needed."""
+        matcher = self.terms.get(guild_id)
+        if matcher is not None:
+            return matcher
+        task = self._loading.get(guild_id)
+        if task is None:
+            task = self._loading[guild_id] = asyncio.create_task(self._load_terms(guild_id))
+            task.add_done_callback(lambda _: self._loading.pop(guild_id, None))
+        return await asyncio.shield(task)
+
+    async def _load_terms(self, guild_id: int) -> TermMatcher:
+        rows = await self.bot.db.fetchall("SELECT term FROM automod_terms WHERE guild_id = ?", (guild_id,))
+        # Building the automaton of a long list takes a while, keep it off the event loop.
+        matcher = await asyncio.to_thread(TermMatcher, [term for term, in rows]) if rows else TermMatcher()
+        return self.terms.setdefault(guild_id, matcher)
+
+    def _compact_later(self, guild_id: int, matcher: TermMatcher) -> None:
+        if not matcher.needs_compaction or guild_id in self._compacting:
+            return
+        task = self._compacting[guild_id] = asyncio.create_task(matcher.compact(), name=f"automod-{guild_id}")
+        task.add_done_callback(lambda _: self._compacting.pop(guild_id, None))
+
+    #====================== Filter ===================
+
+    @Plugin.listener("on_message")
+    async def on_message(self, message: discord.Message):
+        guild = message.guild
+        author = message.author
+        if guild is None or author.bot or not isinstance(author, Member):
+            return
+        if author.guild_permissions.manage_messages:
+            return
+
+        settings = self.bot.settings.get(guild.id)
+        matcher = self.terms.get(guild.id)
+        if matcher is None:
+            matcher = await self.get_terms(guild.id)
+        reason = None
+        term = matcher.match(message.content) if message.content else None
+        if term is not None:
+            reason = "Posted a banned term"
+        elif settings.spam_filter:
+            mentions = len(message.raw_mentions) + len(message.raw_role_mentions) + message.mention_everyone
+            limits = SpamLimits(
+                settings.spam_messages, settings.spam_mentions, settings.spam_duplicates, settings.spam_window
+            )
+            spam = self.spam.check(guild.id, author.id, message.content, mentions, limits)
+            if spam is not None:
+                reason = f"Spam: {spam}"
+        if reason is not None:
+            await self._act(message, author, reason, settings)
+
+    async def _act(self, message: discord.Message, member: Member, reason: str, settings: GuildSettings) -> None:
+        try:
+            await message.delete()
+        except discord.NotFound:
+            pass
+        except discord.HTTPException as e:
+            log.warning(f"Deleting message {message.id} in {member.guild.id} failed: {e}")
+
+        if settings.automod_action == "delete":
+            return
+        # A spammer's queued messages arrive after the action was taken, act only once.
+        now = time.monotonic()
+        key = (member.guild.id, member.id)
+        if self._actioned.get(key, 0.0) > now:
+            return
+        if len(self._actioned) >= 10_000:
+            self._actioned = {k: until for k, until in self._actioned.items() if until > now}
+        self._actioned[key] = now + max(settings.automod_timeout, 60.0)
+
+        moderate = await self._moderate()
+        if moderate is None:
+            log.warning(f"Moderation isn't loaded, can't {settings.automod_action} {member.id} in {member.guild.id}")
+            return
+        assert self.bot.user is not None
+        try:
+            if settings.automod_action == "ban":
+                await moderate.ban_member(member, self.bot.user.id, reason, "automod", delete_message_seconds=3600)
+            else:
+                await moderate.timeout_member(
+                    member, timedelta(seconds=settings.automod_timeout), self.bot.user.id, reason, "automod"
+                )
+        except discord.HTTPException as e:
+            log.warning(f"Automod {settings.automod_action} of {member.id} in {member.guild.id} failed: {e}")
+
+    async def _moderate(self) -> Optional[Moderate]:
+        moderate = self.bot.get_cog("Moderate")
+        if moderate is None and "cogs.Moderation.plugin" in self.bot.deferred.values():
+            await self.bot.load_deferred("cogs.Moderation.plugin")
+            moderate = self.bot.get_cog("Moderate")
+        return moderate  # type: ignore
+
+    @Plugin.listener("on_guild_remove")
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.terms.pop(guild.id, None)
+        self.spam.forget_guild(guild.id)
+
+    #====================== Terms ===================
+
+    automod = app_commands.Group(
+        name="automod",
+        description="Manage the terms automod removes",
+        default_permissions=Permissions(manage_guild=True),
+        guild_only=True
+    )
+
+    @automod.command(name="add", description="Ban terms from being posted")
+    @app_commands.describe(terms="Comma separated terms. *term also matches word endings, term* word starts.")
+    async def automod_add_command(self, interaction: Interaction, terms: str):
+        assert interaction.guild is not None
+        matcher = await self.get_terms(interaction.guild.id)
+        added = [term for term in split_terms(terms) if term not in matcher]
+        if not added:
+            return await self.bot.error("All of these terms are already banned.", interaction)
+        if len(matcher) + len(added) > MAX_TERMS:
+            return await self.bot.error(f"A server can ban at most {MAX_TERMS} terms.", interaction)
+        await self.bot.db.executemany(
+            "INSERT OR IGNORE INTO automod_terms (guild_id, term) VALUES (?, ?)",
+            [(interaction.guild.id, term) for term in added]
+        )
+        for term in added:
+            matcher.add(term)
+        self._compact_later(interaction.guild.id, matcher)
+        await self.bot.success(f"Banned **{len(added)}** terms, **{len(matcher)}** in total.", interaction, ephemeral=True)
+
+    @automod.command(name="remove", description="Allow banned terms again")
+    @app_commands.describe(terms="Comma separated terms, written as they were added.")
+    async def automod_remove_command(self, interaction: Interaction, terms: str):
+        assert interaction.guild is not None
+        matcher = await self.get_terms(interaction.guild.id)
+        removed = [term for term in split_terms(terms) if term in matcher]
+        if not removed:
+            return await self.bot.error("None of these terms are banned.", interaction)
+        await self.bot.db.executemany(
+            "DELETE FROM automod_terms WHERE guild_id = ? AND term = ?",
+            [(interaction.guild.id, term) for term in removed]
+        )
+        for term in removed:
+            matcher.remove(term)
+        self._compact_later(interaction.guild.id, matcher)
+        await self.bot.success(f"Removed **{len(removed)}** terms, **{len(matcher)}** left.", interaction, ephemeral=True)
+
+    @automod.command(name="list", description="List the banned terms")
+    async def automod_list_command(self, interaction: Interaction):
+        assert interaction.guild is not None
+        matcher = await self.get_terms(interaction.guild.id)
+        paginator = Paginator(
+            f"Banned terms in {interaction.guild.name}",
+            lambda: (f"`{term}`" for term in matcher),
+            empty="No terms are banned.",
+            author_id=interaction.user.id
+        )
+        await paginator.send(interaction, ephemeral=True)
+
+    @automod.command(name="test", description="Check a message against the banned terms")
+    @app_commands.describe(text="Text to check.")
+    async def automod_test_command(self, interaction: Interaction, text: str):
+        assert interaction.guild is not None
+        matcher = await self.get_terms(interaction.guild.id)
+        term = matcher.match(text)
+        embed = Embed(description=f"Matches `{term}`." if term else "Matches no banned term.")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot: Bot) -> None:
+    await bot.add_cog(Automod(bot))
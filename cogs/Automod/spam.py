@@ -0,0 +1,107 @@
+from __future__ import annotations
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+from logging import getLogger
+log = getLogger(__name__)
+
+
+__all__ = ("SpamLimits", "SpamTracker")
+
+
+class SpamLimits(NamedTuple):
+    """How much a member may post within ``window`` seconds."""
+
+    messages: int
+    mentions: int
+    duplicates: int
+    window: float
+
+
+class _Member:
+    __slots__ = ("messages", "mentions", "updated", "last_hash", "repeats")
+
+    def __init__(self, limits: SpamLimits, now: float) -> None:
+        self.messages = float(limits.messages)
+        self.mentions = float(limits.mentions)
+        self.updated = now
+        self.last_hash = 0
+        self.repeats = 0
+
+
+class SpamTracker:
+    """Token buckets for the messages and mentions of each member.
+
+    Each member has one bucket holding ``messages`` tokens and one holding
+    ``mentions``, both refilling completely over ``window`` seconds. A
+    message takes one token from the first and one per mention from the
+    second; running out of either is spam, as is posting the same text
+    more than ``duplicates`` times in a row within the window.
+
+    At most ``max_members`` members are tracked. The least recently active
+    one is forgotten first, which costs nothing: a forgotten member starts
+    over with full buckets, as they would have after a quiet window.
+    """
+
+    def __init__(self, max_members: int = 50_000) -> None:
+        self.max_members = max_members
+        self._members: OrderedDict[Tuple[int, int], _Member] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def check(
+        self,
+        guild_id: int,
+        user_id: int,
+        content: str,
+        mentions: int,
+        limits: SpamLimits,
+        now: Optional[float] = None
+    ) -> Optional[str]:
+        """Account for one message, returning why it is spam or None."""
+        if now is None:
+            now = time.monotonic()
+        key = (guild_id, user_id)
+        state = self._members.get(key)
+        if state is None:
+            state = self._members[key] = _Member(limits, now)
+            if len(self._members) > self.max_members:
+                self._members.popitem(last=False)
+        else:
+            self._members.move_to_end(key)
+            elapsed = now - state.updated
+            state.updated = now
+            if elapsed >= limits.window:
+                state.messages = float(limits.messages)
+                state.mentions = float(limits.mentions)
+                state.repeats = 0
+            else:
+                refill = elapsed / limits.window
+                state.messages = min(float(limits.messages), state.messages + refill * limits.messages)
+                state.mentions = min(float(limits.mentions), state.mentions + refill * limits.mentions)
+
+        reason = None
+        state.messages -= 1
+        if state.messages < 0:
+            state.messages = 0.0
+            reason = f"more than {limits.messages} messages in {limits.window:g}s"
+        if mentions:
+            state.mentions -= mentions
+            if state.mentions < 0:
+                state.mentions = 0.0
+                reason = f"more than {limits.mentions} mentions in {limits.window:g}s"
+        if content:
+            content_hash = hash(content)
+            if content_hash == state.last_hash:
+                state.repeats += 1
+                if state.repeats > limits.duplicates:
+                    reason = f"the same message more than {limits.duplicates} times"
+            else:
+                state.last_hash = content_hash
+                state.repeats = 1
+        return reason
+
+    def forget_guild(self, guild_id: int) -> None:
+        for key in [key for key in self._members if key[0] == guild_id]:
+            del self._members[key]
@@ -0,0 +1,145 @@
+from __future__ import annotations
+import os
+import tracemalloc
+from core import Bot, Embed, TraceSnapshots, memory_report
+from discord import app_commands, Interaction, Permissions
+from humanfriendly import format_size
+from typing import Optional
+from .. import Plugin
+from logging import getLogger
+log = getLogger(__name__)
+
+
+def size(n: float) -> str:
+    return format_size(n, binary=True)
+
+
+def site(frame: tracemalloc.Frame) -> str:
+    """Shortest readable location of an allocation site."""
+    path = frame.filename
+    if path.startswith(os.getcwd()):
+        path = os.path.relpath(path)
+    else:
+        path = os.path.join(*path.split(os.sep)[-2:])
+    return f"{path}:{frame.lineno}"
+
+
+class Debug(Plugin):
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+        self.traces = TraceSnapshots()
+
+    async def cog_unload(self) -> None:
+        if self.traces.tracing:
+            self.traces.stop()
+
+    async def _owner(self, interaction: Interaction) -> bool:
+        if await self.bot.is_owner(interaction.user):
+            return True
+        await self.bot.error("Only the bot owner can use debug commands.", interaction)
+        return False
+
+    debug = app_commands.Group(
+        name="debug",
+        description="Look inside the running bot",
+        default_permissions=Permissions(administrator=True)
+    )
+    memory = app_commands.Group(name="memory", description="Inspect the bot's memory use", parent=debug)
+
+    @memory.command(name="report", description="Show what the bot caches and how much memory it takes")
+    @app_commands.describe(guild="Id of a server to show on its own, else the largest servers are listed.")
+    async def memory_report_command(self, interaction: Interaction, guild: Optional[str] = None):
+        if not await self._owner(interaction):
+            return
+        report = memory_report(self.bot)
+        embed = Embed(title="Memory")
+
+        if guild is not None:
+            footprint = next((f for f in report.guilds if str(f.guild_id) == guild), None)
+            if footprint is None:
+                return await self.bot.error(f"The bot is not in a server with id **{guild}**.", interaction)
+            embed.title = f"Memory of {footprint.name}"
+            footprints = [footprint]
+        else:
+            footprints = report.guilds
+            embed.add_field(name="Process", value=f"RSS **{size(report.rss)}**\nUsers cached: {report.users}", inline=False)
+
+        for label, count, nbytes in (
+            ("Members", sum(f.members for f in footprints), sum(f.member_bytes for f in footprints)),
+            ("Presences", sum(f.presences for f in footprints), sum(f.presence_bytes for f in footprints)),
+            ("Messages", sum(f.messages for f in footprints), sum(f.message_bytes for f in footprints)),
+            ("Roles", sum(f.roles for f in footprints), sum(f.role_bytes for f in footprints)),
+            ("Emojis", sum(f.emojis for f in footprints), sum(f.emoji_bytes for f in footprints))
+        ):
+            embed.add_field(name=label, value=f"{count}\n~{size(nbytes)}")
+
+        if guild is None:
+            embed.add_field(name="Largest servers", value="\n".join(
+                f"{f.name} (`{f.guild_id}`): ~{size(f.total_bytes)}, {f.members} members"
+                for f in footprints[:10]
+            )[:1024] or "None", inline=False)
+            embed.add_field(name="Bot caches", value="\n".join(
+                f"{name.replace('_', ' ')}: {size(value) if name.endswith('_bytes') else value}"
+                for name, value in report.caches.items()
+            ), inline=False)
+        embed.set_footer(text="Sizes are estimated from a sample of each kind of object.")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @memory.command(name="snapshot", description="Take a tracemalloc snapshot, starting tracing if needed")
+    async def memory_snapshot_command(self, interaction: Interaction):
+        if not await self._owner(interaction):
+            return
+        await interaction.response.defer(ephemeral=True)
+        started = not self.traces.tracing
+        number, top = await self.traces.take()
+        embed = Embed(title=f"Snapshot #{number}")
+        embed.description = "\n".join(
+            f"`{site(stat.traceback[0])}` {size(stat.size)} in {stat.count} blocks" for stat in top
+        )[:4096] or "Nothing traced yet."
+        if started:
+            embed.set_footer(text="Tracing just started, take another snapshot later and diff them.")
+        await self.bot.respond(interaction, embed=embed)
+
+    @memory.command(name="diff", description="Show the allocation sites that grew the most between two snapshots")
+    @app_commands.describe(
+        old="Number of the earlier snapshot, the one before the newer by default.",
+        new="Number of the later snapshot, a new one by default."
+    )
+    async def memory_diff_command(self, interaction: Interaction, old: Optional[int] = None, new: Optional[int] = None):
+        if not await self._owner(interaction):
+            return
+        if not self.traces.snapshots:
+            return await self.bot.error("Take a snapshot first.", interaction)
+        await interaction.response.defer(ephemeral=True)
+        if new is None:
+            new, _ = await self.traces.take()
+        after = self.traces.get(new)
+        if old is None:
+            old = max((s.number for s in self.traces.snapshots if s.number < new), default=None)
+        before = self.traces.get(old) if old is not None else None
+        if before is None or after is None:
+            kept = ", ".join(f"#{s.number}" for s in self.traces.snapshots)
+            return await self.bot.error(f"Those snapshots aren't kept, available: {kept}", interaction)
+
+        diffs = await self.traces.diff(before, after)
+        embed = Embed(title=f"Growth from #{before.number} to #{after.number}")
+        embed.description = "\n".join(
+            f"`{site(d.traceback[0])}` {'+' if d.size_diff >= 0 else '-'}{size(abs(d.size_diff))} "
+            f"({d.count_diff:+} blocks), {size(d.size)} now"
+            for d in diffs
+        )[:4096] or "No differences."
+        embed.set_footer(text=f"{after.taken - before.taken:.0f}s between the snapshots")
+        await self.bot.respond(interaction, embed=embed)
+
+    @memory.command(name="stop", description="Stop tracing and drop the snapshots")
+    async def memory_stop_command(self, interaction: Interaction):
+        if not await self._owner(interaction):
+            return
+        if not self.traces.tracing:
+            return await self.bot.error("tracemalloc is not running.", interaction)
+        self.traces.stop()
+        await self.bot.success("Stopped tracemalloc and dropped the snapshots.", interaction, ephemeral=True)
+
+
+async def setup(bot: Bot) -> None:
+    await bot.add_cog(Debug(bot))
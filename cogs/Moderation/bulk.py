@@ -0,0 +1,120 @@
+from __future__ import annotations
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Generic, List, Optional, Sequence, TypeVar
+import discord
+from logging import getLogger
+log = getLogger(__name__)
+
+
+__all__ = ("BulkProgress", "BulkRunner")
+
+T = TypeVar("T")
+
+
+@dataclass
+class BulkProgress:
+    total: int
+    done: int = 0
+    failed: List[str] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+    finished: bool = False
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def summary(self, verb: str) -> str:
+        lines = [f"{verb} **{self.done}**/{self.total} in {self.elapsed:.1f}s"]
+        if self.failed:
+            lines.append(f"Failed: **{len(self.failed)}**")
+            lines.extend(f"- {reason}" for reason in self.failed[:10])
+            if len(self.failed) > 10:
+                lines.append(f"- ...and {len(self.failed) - 10} more")
+        return "\n".join(lines)
+
+
+class BulkRunner(Generic[T]):
+    """Runs one moderation action over many targets.
+
+    Targets go through a queue drained by ``concurrency`` workers, so
+    at most that many requests share the action's rate-limit bucket at
+    once. discord.py already waits out the bucket's limits. A 429 that
+    still gets through is retried after the ``retry_after`` Discord sends
+    back, and every other failure is recorded instead of stopping the run.
+    A target may stand for several items, such as a chunk of users for one
+    bulk ban call; ``size`` gives its weight and ``action`` may return the
+    items within it that failed.
+    ``on_progress`` is called at most every ``interval`` seconds, plus once
+    at the end.
+    """
+
+    def __init__(
+        self,
+        targets: Sequence[T],
+        action: Callable[[T], Awaitable[Optional[Sequence[str]]]],
+        describe: Callable[[T], str], *,
+        size: Callable[[T], int] = lambda target: 1,
+        concurrency: int = 5,
+        retries: int = 3,
+        interval: float = 2.0
+    ) -> None:
+        self.targets = targets
+        self.action = action
+        self.describe = describe
+        self.size = size
+        self.concurrency = concurrency
+        self.retries = retries
+        self.interval = interval
+        self.progress = BulkProgress(total=sum(size(target) for target in targets))
+
+    async def _apply(self, target: T) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                failures = await self.action(target)
+            except discord.HTTPException as e:
+                if e.status == 429 and attempt < self.retries:
+                    retry_after = getattr(e.response, "headers", {}).get("Retry-After")
+                    await asyncio.sleep(float(retry_after or 1.0))
+                    continue
+                self.progress.failed.append(f"{self.describe(target)}: {e.text or e.status}")
+            except Exception as e:
+                log.exception(f"Bulk action failed for {self.describe(target)}")
+                self.progress.failed.append(f"{self.describe(target)}: {e}")
+            else:
+                failures = failures or ()
+                self.progress.failed.extend(failures)
+                self.progress.done += self.size(target) - len(failures)
+            return
+
+    async def _worker(self, queue: asyncio.Queue[T]) -> None:
+        while True:
+            try:
+                target = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await self._apply(target)
+
+    async def run(
+        self,
+        on_progress: Optional[Callable[[BulkProgress], Awaitable[None]]] = None
+    ) -> BulkProgress:
+        queue: asyncio.Queue[T] = asyncio.Queue()
+        for target in self.targets:
+            queue.put_nowait(target)
+
+        workers = asyncio.gather(*(self._worker(queue) for _ in range(min(self.concurrency, len(self.targets)) or 1)))
+        while on_progress is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(workers), timeout=self.interval)
+            except asyncio.TimeoutError:
+                await on_progress(self.progress)
+            else:
+                break
+        await workers
+
+        self.progress.finished = True
+        if on_progress is not None:
+            await on_progress(self.progress)
+        return self.progress
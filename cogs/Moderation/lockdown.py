@@ -0,0 +1,103 @@
+from __future__ import annotations
+import json
+from typing import Collection, Dict, Iterable, List, NamedTuple, Tuple, Union
+import discord
+from core import Database
+from logging import getLogger
+log = getLogger(__name__)
+
+
+__all__ = ("ChannelSnapshot", "LockdownStore", "locked_overwrites")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lockdown_channels (
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    overwrites TEXT NOT NULL,
+    PRIMARY KEY (guild_id, channel_id)
+) WITHOUT ROWID;
+"""
+
+# Denied to @everyone while a channel is locked; roles without moderation
+# permissions lose any overwrite allowing them.
+LOCKED = ("send_messages", "send_messages_in_threads", "create_public_threads", "create_private_threads")
+
+Overwrites = Dict[Union[discord.Role, discord.Member, discord.Object], discord.PermissionOverwrite]
+
+
+class ChannelSnapshot(NamedTuple):
+    """A channel's permission overwrites as ``(target id, type, allow, deny)``, exactly as Discord has them."""
+
+    channel_id: int
+    overwrites: Tuple[Tuple[int, int, int, int], ...]
+
+    @classmethod
+    def of(cls, channel: discord.abc.GuildChannel) -> ChannelSnapshot:
+        overwrites = []
+        for target, overwrite in channel.overwrites.items():
+            # Targets missing from the cache come back as Objects typed Role or User.
+            is_role = isinstance(target, discord.Role) or getattr(target, "type", None) is discord.Role
+            allow, deny = overwrite.pair()
+            overwrites.append((target.id, 0 if is_role else 1, allow.value, deny.value))
+        return cls(channel.id, tuple(overwrites))
+
+    def restored(self) -> Overwrites:
+        """Overwrites to pass to ``channel.edit`` to put the channel back as it was."""
+        return {
+            discord.Object(target_id, type=discord.Role if kind == 0 else discord.Member):
+                discord.PermissionOverwrite.from_pair(discord.Permissions(allow), discord.Permissions(deny))
+            for target_id, kind, allow, deny in self.overwrites
+        }
+
+
+def locked_overwrites(channel: discord.abc.GuildChannel, keep: Collection[int]) -> Overwrites:
+    """The channel's overwrites with members of every role but ``keep`` unable to talk.
+
+    Everything is sent in one channel edit, so a channel costs a single
+    request however many overwrites it has.
+    """
+    everyone = channel.guild.default_role.id
+    overwrites = ChannelSnapshot.of(channel).restored()
+    default = next((o for target, o in overwrites.items() if target.id == everyone), None)
+    if default is None:
+        default = overwrites[discord.Object(everyone, type=discord.Role)] = discord.PermissionOverwrite()
+    default.update(**dict.fromkeys(LOCKED, False))
+    for target, overwrite in overwrites.items():
+        if target.type is discord.Role and target.id != everyone and target.id not in keep:
+            overwrite.update(**{name: None for name in LOCKED if getattr(overwrite, name)})
+    return overwrites
+
+
+class LockdownStore:
+    """Overwrites of locked channels as they were before, kept until they are restored.
+
+    They are written before a channel is locked, so a lockdown can still
+    be lifted after a restart.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+
+    async def start(self) -> None:
+        await self.db.executescript(SCHEMA)
+
+    async def load(self, guild_id: int) -> List[ChannelSnapshot]:
+        rows = await self.db.fetchall(
+            "SELECT channel_id, overwrites FROM lockdown_channels WHERE guild_id = ?", (guild_id,)
+        )
+        return [
+            ChannelSnapshot(channel_id, tuple(tuple(o) for o in json.loads(overwrites)))
+            for channel_id, overwrites in rows
+        ]
+
+    async def save(self, guild_id: int, snapshots: Iterable[ChannelSnapshot]) -> None:
+        await self.db.executemany(
+            "INSERT OR REPLACE INTO lockdown_channels (guild_id, channel_id, overwrites) VALUES (?, ?, ?)",
+            [(guild_id, s.channel_id, json.dumps(s.overwrites)) for s in snapshots]
+        )
+
+    async def forget(self, guild_id: int, channel_ids: Iterable[int]) -> None:
+        await self.db.executemany(
+            "DELETE FROM lockdown_channels WHERE guild_id = ? AND channel_id = ?",
+            [(guild_id, channel_id) for channel_id in channel_ids]
+        )
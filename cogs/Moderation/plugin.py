@@ -1,15 +1,34 @@
 from __future__ import annotations
 import os
-import sys
-from click import Context
+import re
+import time
 
 import discord
-from core import Bot
+from core import Bot, Embed, Paginator, SearchResult, rate_limit
 from datetime import timedelta
-from discord import app_commands, Interaction, Member, TextChannel, User, utils as Utils
+from discord import app_commands, CategoryChannel, Interaction, Member, Permissions, Role, TextChannel, User, utils as Utils
 from humanfriendly import parse_timespan, InvalidTimespan
-from typing import Literal, Optional
+from typing import Dict, List, Literal, Optional, Sequence, Set, Tuple, Union
 from .. import Plugin
+from .bulk import BulkProgress, BulkRunner
+from .lockdown import ChannelSnapshot, LockdownStore, locked_overwrites
+from .purge import PurgeEngine, PurgeFilter, PurgeJob
+from logging import getLogger
+log = getLogger(__name__)
+
+MAX_BULK_TARGETS = 1000
+BULK_BAN_CHUNK = 200
+# Channel edits in flight at once during a lockdown.
+LOCKDOWN_CONCURRENCY = 10
+
+
+def can_moderate_member(moderator: Member, target: Member) -> bool:
+    return not (
+        target.top_role.position > moderator.top_role.position
+        or target.guild_permissions.kick_members
+        or target.guild_permissions.ban_members
+        or target.guild_permissions.manage_guild
+    )
 
 
 def can_moderate():
@@ -22,12 +41,7 @@ def can_moderate():
         if not isinstance(interaction.user, Member):
             raise ValueError("Interaction user must be a Member")
 
-        if(
-            target.top_role.position > interaction.user.top_role.position
-            or target.guild_permissions.kick_members
-            or target.guild_permissions.ban_members
-            or target.guild_permissions.manage_guild
-        ):
+        if not can_moderate_member(interaction.user, target):
             raise app_commands.CheckFailure(f"You can't moderate {target}")
         
         return True
@@ -38,6 +52,54 @@ def can_moderate():
 class Moderate(Plugin):
     def __init__(self, bot: Bot) -> None:
         self.bot = bot
+        self.purge_engine = PurgeEngine()
+        self.purges: Dict[int, PurgeJob] = {}
+        self.purging: Set[int] = set()
+        self.lockdowns = LockdownStore(bot.db)
+        self._locking: Set[int] = set()
+
+    async def cog_load(self) -> None:
+        await self.lockdowns.start()
+        await super().cog_load()
+
+    def _case(
+        self,
+        interaction: Interaction,
+        action: str,
+        target_id: int,
+        reason: Optional[str] = None,
+        detail: Optional[str] = None
+    ) -> None:
+        assert interaction.guild is not None
+        self.bot.cases.record(interaction.guild.id, action, target_id, interaction.user.id, reason, detail)
+
+    async def timeout_member(
+        self,
+        member: Member,
+        duration: timedelta,
+        moderator_id: int,
+        reason: Optional[str] = None,
+        detail: Optional[str] = None
+    ) -> None:
+        """Time a member out and record the case. Used by commands and automatic actions alike."""
+        await member.timeout(duration, reason=reason)
+        self.bot.cases.record(member.guild.id, "mute", member.id, moderator_id, reason, detail)
+
+    async def ban_member(
+        self,
+        member: Member,
+        moderator_id: int,
+        reason: Optional[str] = None,
+        detail: Optional[str] = None, *,
+        delete_message_seconds: int = Utils.MISSING
+    ) -> None:
+        """Ban a member and record the case.
+
+        Unless ``delete_message_seconds`` is given, discord.py's default of
+        deleting the last day of messages applies.
+        """
+        await member.ban(reason=reason, delete_message_seconds=delete_message_seconds)
+        self.bot.cases.record(member.guild.id, "ban", member.id, moderator_id, reason, detail)
         
     
     
@@ -58,7 +120,8 @@ class Moderate(Plugin):
             await self.bot.error(f"I'm not able to kick {member} from the server.",
             interaction)
         else:
-            await self.bot.succes(
+            self._case(interaction, "kick", member.id, reason)
+            await self.bot.success(
                 f"Successfully kicked {member} from the server.", interaction
             )
             
@@ -74,12 +137,12 @@ class Moderate(Plugin):
     async def ban_command(self, interaction: Interaction, member: Member, reason: Optional[str]):
         if not reason: reason = "No reason provided."
         try:
-            await member.ban(reason=reason)
+            await self.ban_member(member, interaction.user.id, reason)
         except:
             await self.bot.error(f"I'm not able to ban {member} from the server.",
             interaction)
         else:
-            await self.bot.succes(
+            await self.bot.success(
                 f"Successfully banned {member} from the server.", interaction
             )
             
@@ -104,7 +167,8 @@ class Moderate(Plugin):
             except:
                 await self.bot.error(f"I'm not able to unban {user} from the server.", interaction)
             else:
-                await self.bot.succes(f"Successfully unbanned {user} from the server.", interaction)
+                self._case(interaction, "unban", user.id, reason)
+                await self.bot.success(f"Successfully unbanned {user} from the server.", interaction)
     
     
     
@@ -136,9 +200,7 @@ class Moderate(Plugin):
         
         else:
             try:
-                await target.timeout(
-                    Utils.utcnow() + timedelta(seconds=real_duration) , reason=reason
-                )
+                await self.timeout_member(target, timedelta(seconds=real_duration), interaction.user.id, reason, duration)
             except:
                 self.bot.error(f"I'm not able to timeout {target}", interaction)
             else:
@@ -167,11 +229,235 @@ class Moderate(Plugin):
         except:
             await self.bot.error(f"I'm not able to unmute {target}", interaction)
         else:
+            self._case(interaction, "unmute", target.id, reason)
             await self.bot.success(f"Successfully unmuted **{target}**", interaction)
             
             
             
             
+    #====================== Bulk Moderation ===================
+
+    async def _bulk_targets(
+        self,
+        interaction: Interaction,
+        ids: Optional[str],
+        role: Optional[Role],
+        joined: Optional[float],
+        found: bool = False
+    ) -> Tuple[List[Member], List[int], List[str]]:
+        """Resolve bulk targets into members, ids of users not in the guild, and skip reasons.
+
+        With ``found`` the authors of the moderator's last /search results are targeted too.
+        """
+        guild = interaction.guild
+        assert guild is not None and isinstance(interaction.user, Member)
+        if role is not None or joined is not None:
+            await self.bot.ensure_chunked(guild, interaction)
+
+        wanted = {int(i) for i in re.findall(r"\d{15,20}", ids or "")}
+        if role is not None:
+            if role.is_default():
+                wanted.update(m.id for m in guild.members)
+            else:
+                wanted.update(self.bot.role_members.get(guild).members(role.id))
+        if joined is not None:
+            since = Utils.utcnow() - timedelta(seconds=joined)
+            wanted.update(m.id for m in guild.members if m.joined_at and m.joined_at >= since)
+        skipped: List[str] = []
+        if found:
+            result = self.bot.search_index.last(guild.id, interaction.user.id)
+            if result is not None:
+                # Authors who left can't be told apart from deleted or
+                # webhook users by id, so only current members are taken.
+                wanted.update(user_id for user_id in result.author_ids if guild.get_member(user_id) is not None)
+            else:
+                skipped.append(self._no_search_results())
+
+        protected = {interaction.user.id, guild.owner_id, self.bot.user.id}
+        members: List[Member] = []
+        outside: List[int] = []
+        for user_id in wanted:
+            if user_id in protected:
+                skipped.append(f"<@{user_id}>: can't be moderated")
+                continue
+            member = guild.get_member(user_id)
+            if member is None:
+                outside.append(user_id)
+            elif not can_moderate_member(interaction.user, member):
+                skipped.append(f"{member}: can't be moderated")
+            else:
+                members.append(member)
+        return members, outside, skipped
+
+    def _no_search_results(self) -> str:
+        minutes = int(self.bot.search_index.results_ttl // 60)
+        return f"You have no /search results, or they expired after {minutes} minutes. Run /search again."
+
+    async def _run_bulk(
+        self,
+        interaction: Interaction,
+        verb: str,
+        targets: Sequence[object],
+        runner: BulkRunner,
+        skipped: List[str]
+    ) -> None:
+        if not targets:
+            if not skipped:
+                return await self.bot.error("No targets matched.", interaction)
+            reasons = "\n".join(f"- {reason}" for reason in skipped[:10])
+            if len(skipped) > 10:
+                reasons += f"\n- ...and {len(skipped) - 10} more"
+            return await self.bot.error(f"No targets left:\n{reasons}"[:4000], interaction)
+        if runner.progress.total > MAX_BULK_TARGETS:
+            return await self.bot.error(
+                f"That matches {runner.progress.total} users, the limit is {MAX_BULK_TARGETS}.", interaction
+            )
+        runner.progress.failed.extend(skipped)
+
+        def render(progress: BulkProgress) -> Embed:
+            return Embed(
+                title=f"{verb} finished" if progress.finished else f"{verb}...",
+                description=progress.summary(verb)[:4096],
+                color=discord.Color.green() if progress.finished else discord.Color.orange()
+            )
+
+        message = await interaction.followup.send(embed=render(runner.progress), wait=True)
+
+        async def update(progress: BulkProgress) -> None:
+            try:
+                await message.edit(embed=render(progress))
+            except discord.HTTPException:
+                pass
+
+        await runner.run(update)
+
+    @app_commands.command(name="massban", description="Ban many users at once.")
+    @rate_limit(2, 60.0, "guild")
+    @app_commands.default_permissions(ban_members=True)
+    @app_commands.guild_only()
+    @app_commands.describe(
+        ids="User ids or mentions separated by spaces.",
+        role="Ban every member with this role.",
+        joined="Ban members who joined within this time. (10m, 1h)",
+        found="Ban the authors of the messages your last /search found.",
+        reason="Reason for the bans."
+    )
+    async def mass_ban_command(
+        self,
+        interaction: Interaction,
+        ids: Optional[str],
+        role: Optional[Role],
+        joined: Optional[str],
+        reason: Optional[str],
+        found: bool = False
+    ):
+        reason = reason or "No reason provided."
+        within = await self._parse_timespan(interaction, joined)
+        if within is False:
+            return
+        await interaction.response.defer(thinking=True)
+        members, outside, skipped = await self._bulk_targets(interaction, ids, role, within, found)
+        users: List[discord.abc.Snowflake] = [*members, *(discord.Object(i) for i in outside)]
+        chunks = [users[i:i + BULK_BAN_CHUNK] for i in range(0, len(users), BULK_BAN_CHUNK)]
+        guild = interaction.guild
+        assert guild is not None
+
+        async def ban(chunk: List[discord.abc.Snowflake]) -> List[str]:
+            result = await guild.bulk_ban(chunk, reason=reason, delete_message_seconds=0)
+            for user in result.banned:
+                self._case(interaction, "ban", user.id, reason, "mass ban")
+            return [f"<@{user.id}>: not banned" for user in result.failed]
+
+        runner = BulkRunner(
+            chunks, ban, lambda chunk: f"{len(chunk)} users", size=len, concurrency=1
+        )
+        await self._run_bulk(interaction, "Banned", chunks, runner, skipped)
+
+    @app_commands.command(name="masskick", description="Kick many members at once.")
+    @rate_limit(2, 60.0, "guild")
+    @app_commands.default_permissions(kick_members=True)
+    @app_commands.guild_only()
+    @app_commands.describe(
+        ids="Member ids or mentions separated by spaces.",
+        role="Kick every member with this role.",
+        joined="Kick members who joined within this time. (10m, 1h)",
+        found="Kick the authors of the messages your last /search found.",
+        reason="Reason for the kicks."
+    )
+    async def mass_kick_command(
+        self,
+        interaction: Interaction,
+        ids: Optional[str],
+        role: Optional[Role],
+        joined: Optional[str],
+        reason: Optional[str],
+        found: bool = False
+    ):
+        reason = reason or "No reason provided."
+        within = await self._parse_timespan(interaction, joined)
+        if within is False:
+            return
+        await interaction.response.defer(thinking=True)
+        members, outside, skipped = await self._bulk_targets(interaction, ids, role, within, found)
+        skipped.extend(f"<@{user_id}>: not a member" for user_id in outside)
+        async def kick(member: Member) -> None:
+            await member.kick(reason=reason)
+            self._case(interaction, "kick", member.id, reason, "mass kick")
+
+        runner = BulkRunner(members, kick, str)
+        await self._run_bulk(interaction, "Kicked", members, runner, skipped)
+
+    @app_commands.command(name="masstimeout", description="Timeout many members at once.")
+    @rate_limit(2, 60.0, "guild")
+    @app_commands.default_permissions(moderate_members=True)
+    @app_commands.guild_only()
+    @app_commands.describe(
+        ids="Member ids or mentions separated by spaces.",
+        role="Timeout every member with this role.",
+        joined="Timeout members who joined within this time. (10m, 1h)",
+        found="Timeout the authors of the messages your last /search found.",
+        duration="Duration of the timeout. (1d, 1m, 10s)",
+        reason="Reason for the timeouts."
+    )
+    async def mass_timeout_command(
+        self,
+        interaction: Interaction,
+        ids: Optional[str],
+        role: Optional[Role],
+        joined: Optional[str],
+        duration: Optional[str],
+        reason: Optional[str],
+        found: bool = False
+    ):
+        try:
+            seconds = parse_timespan(duration or "1d")
+        except InvalidTimespan:
+            return await self.bot.error(f"**{duration}** is not valid", interaction)
+        within = await self._parse_timespan(interaction, joined)
+        if within is False:
+            return
+        await interaction.response.defer(thinking=True)
+        members, outside, skipped = await self._bulk_targets(interaction, ids, role, within, found)
+        skipped.extend(f"<@{user_id}>: not a member" for user_id in outside)
+        until = Utils.utcnow() + timedelta(seconds=seconds)
+        async def timeout(member: Member) -> None:
+            await member.timeout(until, reason=reason)
+            self._case(interaction, "mute", member.id, reason, f"mass timeout, {duration or '1d'}")
+
+        runner = BulkRunner(members, timeout, str)
+        await self._run_bulk(interaction, "Timed out", members, runner, skipped)
+
+    async def _parse_timespan(self, interaction: Interaction, value: Optional[str]) -> Union[float, None, Literal[False]]:
+        """Parse a timespan option, replying with an error and returning False if invalid."""
+        if value is None:
+            return None
+        try:
+            return parse_timespan(value)
+        except InvalidTimespan:
+            await self.bot.error(f"**{value}** is not valid", interaction)
+            return False
+
+
     #====================== Clear Messages ===================
  
     
@@ -191,15 +477,32 @@ class Moderate(Plugin):
         
     @app_commands.command(name="purge", description="Purges messages in a channel.")
     @app_commands.default_permissions(manage_messages=True)
+    @app_commands.guild_only()
     @app_commands.describe(
         channel="Channel to purge messages in.",
-        amount="Number of messages to purge."
+        amount="Number of messages to search through.",
+        user="Only delete messages from this user.",
+        contains="Only delete messages containing this text.",
+        bots="Only delete messages sent by bots.",
+        attachments="Only delete messages with attachments.",
+        before="Only delete messages older than this. (1h, 2d)",
+        after="Only delete messages newer than this. (1h, 2d)",
+        resume="Continue the last unfinished purge in this channel.",
+        found="Delete the messages your last /search found in this channel instead of searching."
     )
     async def purge_command(
         self,
         interaction: Interaction,
         channel: TextChannel,
-        amount: int
+        amount: int,
+        user: Optional[User] = None,
+        contains: Optional[str] = None,
+        bots: bool = False,
+        attachments: bool = False,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        resume: bool = False,
+        found: bool = False
     ):
         if not isinstance(channel, TextChannel):
             await self.bot.error("Invalid channel provided", interaction)
@@ -207,18 +510,242 @@ class Moderate(Plugin):
         if amount <= 0:
             await self.bot.error("Invalid amount. Please provide a positive integer.", interaction)
             return
+        if channel.id in self.purging:
+            await self.bot.error(f"A purge is already running in {channel.mention}.", interaction)
+            return
+
+        given = [
+            name for name, value in (
+                ("user", user), ("contains", contains), ("bots", bots),
+                ("attachments", attachments), ("before", before), ("after", after)
+            ) if value
+        ]
+        options = ", ".join(f"`{name}`" for name in given)
+        if resume:
+            if given:
+                await self.bot.error(
+                    f"`resume` keeps the filters of the stopped purge, it can't be combined with {options}.",
+                    interaction
+                )
+                return
+            job = self.purges.get(channel.id)
+            if job is None or not job.resumable:
+                await self.bot.error(f"There is no unfinished purge in {channel.mention}.", interaction)
+                return
+        elif found:
+            if given:
+                await self.bot.error(
+                    f"`found` deletes exactly what /search found, it can't be combined with {options}.", interaction
+                )
+                return
+            result = self.bot.search_index.last(channel.guild.id, interaction.user.id)
+            if result is None:
+                await self.bot.error(self._no_search_results(), interaction)
+                return
+            message_ids = result.message_ids(channel.id)
+            if not message_ids:
+                await self.bot.error(f"Your last /search found nothing in {channel.mention}.", interaction)
+                return
+            job = PurgeJob(channel.id, min(amount, len(message_ids)), message_ids=message_ids)
+        else:
+            older = await self._parse_timespan(interaction, before)
+            if older is False:
+                return
+            newer = await self._parse_timespan(interaction, after)
+            if newer is False:
+                return
+            now = Utils.utcnow()
+            job = PurgeJob(
+                channel.id,
+                amount,
+                PurgeFilter(
+                    author_id=user.id if user else None,
+                    contains=contains,
+                    bots_only=bots,
+                    attachments_only=attachments
+                ),
+                before=now - timedelta(seconds=older) if older is not None else None,
+                after=now - timedelta(seconds=newer) if newer is not None else None
+            )
+        self.purges[channel.id] = job
+
+        await interaction.response.defer(thinking=True)
+        message = await interaction.followup.send(
+            embed=Embed(description=job.summary(), color=discord.Color.orange()), wait=True
+        )
+
+        async def update(job: PurgeJob) -> None:
+            color = discord.Color.green() if job.finished else discord.Color.orange()
+            try:
+                await message.edit(embed=Embed(description=job.summary(), color=color))
+            except discord.HTTPException:
+                pass
+
+        self.purging.add(channel.id)
+        deleted = job.deleted
         try:
-            await channel.purge(limit=amount)
-        except Exception as e:
+            await self.purge_engine.run(channel, job, update)
+        except discord.HTTPException as e:
             await self.bot.error(f"Unable to purge messages: {e}", interaction)
-        else:
-            await self.bot.success(f"Purged {amount} messages in {channel}", interaction)
+        finally:
+            self.purging.discard(channel.id)
+            if job.deleted > deleted:
+                self._case(interaction, "purge", channel.id, None, f"{job.deleted - deleted} messages")
+
+    @app_commands.command(name="purgecancel", description="Cancel the purge running in a channel.")
+    @app_commands.default_permissions(manage_messages=True)
+    @app_commands.guild_only()
+    @app_commands.describe(channel="Channel the purge is running in.")
+    async def purge_cancel_command(self, interaction: Interaction, channel: TextChannel):
+        job = self.purges.get(channel.id)
+        if job is None or channel.id not in self.purging:
+            return await self.bot.error(f"No purge is running in {channel.mention}.", interaction)
+        job.cancel()
+        await self.bot.success(
+            f"Cancelled the purge in {channel.mention}. Use `resume` on /purge to continue it.", interaction
+        )
+
+    #====================== Raids ===================
+
+    @Plugin.listener("on_raid_detected")
+    async def on_raid_detected(self, guild: discord.Guild, members: List[Member]):
+        await self._raid_action(guild, members)
+
+    @Plugin.listener("on_raid_member_join")
+    async def on_raid_member_join(self, member: Member):
+        await self._raid_action(member.guild, [member])
+
+    async def _raid_action(self, guild: discord.Guild, members: List[Member]) -> None:
+        action = self.bot.settings.get(guild.id).raid_action
+        if action is None:
+            return
+        assert self.bot.user is not None
+        reason = "Joined during a raid"
+        # Members may have left, or been actioned by an earlier event.
+        members = [
+            m for m in members
+            if guild.get_member(m.id) is not None and not m.bot and not m.is_timed_out()
+        ]
+
+        async def apply(member: Member) -> None:
+            assert self.bot.user is not None
+            if action == "kick":
+                await member.kick(reason=reason)
+                self.bot.cases.record(guild.id, "kick", member.id, self.bot.user.id, reason, "raid")
+            else:
+                await self.timeout_member(member, timedelta(days=1), self.bot.user.id, reason, "raid")
+
+        progress = await BulkRunner(members, apply, str).run()
+        if progress.failed:
+            log.warning(f"Raid action {action} in {guild.id}: " + progress.summary("Applied to"))
+
+    #====================== Search ===================
+
+    @app_commands.command(name="search", description="Find recent messages by keyword or author.")
+    @rate_limit(5, 30.0, "member")
+    @app_commands.default_permissions(manage_messages=True)
+    @app_commands.guild_only()
+    @app_commands.describe(
+        query="Words the messages must all contain.",
+        author="Only find messages sent by this user.",
+        channel="Only search this channel, else every channel you can read.",
+        limit="Maximum number of messages to find."
+    )
+    async def search_command(
+        self,
+        interaction: Interaction,
+        query: Optional[str] = None,
+        author: Optional[User] = None,
+        channel: Optional[TextChannel] = None,
+        limit: app_commands.Range[int, 1, 1000] = 100
+    ):
+        guild = interaction.guild
+        assert guild is not None and isinstance(interaction.user, Member)
+        if not self.bot.profile.search_index_bytes:
+            return await self.bot.error("Message search is turned off in this cache profile.", interaction)
+        if not query and author is None:
+            return await self.bot.error("Give some words to search for, an author, or both.", interaction)
+
+        channel_ids = [channel.id] if channel is not None else self.bot.search_index.channels(guild.id)
+        readable = []
+        for channel_id in channel_ids:
+            target = guild.get_channel_or_thread(channel_id)
+            if target is not None and target.permissions_for(interaction.user).read_message_history:
+                readable.append(channel_id)
+        messages = self.bot.search_index.search(readable, query, author.id if author else None, limit)
+        self.bot.search_index.remember(
+            guild.id, interaction.user.id, SearchResult(query or "", messages, time.monotonic())
+        )
+
+        def lines():
+            if messages:
+                yield "Use `found` on /purge, /massban, /masskick or /masstimeout to act on these.\n"
+            for message in messages:
+                content = Utils.escape_markdown(Utils.escape_mentions(message.content[:100])).replace("\n", " ")
+                yield (
+                    f"<t:{int(message.created_at.timestamp())}:R> <#{message.channel_id}> <@{message.author_id}> "
+                    f"[jump]({message.jump_url}): {content or '*no text*'}"
+                )
+
+        paginator = Paginator(
+            f"Found {len(messages)} messages",
+            lines,
+            separator="\n",
+            empty="No recent messages matched.",
+            author_id=interaction.user.id
+        )
+        await paginator.send(interaction, ephemeral=True)
+
+    #====================== Cases ===================
+
+    async def _send_cases(self, interaction: Interaction, title: str, target_id: Optional[int] = None) -> None:
+        guild = interaction.guild
+        assert guild is not None
+
+        async def cases():
+            async for case in self.bot.cases.iterate(guild.id, target_id):
+                yield case.describe()
+
+        paginator = Paginator(
+            title, cases, separator="\n", empty="No cases recorded.", author_id=interaction.user.id
+        )
+        await paginator.send(interaction, ephemeral=True)
+
+    @app_commands.command(name="cases", description="List the moderation cases of the server.")
+    @rate_limit(5, 30.0, "member")
+    @app_commands.default_permissions(moderate_members=True)
+    @app_commands.guild_only()
+    async def cases_command(self, interaction: Interaction):
+        await self._send_cases(interaction, f"Cases in {interaction.guild}")
+
+    @app_commands.command(name="history", description="List the moderation cases of a user.")
+    @rate_limit(5, 30.0, "member")
+    @app_commands.default_permissions(moderate_members=True)
+    @app_commands.guild_only()
+    @app_commands.describe(user="User to show the cases of.")
+    async def history_command(self, interaction: Interaction, user: User):
+        await self._send_cases(interaction, f"Cases of {user}", user.id)
             
     
 
             
     #====================== Lock Channel ===================
-    
+
+    def _lock_keep(self, guild: discord.Guild) -> Set[int]:
+        """Roles whose overwrites a lock leaves alone: moderators' and the bot's own."""
+        keep = {role.id for role in guild.me.roles}
+        keep.update(
+            role.id for role in guild.roles
+            if role.permissions.administrator or role.permissions.manage_messages or role.permissions.moderate_members
+        )
+        return keep
+
+    async def _lock_channel(self, channel: discord.abc.GuildChannel, keep: Set[int], reason: str) -> None:
+        await channel.edit(overwrites=locked_overwrites(channel, keep), reason=reason)
+
+    async def _restore_channel(self, channel: discord.abc.GuildChannel, snapshot: ChannelSnapshot, reason: str) -> None:
+        await channel.edit(overwrites=snapshot.restored(), reason=reason)
+
     @app_commands.command(
         name="lock",
         description="Lock the channel."
@@ -231,9 +758,13 @@ class Moderate(Plugin):
     async def lock_command(self, interaction: Interaction, channel: Optional[TextChannel]):
         target = channel or interaction.channel
         assert interaction.guild is not None and isinstance(target, TextChannel)
+        if any(s.channel_id == target.id for s in await self.lockdowns.load(interaction.guild.id)):
+            return await self.bot.error(f"**{target}** is already locked.", interaction)
+        await self.lockdowns.save(interaction.guild.id, [ChannelSnapshot.of(target)])
         try:
-            await target.set_permissions(interaction.guild.default_role, send_messages=False)
-        except:
+            await self._lock_channel(target, self._lock_keep(interaction.guild), f"Locked by {interaction.user}")
+        except discord.HTTPException:
+            await self.lockdowns.forget(interaction.guild.id, [target.id])
             await self.bot.error(f"I'm not able to lock {target} channel.", interaction)
         else:
             await self.bot.success(f"Successfully locked **{target}** channel.", interaction)
@@ -250,44 +781,156 @@ class Moderate(Plugin):
     async def unlock_command(self, interaction: Interaction, channel: Optional[TextChannel]):
         target = channel or interaction.channel
         assert interaction.guild is not None and isinstance(target, TextChannel)
+        snapshot = next((s for s in await self.lockdowns.load(interaction.guild.id) if s.channel_id == target.id), None)
         try:
-            await target.set_permissions(interaction.guild.default_role, send_messages=True)
-        except:
+            if snapshot is not None:
+                await self._restore_channel(target, snapshot, f"Unlocked by {interaction.user}")
+                await self.lockdowns.forget(interaction.guild.id, [target.id])
+            else:
+                # Locked some other way; only undo the lock on @everyone.
+                await target.set_permissions(interaction.guild.default_role, send_messages=None)
+        except discord.HTTPException:
             await self.bot.error(f"I'm not able to unlock {target} channel.", interaction)
         else:
             await self.bot.success(f"Successfully unlocked **{target}** channel.", interaction)
-            
-        
-    #====================== Restart the Bot ===================
-    
-    @app_commands.command(name="restart", description="Restart the bot")
-    @app_commands.default_permissions(administrator=True)  
-    async def restart(self, interaction: Interaction):
 
-        if not interaction.user.guild_permissions.administrator:
-            await interaction.response.send_message("You do not have permissions to use this command")
-            return
+    #====================== Lockdown ===================
 
-        embed = discord.Embed(title="Restarting...", color=discord.Color.orange())
-        await interaction.response.send_message(embed=embed)
+    lockdown = app_commands.Group(
+        name="lockdown",
+        description="Lock or unlock every text channel at once",
+        default_permissions=Permissions(manage_channels=True),
+        guild_only=True
+    )
 
+    @lockdown.command(name="start", description="Lock every text channel, or those of one category.")
+    @rate_limit(2, 60.0, "guild")
+    @app_commands.describe(category="Only lock the channels in this category.", reason="Reason for the lockdown.")
+    async def lockdown_start_command(
+        self,
+        interaction: Interaction,
+        category: Optional[CategoryChannel] = None,
+        reason: Optional[str] = None
+    ):
+        guild = interaction.guild
+        assert guild is not None
+        if guild.id in self._locking:
+            return await self.bot.error("A lockdown is already being started or ended.", interaction)
+        self._locking.add(guild.id)
         try:
-            restart_script = "main.py"
-            print(f"Restarting with: {sys.executable}")
+            await interaction.response.defer(thinking=True)
+            locked = {s.channel_id for s in await self.lockdowns.load(guild.id)}
+            channels: List[TextChannel] = []
+            skipped: List[str] = []
+            for channel in category.text_channels if category is not None else guild.text_channels:
+                if channel.id in locked:
+                    continue
+                if not channel.permissions_for(guild.me).manage_roles:
+                    skipped.append(f"{channel.mention}: missing Manage Permissions")
+                else:
+                    channels.append(channel)
+            if not channels and not skipped:
+                return await self.bot.error("Every channel is already locked.", interaction)
+
+            # Written before anything changes, so the lockdown can be ended even if this is interrupted.
+            await self.lockdowns.save(guild.id, [ChannelSnapshot.of(channel) for channel in channels])
+            keep = self._lock_keep(guild)
+            audit_reason = f"Lockdown by {interaction.user}: {reason or 'No reason provided.'}"
+
+            async def lock(channel: TextChannel) -> None:
+                try:
+                    await self._lock_channel(channel, keep, audit_reason)
+                except discord.HTTPException:
+                    await self.lockdowns.forget(guild.id, [channel.id])
+                    raise
+
+            runner = BulkRunner(channels, lock, lambda channel: channel.mention, concurrency=LOCKDOWN_CONCURRENCY)
+            await self._run_bulk(interaction, "Locked", channels, runner, skipped)
+        finally:
+            self._locking.discard(guild.id)
+
+    @lockdown.command(name="end", description="Unlock the channels locked by /lockdown and /lock, exactly as they were.")
+    @rate_limit(2, 60.0, "guild")
+    async def lockdown_end_command(self, interaction: Interaction):
+        guild = interaction.guild
+        assert guild is not None
+        if guild.id in self._locking:
+            return await self.bot.error("A lockdown is already being started or ended.", interaction)
+        self._locking.add(guild.id)
+        try:
+            snapshots = await self.lockdowns.load(guild.id)
+            if not snapshots:
+                return await self.bot.error("No channels are locked.", interaction)
+            await interaction.response.defer(thinking=True)
+            gone = [s.channel_id for s in snapshots if guild.get_channel(s.channel_id) is None]
+            await self.lockdowns.forget(guild.id, gone)
+            snapshots = [s for s in snapshots if s.channel_id not in gone]
+            restored: List[int] = []
+            audit_reason = f"Lockdown ended by {interaction.user}"
+
+            async def restore(snapshot: ChannelSnapshot) -> None:
+                channel = guild.get_channel(snapshot.channel_id)
+                assert channel is not None
+                await self._restore_channel(channel, snapshot, audit_reason)
+                restored.append(snapshot.channel_id)
+
+            runner = BulkRunner(
+                snapshots, restore, lambda snapshot: f"<#{snapshot.channel_id}>", concurrency=LOCKDOWN_CONCURRENCY
+            )
             try:
-                os.execv(sys.executable, [sys.executable, restart_script])  
-            except Exception as e:
-                print(f"Restart failed: {e}")
-                embed = discord.Embed(title="Restart failed", description=str(e))
-                await interaction.followup.send(embed=embed)
-                raise e
-        except Exception as e:
-            print(f"Error closing client: {e}")
-            embed = discord.Embed(title="Restart failed", description=str(e))
-            await interaction.followup.send(embed=embed)
-            raise e
+                await self._run_bulk(interaction, "Unlocked", snapshots, runner, [])
+            finally:
+                await self.lockdowns.forget(guild.id, restored)
         finally:
-            print("Bot has been restarted")
+            self._locking.discard(guild.id)
+
+
+    #====================== Reload the Bot ===================
+    
+    @app_commands.command(name="reload", description="Reload the bot's plugins without restarting")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(extension="Only reload this extension, e.g. cogs.Utility.plugin")
+    async def reload(self, interaction: Interaction, extension: Optional[str] = None):
+        # Plugins are shared by every guild, so only the owner may swap them.
+        if not await self.bot.is_owner(interaction.user):
+            return await self.bot.error("Only the bot owner can reload plugins.", interaction)
+        if extension is not None and extension not in self.bot.extensions:
+            return await self.bot.error(f"**{extension}** is not loaded.", interaction)
+
+        embed = discord.Embed(title="Reloading...", color=discord.Color.orange())
+        await interaction.response.send_message(embed=embed)
+
+        results = await self.bot.reload_plugins([extension] if extension else None)
+        failed = [result for result in results if result.error]
+        embed = discord.Embed(
+            title="Reload failed" if failed else "Reloaded",
+            color=discord.Color.red() if failed else discord.Color.green()
+        )
+        embed.description = "\n".join(
+            f"{'❌' if result.error else '✅'} `{result.extension}` {result.elapsed * 1000:.1f}ms"
+            + (f"\n> {result.error}" if result.error else "")
+            for result in results
+        )[:4096]
+        if failed:
+            embed.set_footer(text="Failed extensions kept their previous version.")
+        await interaction.edit_original_response(embed=embed)
+
+    @app_commands.command(name="restartcluster", description="Restart one cluster process of the bot")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(cluster="Id of the cluster to restart")
+    async def restart_cluster(self, interaction: Interaction, cluster: int):
+        if not await self.bot.is_owner(interaction.user):
+            return await self.bot.error("Only the bot owner can restart clusters.", interaction)
+        if self.bot.cluster is None:
+            return await self.bot.error("The bot is not running in cluster mode.", interaction)
+        if cluster == self.bot.cluster.cluster_id:
+            await self.bot.success(f"Restarting cluster **{cluster}** (this one).", interaction)
+            await self.bot.cluster.restart(cluster)
+            return
+        if await self.bot.cluster.restart(cluster):
+            await self.bot.success(f"Restarting cluster **{cluster}**.", interaction)
+        else:
+            await self.bot.error(f"Cluster **{cluster}** is not running.", interaction)
 
    
 async def setup(bot: Bot):
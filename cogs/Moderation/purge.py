@@ -0,0 +1,224 @@
+from __future__ import annotations
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+import discord
+from logging import getLogger
+log = getLogger(__name__)
+
+
+__all__ = ("PurgeFilter", "PurgeJob", "PurgeEngine")
+
+# Discord refuses to bulk delete messages older than 14 days; keep a margin
+# so a message doesn't age out between being fetched and being deleted.
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+BULK_DELETE_SIZE = 100
+
+
+@dataclass
+class PurgeFilter:
+    author_id: Optional[int] = None
+    contains: Optional[str] = None
+    bots_only: bool = False
+    attachments_only: bool = False
+
+    def __call__(self, message: discord.Message) -> bool:
+        if self.author_id is not None and message.author.id != self.author_id:
+            return False
+        if self.bots_only and not message.author.bot:
+            return False
+        if self.attachments_only and not message.attachments:
+            return False
+        if self.contains is not None and self.contains.lower() not in message.content.lower():
+            return False
+        return True
+
+
+@dataclass
+class PurgeJob:
+    """State of one purge, kept so it can report progress and be resumed.
+
+    ``cursor`` is the id of the oldest message scanned so far; resuming
+    continues from just before it. ``unsent`` holds matches the job
+    stopped before deleting, which a resume deletes first. With
+    ``message_ids`` only those messages are deleted, without scanning
+    the channel's history.
+    """
+
+    channel_id: int
+    limit: int
+    filter: PurgeFilter = field(default_factory=PurgeFilter)
+    before: Optional[datetime] = None
+    after: Optional[datetime] = None
+    message_ids: Optional[List[int]] = None
+    scanned: int = 0
+    deleted: int = 0
+    failed: int = 0
+    cursor: Optional[int] = None
+    unsent: List[int] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+    finished: bool = False
+    cancelled: bool = False
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def resumable(self) -> bool:
+        return not self.finished and (self.scanned < self.limit or bool(self.unsent))
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def summary(self) -> str:
+        rate = self.deleted / self.elapsed if self.elapsed else 0.0
+        status = "cancelled" if self.cancelled else "done" if self.finished else "running"
+        return (
+            f"Deleted **{self.deleted}** of {self.scanned}/{self.limit} scanned messages "
+            f"({self.failed} failed, {rate:.0f}/s, {status})"
+        )
+
+
+async def _partial_messages(channel: Any, job: PurgeJob) -> AsyncIterator[discord.PartialMessage]:
+    """The job's messages newest first, past its cursor, without fetching them."""
+    assert job.message_ids is not None
+    for message_id in sorted(job.message_ids, reverse=True)[:job.limit]:
+        if job.cursor is None or message_id < job.cursor:
+            yield channel.get_partial_message(message_id)
+
+
+class PurgeEngine:
+    """Deletes the messages of a channel that match a :class:`PurgeFilter`.
+
+    Recent matches are deleted 100 at a time through the bulk endpoint,
+    with one bulk request in flight while the next page of history is
+    fetched. Matches older than 14 days can only be deleted one by one;
+    they are handed to ``old_concurrency`` workers. ``on_progress`` is
+    called at most every ``interval`` seconds and once at the end.
+
+    A job that is cancelled, or whose history fetch fails, keeps every
+    match it hadn't sent a deletion for, so it can be resumed; the fetch
+    error is raised.
+    """
+
+    def __init__(self, *, old_concurrency: int = 3, interval: float = 2.0) -> None:
+        self.old_concurrency = old_concurrency
+        self.interval = interval
+
+    async def run(
+        self,
+        channel: Any,
+        job: PurgeJob,
+        on_progress: Optional[Callable[[PurgeJob], Awaitable[None]]] = None
+    ) -> PurgeJob:
+        job.cancelled = False
+        job.finished = False
+        job.started = time.monotonic()
+        old: asyncio.Queue[Optional[Any]] = asyncio.Queue(maxsize=BULK_DELETE_SIZE)
+        workers = [asyncio.create_task(self._delete_old(old, job)) for _ in range(self.old_concurrency)]
+        reporter = asyncio.create_task(self._report(job, on_progress)) if on_progress else None
+
+        completed = False
+        try:
+            await self._scan(channel, job, old)
+            completed = True
+        finally:
+            for _ in workers:
+                await old.put(None)
+            await asyncio.gather(*workers)
+            job.finished = completed and not job.cancelled
+            if reporter is not None:
+                reporter.cancel()
+                try:
+                    await reporter
+                except asyncio.CancelledError:
+                    pass
+                await on_progress(job)
+        return job
+
+    async def _scan(self, channel: Any, job: PurgeJob, old: asyncio.Queue[Optional[Any]]) -> None:
+        before = discord.Object(job.cursor) if job.cursor else job.before
+        batch: List[discord.abc.Snowflake] = []
+        in_flight: Optional[asyncio.Task[None]] = None
+        cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+
+        async def flush() -> None:
+            nonlocal batch, in_flight
+            if in_flight is not None:
+                await in_flight
+            if batch:
+                in_flight = asyncio.create_task(self._delete_bulk(channel, batch, job))
+                batch = []
+
+        async def delete(message: Any) -> None:
+            if message.created_at < cutoff:
+                await old.put(message)
+                return
+            batch.append(message)
+            if len(batch) == BULK_DELETE_SIZE:
+                await flush()
+
+        if job.message_ids is not None:
+            messages = _partial_messages(channel, job)
+        else:
+            messages = channel.history(
+                limit=job.limit - job.scanned, before=before, after=job.after, oldest_first=False
+            )
+        try:
+            # Matches left over from a stopped run were already scanned and filtered.
+            while job.unsent and not job.cancelled:
+                await delete(channel.get_partial_message(job.unsent.pop(0)))
+            async for message in messages:
+                if job.cancelled:
+                    break
+                job.scanned += 1
+                job.cursor = message.id
+                if job.filter(message):
+                    await delete(message)
+            if not job.cancelled:
+                await flush()
+        finally:
+            job.unsent.extend(message.id for message in batch)
+            if in_flight is not None:
+                await in_flight
+
+    async def _delete_bulk(self, channel: Any, messages: List[Any], job: PurgeJob) -> None:
+        try:
+            if len(messages) == 1:
+                await messages[0].delete()
+            else:
+                await channel.delete_messages(messages)
+        except discord.NotFound:
+            # Somebody else removed one of them first; fall back to one by one.
+            for message in messages:
+                await self._delete_one(message, job)
+        except discord.HTTPException:
+            log.exception(f"Bulk delete of {len(messages)} messages failed")
+            job.failed += len(messages)
+        else:
+            job.deleted += len(messages)
+
+    async def _delete_one(self, message: Any, job: PurgeJob) -> None:
+        try:
+            await message.delete()
+        except discord.NotFound:
+            pass
+        except discord.HTTPException:
+            job.failed += 1
+        else:
+            job.deleted += 1
+
+    async def _delete_old(self, queue: asyncio.Queue[Optional[Any]], job: PurgeJob) -> None:
+        while (message := await queue.get()) is not None:
+            if job.cancelled:
+                job.unsent.append(message.id)
+            else:
+                await self._delete_one(message, job)
+
+    async def _report(self, job: PurgeJob, on_progress: Callable[[PurgeJob], Awaitable[None]]) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await on_progress(job)
@@ -0,0 +1,188 @@
+from __future__ import annotations
+from core import Bot, Embed
+from discord import app_commands, Interaction, Permissions, TextChannel
+from humanfriendly import parse_timespan, InvalidTimespan
+from typing import Any, Dict, Literal, Optional
+from .. import Plugin
+from logging import getLogger
+log = getLogger(__name__)
+
+
+SETTING_NAMES = {
+    "join_channel_id": "Join channel",
+    "raid_joins": "Raid joins",
+    "raid_window": "Raid window",
+    "raid_action": "Raid action",
+    "automod_action": "Automod action",
+    "automod_timeout": "Automod timeout",
+    "spam_filter": "Spam filter",
+    "spam_messages": "Spam messages",
+    "spam_mentions": "Spam mentions",
+    "spam_duplicates": "Spam duplicates",
+    "spam_window": "Spam window",
+}
+
+
+def format_setting(name: str, value: object) -> str:
+    if value is None:
+        return "none"
+    if isinstance(value, bool):
+        return "on" if value else "off"
+    if name == "join_channel_id":
+        return f"<#{value}>"
+    if name.endswith(("_window", "_timeout")):
+        return f"{value:g}s"
+    return str(value)
+
+
+class Settings(Plugin):
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+
+    config = app_commands.Group(
+        name="config",
+        description="Change the bot's settings for this server",
+        default_permissions=Permissions(manage_guild=True),
+        guild_only=True
+    )
+
+    @config.command(name="show", description="Show this server's settings")
+    async def config_show_command(self, interaction: Interaction):
+        assert interaction.guild is not None
+        settings = await self.bot.settings.load(interaction.guild.id)
+        defaults = self.bot.settings.defaults
+        embed = Embed(title=f"Settings of {interaction.guild.name}")
+        embed.description = "\n".join(
+            f"**{label}:** {format_setting(name, getattr(settings, name))}"
+            + (" (default)" if getattr(settings, name) == getattr(defaults, name) else "")
+            for name, label in SETTING_NAMES.items()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @config.command(name="joinchannel", description="Set the channel new members are announced in")
+    @app_commands.describe(channel="Channel for join messages, leave empty to turn them off.")
+    async def config_join_channel_command(self, interaction: Interaction, channel: Optional[TextChannel] = None):
+        assert interaction.guild is not None
+        await self.bot.settings.update(interaction.guild.id, join_channel_id=channel.id if channel else None)
+        if channel is None:
+            await self.bot.success("Join messages are turned off.", interaction, ephemeral=True)
+        else:
+            await self.bot.success(f"New members are announced in {channel.mention}.", interaction, ephemeral=True)
+
+    @config.command(name="raid", description="Set when the server counts as raided and what happens then")
+    @app_commands.describe(
+        joins="Joins that start raid mode.",
+        window="Seconds those joins have to happen in.",
+        action="What happens to members who join during a raid."
+    )
+    async def config_raid_command(
+        self,
+        interaction: Interaction,
+        joins: Optional[app_commands.Range[int, 2, 1000]] = None,
+        window: Optional[app_commands.Range[float, 1.0, 600.0]] = None,
+        action: Optional[Literal["none", "timeout", "kick"]] = None
+    ):
+        assert interaction.guild is not None
+        changes = {}
+        if joins is not None:
+            changes["raid_joins"] = joins
+        if window is not None:
+            changes["raid_window"] = window
+        if action is not None:
+            changes["raid_action"] = None if action == "none" else action
+        if not changes:
+            return await self.bot.error("Give at least one of joins, window or action.", interaction)
+        settings = await self.bot.settings.update(interaction.guild.id, **changes)
+        await self.bot.success(
+            f"Raid mode starts after **{settings.raid_joins}** joins within **{settings.raid_window:g}s**, "
+            f"action: **{settings.raid_action or 'none'}**.",
+            interaction, ephemeral=True
+        )
+
+    @config.command(name="automod", description="Set what happens to members caught by automod")
+    @app_commands.describe(
+        action="Only delete the message, or also time out or ban its author.",
+        timeout="How long members are timed out for. (10m, 1h, 1d)"
+    )
+    async def config_automod_command(
+        self,
+        interaction: Interaction,
+        action: Optional[Literal["delete", "timeout", "ban"]] = None,
+        timeout: Optional[str] = None
+    ):
+        assert interaction.guild is not None
+        changes: Dict[str, Any] = {}
+        if action is not None:
+            changes["automod_action"] = action
+        if timeout is not None:
+            try:
+                seconds = parse_timespan(timeout)
+            except InvalidTimespan:
+                return await self.bot.error(f"**{timeout}** is not valid", interaction)
+            if not 60 <= seconds <= 28 * 86400:
+                return await self.bot.error("The timeout must be between 1 minute and 28 days.", interaction)
+            changes["automod_timeout"] = seconds
+        if not changes:
+            return await self.bot.error("Give at least one of action or timeout.", interaction)
+        settings = await self.bot.settings.update(interaction.guild.id, **changes)
+        await self.bot.success(
+            f"Automod action: **{settings.automod_action}**, timeout: **{settings.automod_timeout:g}s**.",
+            interaction, ephemeral=True
+        )
+
+    @config.command(name="spam", description="Set what automod counts as spam")
+    @app_commands.describe(
+        enabled="Turn the spam filter on or off.",
+        messages="Messages a member may send within the window.",
+        mentions="Mentions a member may send within the window.",
+        duplicates="Times a member may repeat the same message within the window.",
+        window="Length of the window in seconds."
+    )
+    async def config_spam_command(
+        self,
+        interaction: Interaction,
+        enabled: Optional[bool] = None,
+        messages: Optional[app_commands.Range[int, 2, 100]] = None,
+        mentions: Optional[app_commands.Range[int, 1, 100]] = None,
+        duplicates: Optional[app_commands.Range[int, 2, 100]] = None,
+        window: Optional[app_commands.Range[float, 1.0, 600.0]] = None
+    ):
+        assert interaction.guild is not None
+        changes = {
+            name: value for name, value in (
+                ("spam_filter", enabled),
+                ("spam_messages", messages),
+                ("spam_mentions", mentions),
+                ("spam_duplicates", duplicates),
+                ("spam_window", window)
+            ) if value is not None
+        }
+        if not changes:
+            return await self.bot.error("Give at least one option.", interaction)
+        settings = await self.bot.settings.update(interaction.guild.id, **changes)
+        await self.bot.success(
+            f"Spam filter **{format_setting('spam_filter', settings.spam_filter)}**: at most "
+            f"**{settings.spam_messages}** messages, **{settings.spam_mentions}** mentions and "
+            f"**{settings.spam_duplicates}** repeats within **{settings.spam_window:g}s**.",
+            interaction, ephemeral=True
+        )
+
+    @config.command(name="reset", description="Put a setting back to the bot's default")
+    @app_commands.describe(setting="Setting to reset, leave empty to reset all of them.")
+    @app_commands.choices(setting=[
+        app_commands.Choice(name=label, value=name) for name, label in SETTING_NAMES.items()
+    ])
+    async def config_reset_command(self, interaction: Interaction, setting: Optional[str] = None):
+        assert interaction.guild is not None
+        if setting is None:
+            await self.bot.settings.reset(interaction.guild.id)
+            return await self.bot.success("All settings are back to their defaults.", interaction, ephemeral=True)
+        settings = await self.bot.settings.reset(interaction.guild.id, setting)
+        await self.bot.success(
+            f"**{SETTING_NAMES[setting]}** is back to {format_setting(setting, getattr(settings, setting))}.",
+            interaction, ephemeral=True
+        )
+
+
+async def setup(bot: Bot) -> None:
+    await bot.add_cog(Settings(bot))
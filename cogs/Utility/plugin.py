@@ -1,11 +1,9 @@
 from  __future__ import annotations
-import asyncio
 import datetime
-from core import Bot, Embed 
+from core import Bot, Embed, Paginator, rate_limit
 from .. import Plugin
 from discord import Interaction, app_commands, Member
 import discord
-import config
 
 
 class Utility(Plugin):
@@ -15,30 +13,72 @@ class Utility(Plugin):
     @app_commands.command(name="ping", description="See bot's latency")
     async def ping_command(self, interaction: Interaction):
         embed=Embed(description=f"My ping is {round(self.bot.latency * 1000)}ms")
+        if len(self.bot.latencies) > 1:
+            embed.add_field(name="Shards", value="\n".join(
+                f"Shard {shard_id}: {round(latency * 1000)}ms" for shard_id, latency in self.bot.latencies
+            ))
         await interaction.response.send_message(embed=embed)
 
+    @app_commands.command(name="stats", description="Show command latency and bot health")
+    @app_commands.default_permissions(administrator=True)
+    async def stats_command(self, interaction: Interaction):
+        metrics = self.bot.metrics
+        metrics.collect()
+        embed = Embed(title="Bot Stats")
+
+        commands = sorted(
+            metrics.histograms.get("command_seconds", {}).items(),
+            key=lambda item: item[1].count,
+            reverse=True
+        )[:10]
+        embed.add_field(name="Commands (p50 / p95)", value="\n".join(
+            f"/{dict(labels)['command']}: {h.quantile(0.5) * 1000:.0f}ms / {h.quantile(0.95) * 1000:.0f}ms ({h.count})"
+            for labels, h in commands
+        ) or "None yet", inline=False)
+
+        lag = metrics.histograms.get("event_loop_lag_seconds", {}).get(())
+        if lag is not None:
+            embed.add_field(
+                name="Event loop lag",
+                value=f"last {self.bot.loop_lag.last * 1000:.1f}ms, p95 {lag.quantile(0.95) * 1000:.1f}ms"
+            )
+        cache = self.bot.responses.stats()
+        embed.add_field(name="Response cache", value=f"{cache['hits']} hits, {cache['misses']} misses")
+        embed.add_field(name="Pending reminders", value=len(self.bot.reminders))
+        embed.add_field(name="Shards", value="\n".join(
+            f"Shard {shard_id}: {round(latency * 1000)}ms" for shard_id, latency in self.bot.latencies
+        ) or "Not connected", inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     @app_commands.command(name='serverinfo', description="Shows the server info")
     async def serverinfo(self, Interaction: discord.Interaction):
         guild = Interaction.guild
-        text_channels = len(guild.text_channels)
-        voice_channels = len(guild.voice_channels)
-        categories = len(guild.categories)
         member_count = guild.member_count
-        online = len([member for member in guild.members if member.status != discord.Status.offline])
-        total_bots = len([member for member in guild.members if member.bot])
-
-        embed = discord.Embed(title=f"{guild.name} Server Info", color=discord.Color.blurple())
-        embed.set_thumbnail(url=guild.icon)
-        embed.add_field(name="Owner", value=f"<@{guild.owner_id}>", inline=True)
-        embed.add_field(name="Created", value=guild.created_at.strftime("%b %d, %Y"), inline=False)
-        embed.add_field(name="Text Channels", value=text_channels, inline=True)
-        embed.add_field(name="Voice Channels", value=voice_channels, inline=True)
-        embed.add_field(name="Categories", value=categories, inline=True)
+        await self.bot.ensure_chunked(guild, Interaction)
+        stats = self.bot.member_stats.get(guild)
+        online = stats.online
+        total_bots = stats.bots
+
+        def build() -> discord.Embed:
+            embed = discord.Embed(title=f"{guild.name} Server Info", color=discord.Color.blurple())
+            embed.set_thumbnail(url=guild.icon)
+            embed.add_field(name="Owner", value=f"<@{guild.owner_id}>", inline=True)
+            embed.add_field(name="Created", value=guild.created_at.strftime("%b %d, %Y"), inline=False)
+            embed.add_field(name="Text Channels", value=len(guild.text_channels), inline=True)
+            embed.add_field(name="Voice Channels", value=len(guild.voice_channels), inline=True)
+            embed.add_field(name="Categories", value=len(guild.categories), inline=True)
+            return embed
+
+        # Member counts change all the time, so they are added after the cached part.
+        embed = self.bot.responses.get_or_build((guild.id, "serverinfo", guild.id), build)
         embed.add_field(name="Total Members", value=member_count, inline=True)
-        embed.add_field(name="Currently Online", value=online, inline=True)
+        # Without the presences intent every member looks offline.
+        embed.add_field(name="Currently Online", value=online if self.bot.intents.presences else "Unknown", inline=True)
         embed.add_field(name="Bots", value=total_bots, inline=True)
+        if not self.bot.intents.presences:
+            embed.set_footer(text=f"Online counts need presences, which the {self.bot.profile.name!r} cache profile turns off.")
 
-        await Interaction.response.send_message(embed=embed)
+        await self.bot.respond(Interaction, embed=embed)
 
 
     @app_commands.command(name="userinfo", description="Shows the user info")
@@ -56,45 +96,39 @@ class Utility(Plugin):
         embed.add_field(name=f"Roles ({len(roles)})", value=" ".join([role.mention for role in roles]))
         embed.add_field(name="Top Role", value=member.top_role.mention)
         embed.add_field(name="Bot?", value=member.bot)
+        use = self.bot.invites.joined_with(member.guild.id, member.id)
+        if use is not None:
+            embed.add_field(name="Joined With", value=use.describe())
         await Interaction.response.send_message(embed=embed)
 
+    @Plugin.listener("on_member_join")
     async def member_on_join(self, member: Member):
+        self.bot.joins.add(member)
 
-        try:
-            channel_id = config.JOIN_CHANNEL_ID
-            channel = self.bot.get_channel(channel_id)
-
-            if not channel:
-                print(f"Channel {channel_id} not found")
-                return
-
-            embed = Embed(title="New Member Joined!", 
-                description=f"{member.mention} just joined the server!")
-
-            await channel.send(embed=embed)
-
-        except Exception as e:
-            print(f"Error sending join message: {e}")
-        
-    
     @app_commands.command(name="roleinfo", description="Get info about a role")
     async def role_info_command(self, interaction: Interaction, role: discord.Role):
-        embed = discord.Embed(title=f"Role Info - {role.name}", color=role.color)
-        embed.add_field(name="ID", value=role.id, inline=True)
-        embed.add_field(name="Color", value=role.color, inline=True)
-        embed.add_field(name="Position", value=role.position, inline=True)
+        def build() -> discord.Embed:
+            embed = discord.Embed(title=f"Role Info - {role.name}", color=role.color)
+            embed.add_field(name="ID", value=role.id, inline=True)
+            embed.add_field(name="Color", value=role.color, inline=True)
+            embed.add_field(name="Position", value=role.position, inline=True)
+            return embed
+
+        embed = self.bot.responses.get_or_build((role.guild.id, "roleinfo", role.id), build)
         await interaction.response.send_message(embed=embed)
 
 
         
         
     @app_commands.command(name="remind", description="Reminds you of something")
+    @rate_limit(5, 60.0)
     async def remind(self, Interaction:discord.Interaction, time:str, *, message:str):
         time_dict = {"s":1, "m":60, "h":3600, "d":86400}
-        if time[-1] not in time_dict:
+        if not time or time[-1] not in time_dict:
             embed = discord.Embed(timestamp=datetime.datetime.utcnow(), color=0xFF0000)
             embed.add_field(name="Invalid Time Format", value="The time format must be s, m, h or d.")
             await Interaction.response.send_message(embed=embed)
+            return
 
         try:
             time_convert = int(time[:-1]) * time_dict[time[-1]]
@@ -102,13 +136,43 @@ class Utility(Plugin):
             embed = discord.Embed(timestamp=datetime.datetime.utcnow(), color=0xFF0000)
             embed.add_field(name="Not a Number", value="The time must be a number.")
             await Interaction.response.send_message(embed=embed)
+            return
+        if time_convert <= 0:
+            embed = discord.Embed(timestamp=datetime.datetime.utcnow(), color=0xFF0000)
+            embed.add_field(name="Invalid Time", value="The time must be more than zero.")
+            await Interaction.response.send_message(embed=embed)
+            return
 
+        reminder = await self.bot.reminders.add(
+            Interaction.user.id, Interaction.channel_id, time_convert, message
+        )
         embed = discord.Embed(title=f"Reminder in {time}", color=discord.Color.green(), timestamp=datetime.datetime.utcnow())
+        embed.set_footer(text=f"Reminder #{reminder.id}")
         await Interaction.response.send_message(embed=embed)
-        await asyncio.sleep(time_convert)
-        embed = discord.Embed(title=f"Reminder", color=discord.Color.green(), timestamp=datetime.utcnow())
-        embed = discord.Embed(description=f"Reminder: {message}", color=discord.Color.green(), timestamp=datetime.utcnow())
-        await Interaction.user.send(embed=embed)
+
+    reminders = app_commands.Group(name="reminders", description="Manage your pending reminders")
+
+    @reminders.command(name="list", description="List your pending reminders")
+    async def reminders_list_command(self, interaction: Interaction):
+        pending = self.bot.reminders.list(interaction.user.id)
+        embed = Embed(title="Your Reminders")
+        if not pending:
+            embed.description = "You have no pending reminders."
+        else:
+            embed.description = "\n".join(
+                f"**#{r.id}** <t:{int(r.due)}:R> - {r.message}" for r in pending[:25]
+            )[:4096]
+            if len(pending) > 25:
+                embed.set_footer(text=f"Showing 25 of {len(pending)} reminders")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @reminders.command(name="cancel", description="Cancel one of your pending reminders")
+    @app_commands.describe(reminder="Id of the reminder to cancel")
+    async def reminders_cancel_command(self, interaction: Interaction, reminder: int):
+        if await self.bot.reminders.cancel(interaction.user.id, reminder):
+            await self.bot.success(f"Cancelled reminder #{reminder}.", interaction, ephemeral=True)
+        else:
+            await self.bot.error(f"You have no pending reminder #{reminder}.", interaction)
 
 
 
@@ -117,11 +181,15 @@ class Utility(Plugin):
 
     @app_commands.command(name="channelinfo", description="Get info about a text channel")  
     async def channel_info_command(self, interaction: Interaction, channel: discord.TextChannel):
-        embed = Embed(title=f"Channel Info - {channel.name}")
-        embed.add_field(name="ID", value=channel.id)
-        embed.add_field(name="Category", value=channel.category) 
-        embed.add_field(name="Position", value=channel.position)
-        embed.add_field(name="NSFW", value=channel.is_nsfw())
+        def build() -> Embed:
+            embed = Embed(title=f"Channel Info - {channel.name}")
+            embed.add_field(name="ID", value=channel.id)
+            embed.add_field(name="Category", value=channel.category) 
+            embed.add_field(name="Position", value=channel.position)
+            embed.add_field(name="NSFW", value=channel.is_nsfw())
+            return embed
+
+        embed = self.bot.responses.get_or_build((channel.guild.id, "channelinfo", channel.id), build)
         await interaction.response.send_message(embed=embed)
         
         
@@ -137,74 +205,131 @@ class Utility(Plugin):
     @app_commands.command(name="serverroles", description="List all roles on the server")
     async def server_roles_command(self, interaction: Interaction):
         guild = interaction.guild
-        roles = ", ".join([role.name for role in guild.roles])
-        embed = Embed(title=f"Roles in {guild.name}")
-        embed.description = roles
-        await interaction.response.send_message(embed=embed)
+        paginator = Paginator(
+            f"Roles in {guild.name}",
+            lambda: (role.name for role in guild.roles),
+            author_id=interaction.user.id
+        )
+        await paginator.send(interaction)
 
 
     @app_commands.command(name="channels", description="List all channels on the server")
     async def server_channels_command(self, interaction: Interaction):
         guild = interaction.guild
-        channels = ", ".join([channel.name for channel in guild.channels]) 
-        embed = Embed(title=f"Channels in {guild.name}")
-        embed.description = channels
-        await interaction.response.send_message(embed=embed)
+        paginator = Paginator(
+            f"Channels in {guild.name}",
+            lambda: (channel.name for channel in guild.channels),
+            author_id=interaction.user.id
+        )
+        await paginator.send(interaction)
 
 
     @app_commands.command(name="membercount", description="Get member count for a role")  
+    @rate_limit(3, 30.0, "member")
     async def member_count_command(self, interaction: Interaction, role: discord.Role):
-        count = len([member for member in interaction.guild.members if role in member.roles])
+        await self.bot.ensure_chunked(interaction.guild, interaction)
+        if role.is_default():
+            count = self.bot.member_stats.get(interaction.guild).total
+        else:
+            count = self.bot.role_members.get(interaction.guild).count(role.id)
         embed = Embed(title=f"Member Count for {role.name}")
         embed.add_field(name="Count", value=count)
-        await interaction.response.send_message(embed=embed)
+        await self.bot.respond(interaction, embed=embed)
         
     @app_commands.command(name="invitelink", description="Get an invite link for the server")  
     async def invite_link_command(self, interaction: Interaction):
-        invite = await interaction.channel.create_invite(max_age=3600)
+        invite = await self.bot.invites.channel_invite(interaction.channel, max_age=3600)
         embed = Embed(title="Invite Link")
         embed.description = invite.url
+        if invite.expires_at is not None:
+            embed.description += f"\nExpires {discord.utils.format_dt(invite.expires_at, 'R')}"
         await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="invites", description="List the server's invites and how often they were used")
+    @app_commands.default_permissions(manage_guild=True)
+    @app_commands.guild_only()
+    async def invites_command(self, interaction: Interaction):
+        guild = interaction.guild
+        if self.bot.invites.get(guild.id) is None and not await self.bot.invites.load(guild):
+            return await self.bot.error("I need the Manage Server permission to see invites.", interaction)
+
+        def invites():
+            states = sorted((self.bot.invites.get(guild.id) or {}).values(), key=lambda state: state.uses, reverse=True)
+            for state in states:
+                line = f"`{state.code}` {state.uses}{f'/{state.max_uses}' if state.max_uses else ''} uses"
+                if state.inviter_id is not None:
+                    line += f", by <@{state.inviter_id}>"
+                if state.channel_id is not None:
+                    line += f" in <#{state.channel_id}>"
+                yield line
+
+        paginator = Paginator(
+            f"Invites of {guild.name}", invites, separator="\n", empty="The server has no invites.",
+            author_id=interaction.user.id
+        )
+        await paginator.send(interaction, ephemeral=True)
         
     @app_commands.command(name="memberlist", description="List all members of a role")
+    @rate_limit(3, 30.0, "member")
     async def member_list_command(self, interaction: Interaction, role: discord.Role):
-        members = "\n".join([member.mention for member in interaction.guild.members if role in member.roles])
-        embed = Embed(title=f"Members of {role.name}")
-        embed.description = members 
-        await interaction.response.send_message(embed=embed)
+        guild = interaction.guild
+        await self.bot.ensure_chunked(guild, interaction)
+
+        def members():
+            if role.is_default():
+                return (member.mention for member in guild.members)
+            return (f"<@{member_id}>" for member_id in self.bot.role_members.get(guild).members(role.id))
+
+        paginator = Paginator(
+            f"Members of {role.name}", members, separator="\n", author_id=interaction.user.id
+        )
+        await paginator.send(interaction)
         
     @app_commands.command(name="botdetails", description="Get details about the bot")  
     async def get_bot_details(self, interaction: Interaction):
         bot = self.bot.user
+        # Not cached: the bot's own profile edits never reach on_user_update.
         embed = Embed(title="Bot Info") 
         embed.add_field(name="Name", value=bot.name)
         embed.add_field(name="ID", value=bot.id)
+        embed.add_field(name="Servers", value=await self.bot.guild_total())
         await interaction.response.send_message(embed=embed)
         
     @app_commands.command(name="emojis", description="List all emojis on the server")
     async def server_emojis_command(self, interaction: Interaction):
         guild = interaction.guild
-        emojis = ", ".join([str(e) for e in guild.emojis])
-        embed = Embed(title=f"Emojis in {guild.name}")
-        embed.description = emojis
-        await interaction.response.send_message(embed=embed)
+        paginator = Paginator(
+            f"Emojis in {guild.name}",
+            lambda: (str(e) for e in guild.emojis),
+            author_id=interaction.user.id
+        )
+        await paginator.send(interaction)
         
     @app_commands.command(name="serverbanner", description="Get the banner image for the server")
     async def server_banner_command(self, interaction: Interaction):
         guild = interaction.guild
-        embed = Embed(title=f"Banner for {guild.name}")
-        if guild.banner:
-            embed.set_image(url=guild.banner_url)
-        else:
-            embed.description = "No banner set"  
+
+        def build() -> Embed:
+            embed = Embed(title=f"Banner for {guild.name}")
+            if guild.banner:
+                embed.set_image(url=guild.banner.url)
+            else:
+                embed.description = "No banner set"  
+            return embed
+
+        embed = self.bot.responses.get_or_build((guild.id, "serverbanner", guild.id), build)
         await interaction.response.send_message(embed=embed)
         
     @app_commands.command(name="serverfeatures", description="List features enabled on the server")
     async def server_features_command(self, interaction: Interaction):
         guild = interaction.guild
-        features = ", ".join(guild.features)
-        embed = Embed(title=f"Features in {guild.name}")
-        embed.description = features
+
+        def build() -> Embed:
+            embed = Embed(title=f"Features in {guild.name}")
+            embed.description = ", ".join(guild.features) or "No features enabled"
+            return embed
+
+        embed = self.bot.responses.get_or_build((guild.id, "serverfeatures", guild.id), build)
         await interaction.response.send_message(embed=embed)
 
 
@@ -216,7 +341,13 @@ class Utility(Plugin):
         
         
     @app_commands.command(name="membercountbystatus", description="Get member count filtered by status")
+    @rate_limit(3, 30.0, "member")
     async def member_count_by_status_command(self, interaction: Interaction, status: str):
+        if not self.bot.intents.presences:
+            return await self.bot.error(
+                f"Member statuses are unknown in the {self.bot.profile.name!r} cache profile, it has no presences.",
+                interaction
+            )
         status = status.lower()
         if status == "online":
             status_filter = discord.Status.online
@@ -230,30 +361,36 @@ class Utility(Plugin):
             await interaction.response.send_message("Invalid status")
             return
 
-        count = len([m for m in interaction.guild.members if m.status == status_filter])
+        await self.bot.ensure_chunked(interaction.guild, interaction)
+        count = self.bot.member_stats.get(interaction.guild).count(status_filter)
         embed = Embed(title=f"Member Count with Status: {status}")
         embed.add_field(name="Count", value=count)
-        await interaction.response.send_message(embed=embed)
+        await self.bot.respond(interaction, embed=embed)
         
     @app_commands.command(name="serverchannelsbytype", description="List channels by type")
     async def server_channels_by_type_command(self, interaction: Interaction):
         guild = interaction.guild
 
-        text_channels = ", ".join([channel.name for channel in guild.text_channels])
-        voice_channels = ", ".join([channel.name for channel in guild.voice_channels])
-        category_channels = ", ".join([channel.name for channel in guild.categories])
-
-        embed = Embed(title=f"Channels in {guild.name} by Type")
-        embed.add_field(name="Text Channels", value=text_channels)
-        embed.add_field(name="Voice Channels", value=voice_channels) 
-        embed.add_field(name="Category Channels", value=category_channels)
-
-        await interaction.response.send_message(embed=embed)
+        def channels_by_type():
+            for name, channels in (
+                ("Text Channels", guild.text_channels),
+                ("Voice Channels", guild.voice_channels),
+                ("Category Channels", guild.categories)
+            ):
+                yield f"**{name}**"
+                for channel in channels:
+                    yield channel.name
+
+        paginator = Paginator(
+            f"Channels in {guild.name} by Type",
+            channels_by_type,
+            separator="\n",
+            author_id=interaction.user.id
+        )
+        await paginator.send(interaction)
         
 async def setup(bot: Bot) -> None:
-  utility = Utility(bot) 
-  await bot.add_cog(utility)
-  bot.add_listener(utility.member_on_join, "on_member_join")
+  await bot.add_cog(Utility(bot))
 
 
 
@@ -3,4 +3,53 @@ from typing import Final
 
 TOKEN: Final = "your_bot_token"
 
-JOIN_CHANNEL_ID: Final = "1210590436872294441"  
+# Defaults for guilds that haven't changed them with /config.
+JOIN_CHANNEL_ID: Final = 1210590436872294441
+
+# A guild is in raid mode after RAID_JOINS joins within RAID_WINDOW seconds.
+# RAID_ACTION is applied to the members who join during a raid:
+# None, "timeout" or "kick".
+RAID_JOINS: Final = 10
+RAID_WINDOW: Final = 10.0
+RAID_ACTION: Final = None
+
+DATABASE: Final = "atomix.sqlite3"
+
+# Logs go to the console as "text" or "json" (LOG_FORMAT) and, unless
+# LOG_FILE is None, to LOG_FILE as JSON lines, rotated at 10 MiB.
+# Cluster N writes to atomix-N.log.
+LOG_LEVEL: Final = "INFO"
+LOG_FORMAT: Final = "text"
+LOG_FILE: Final = "atomix.log"
+# At most N records per S seconds from these loggers, as (N, S). Errors always pass.
+LOG_SAMPLING: Final = {
+    "discord.gateway": (20, 60.0),
+    "discord.shard": (20, 60.0),
+    "discord.http": (20, 60.0),
+    "Rest": (20, 60.0),
+}
+
+# One of "lean", "moderation" or "full", see core/profiles.py
+CACHE_PROFILE: Final = "full"
+
+# Cluster mode (python main.py -cluster) runs this many worker processes.
+# SHARD_COUNT = None asks Discord for the recommended shard count.
+CLUSTERS: Final = 2
+SHARD_COUNT: Final = None
+# Unix socket the workers talk to the supervisor over, relative to the
+# working directory. Bots sharing a host need different paths.
+CLUSTER_SOCKET: Final = "atomix-cluster.sock"
+
+# Set to e.g. 9100 to serve Prometheus metrics on
+# http://127.0.0.1:METRICS_PORT/metrics, cluster N uses METRICS_PORT + N.
+# None leaves the endpoint off.
+METRICS_PORT: Final = None
+
+# Extensions only imported when one of their commands is first used,
+# e.g. ("cogs.Moderation.plugin",). They load normally on the first run.
+DEFERRED_EXTENSIONS: Final = ()
+
+# Rate limits replacing the ones the commands set, by qualified command name:
+# {"memberlist": (3, 30.0, "member")} allows 3 uses per 30 seconds per member,
+# {"memberlist": None} lifts the limit. Scopes: "user", "member", "guild", "channel".
+RATE_LIMITS: Final = {}
@@ -1,2 +1,21 @@
 from .bot import *
+from .cache import *
+from .cases import *
+from .cluster import *
 from .embed import *
+from .extensions import *
+from .index import *
+from .invites import *
+from .joins import *
+from .logs import *
+from .memory import *
+from .metrics import *
+from .paginator import *
+from .profiles import *
+from .ratelimit import *
+from .reminders import *
+from .search import *
+from .settings import *
+from .storage import *
+from .sync import *
+from .tree import *
@@ -1,39 +1,375 @@
 from __future__ import annotations
-import os
+import asyncio
 import sys
-from typing import Optional
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple, Union
 from .embed import Embed
+from .cache import ResponseCache
+from .cases import CaseLog
+from .cluster import ClusterClient
+from .extensions import ExtensionManifest, LoadTiming, discover
+from .index import MemberStatsIndex, RoleIndex
+from .invites import InviteTracker
+from .joins import JoinPipeline
+from .logs import dropped_records
+from .metrics import LoopLagProbe, Metrics, MetricsServer
+from .profiles import get_profile, rss_bytes
+from .ratelimit import RateLimiter
+from .reminders import Reminder, ReminderScheduler
+from .search import MessageIndex
+from .settings import GuildSettings, SettingsStore
+from .storage import Database
+from .sync import CommandSync
+from .tree import Tree
 from discord.ext import commands
 from logging import getLogger
 log = getLogger("Bot")
 import discord
 
 
-__all__ = ("Bot",)
+__all__ = ("Bot", "ReloadResult")
+
+class ReloadResult(NamedTuple):
+    extension: str
+    elapsed: float
+    error: Optional[commands.ExtensionError] = None
+
 
 class Bot(commands.AutoShardedBot):
-    def __init__(self):
+    def __init__(
+        self, *,
+        database: str = "atomix.sqlite3",
+        profile: str = "full",
+        cluster: Optional[ClusterClient] = None,
+        metrics_port: Optional[int] = None,
+        deferred: Iterable[str] = (),
+        settings: GuildSettings = GuildSettings(),
+        rate_limits: Mapping[str, Optional[Tuple[Any, ...]]] = {}
+    ):
+        self.profile = get_profile(profile)
         super().__init__(
             command_prefix="!",
-            intents=discord.Intents.all(),
-            chunk_guild_at_startup=False
+            intents=self.profile.intents,
+            member_cache_flags=self.profile.member_cache_flags,
+            max_messages=self.profile.max_messages,
+            chunk_guilds_at_startup=self.profile.chunk_guilds_at_startup,
+            tree_cls=Tree,
+            **ClusterClient.shard_config()
         )
+        self.cluster = cluster
+        self.manifest = ExtensionManifest()
+        # Command name -> extension that isn't imported until the command is used.
+        self.deferred: Dict[str, str] = {}
+        self._deferred_extensions = set(deferred)
+        self._deferred_lock = asyncio.Lock()
+        self._cog_load_times: Dict[str, float] = {}
+        self.metrics = Metrics()
+        self.metrics.collectors.append(self._collect_metrics)
+        self.rate_limits = RateLimiter(self.metrics, overrides=rate_limits)
+        self.loop_lag = LoopLagProbe(self.metrics)
+        self.metrics_server = MetricsServer(self.metrics, port=metrics_port) if metrics_port else None
+        self._reported_footprint = False
+        self.db = Database(database)
+        self.reminders = ReminderScheduler(self.db, self.deliver_reminders)
+        self.cases = CaseLog(self.db)
+        self.settings = SettingsStore(self.db, settings)
+        self.command_sync = CommandSync(self.tree)
+        self.member_stats = MemberStatsIndex()
+        self.role_members = RoleIndex()
+        self.responses = ResponseCache()
+        self.joins = JoinPipeline(self)
+        self.invites = InviteTracker(self)
+        self.search_index = MessageIndex(self.metrics, max_bytes=self.profile.search_index_bytes)
+        for listener in (
+            self.member_stats.on_member_join,
+            self.member_stats.on_member_remove,
+            self.member_stats.on_presence_update,
+            self.member_stats.on_guild_available,
+            self.member_stats.on_guild_remove,
+            self.role_members.on_member_join,
+            self.role_members.on_member_remove,
+            self.role_members.on_member_update,
+            self.role_members.on_guild_role_delete,
+            self.role_members.on_guild_available,
+            self.role_members.on_guild_remove,
+            self.responses.on_guild_update,
+            self.responses.on_guild_remove,
+            self.responses.on_guild_role_update,
+            self.responses.on_guild_role_delete,
+            self.responses.on_guild_channel_create,
+            self.responses.on_guild_channel_update,
+            self.responses.on_guild_channel_delete,
+            self.joins.on_guild_channel_create,
+            self.joins.on_guild_channel_delete,
+            self.joins.on_guild_remove,
+            self.settings.on_guild_available,
+            self.settings.on_guild_join,
+            self.settings.on_guild_remove,
+            self.invites.on_guild_available,
+            self.invites.on_guild_join,
+            self.invites.on_guild_remove,
+            self.invites.on_member_join,
+            self.invites.on_invite_create,
+            self.invites.on_invite_delete
+        ):
+            self.add_listener(listener)
+        if self.profile.search_index_bytes:
+            for listener in (
+                self.search_index.on_message,
+                self.search_index.on_raw_message_edit,
+                self.search_index.on_raw_message_delete,
+                self.search_index.on_raw_bulk_message_delete,
+                self.search_index.on_guild_channel_delete,
+                self.search_index.on_raw_thread_delete,
+                self.search_index.on_guild_remove
+            ):
+                self.add_listener(listener)
 
 
         
     async def setup_hook(self) -> None:
-       for file in os.listdir("cogs"):
-           if not file.startswith("_"):
-               await self.load_extension(f"cogs.{file}.plugin")
+       self.loop_lag.start()
+       if self.metrics_server is not None:
+           await self.metrics_server.start()
+       await self.reminders.start()
+       await self.cases.start()
+       await self.settings.start()
+       if self.cluster is not None:
+           self.cluster.handlers["guild_count"] = self._guild_count
+           await self.cluster.connect()
+       await self.load_plugins()
+
+    async def add_cog(self, cog: commands.Cog, /, **kwargs: Any) -> None:
+        started = perf_counter()
+        await super().add_cog(cog, **kwargs)
+        module = type(cog).__module__
+        self._cog_load_times[module] = self._cog_load_times.get(module, 0.0) + perf_counter() - started
+
+    async def _load_plugin(self, name: str) -> LoadTiming:
+        self._cog_load_times.pop(name, None)
+        started = perf_counter()
+        try:
+            await self.load_extension(name)
+        except commands.ExtensionError as e:
+            return LoadTiming(name, perf_counter() - started, 0.0, e)
+        elapsed = perf_counter() - started
+        cog_load = self._cog_load_times.get(name, 0.0)
+        self.manifest.record(name, [
+            command.name
+            for cog in self.cogs.values() if type(cog).__module__ == name
+            for command in cog.get_app_commands()
+        ])
+        return LoadTiming(name, elapsed - cog_load, cog_load)
+
+    async def load_plugins(self) -> List[LoadTiming]:
+        """Load every plugin in ``cogs`` concurrently and log how long each took.
+
+        Module code runs synchronously, so what overlaps are the awaits in
+        ``setup`` and ``cog_load``. Extensions passed as ``deferred`` are
+        only imported when one of their commands is first used; that needs
+        their command names from an earlier run, so an extension missing
+        from the manifest is loaded now.
+        """
+        eager: List[str] = []
+        for name in discover():
+            if name in self._deferred_extensions and name in self.manifest:
+                self.deferred.update((command, name) for command in self.manifest.commands[name])
+            else:
+                eager.append(name)
+
+        started = perf_counter()
+        timings = await asyncio.gather(*(self._load_plugin(name) for name in eager))
+        elapsed = perf_counter() - started
+
+        lines = [
+            f"  {t.extension:<32} {'failed' if t.error else f'load {t.load * 1000:7.1f}ms  cog_load {t.cog_load * 1000:7.1f}ms'}"
+            for t in sorted(timings, key=lambda t: t.load + t.cog_load, reverse=True)
+        ]
+        lines.extend(f"  {name:<32} deferred" for name in sorted(set(self.deferred.values())))
+        getLogger("cogs").info(f"Loaded {len(eager)} extensions in {elapsed * 1000:.1f}ms\n" + "\n".join(lines))
+
+        for timing in timings:
+            if timing.error is not None:
+                raise timing.error
+        return timings
+
+    async def load_deferred(self, name: str) -> None:
+        """Load a deferred extension, if it hasn't been loaded yet."""
+        async with self._deferred_lock:
+            if name in self.extensions:
+                return
+            timing = await self._load_plugin(name)
+            if timing.error is not None:
+                raise timing.error
+            self.deferred = {command: ext for command, ext in self.deferred.items() if ext != name}
+            getLogger("cogs").info(
+                f"Loaded deferred {name}: load {timing.load * 1000:.1f}ms, cog_load {timing.cog_load * 1000:.1f}ms"
+            )
         
     async def on_ready(self) -> None:
        log.info(f"logged in as {self.user}")
-        
+       if not self._reported_footprint:
+           self._reported_footprint = True
+           members = sum(len(guild.members) for guild in self.guilds)
+           rss = rss_bytes() / 1024 / 1024
+           per_10k = f"{rss / members * 10_000:.1f} MiB" if members else "n/a"
+           log.info(
+               f"Cache profile {self.profile.name!r}: {rss:.1f} MiB RSS with {members} cached members "
+               f"({per_10k} per 10k members)."
+           )
+
+    async def ensure_chunked(
+        self,
+        guild: discord.Guild,
+        interaction: Optional[discord.Interaction] = None
+    ) -> None:
+        """Chunk ``guild`` the first time a command needs its full member list.
+
+        If ``interaction`` is given it is deferred before chunking starts,
+        since a large guild can take longer than the response window.
+        """
+        if guild.chunked or not self.intents.members:
+            return
+        if interaction is not None and not interaction.response.is_done():
+            await interaction.response.defer()
+        await guild.chunk(cache=True)
+        self.member_stats.check(guild)
+        self.role_members.check(guild)
+
+    async def respond(self, interaction: discord.Interaction, **kwargs: Any) -> Optional[discord.WebhookMessage]:
+        """Reply to an interaction, using a followup if it was already deferred."""
+        if interaction.response.is_done():
+            return await interaction.followup.send(**kwargs)
+        await interaction.response.send_message(**kwargs)
+        return None
+
+    async def _guild_count(self) -> int:
+        return len(self.guilds)
+
+    async def guild_total(self) -> int:
+        """Number of guilds across every cluster, or just this process when not clustered."""
+        if self.cluster is None:
+            return len(self.guilds)
+        return sum(count or 0 for count in await self.cluster.request("guild_count"))
+
     async def on_connect(self) -> None:
-       if '-sync' in sys.argv:
-           synced_commmands = await self.tree.sync()
-           log.info(f"Successfully synced {len(synced_commmands)} commands.")
+       if self.cluster is not None and self.cluster.cluster_id != 0:
+           # Commands are global, the first cluster syncs them for everyone.
+           return
+       # -sync            sync global commands if they changed since the last sync
+       # -sync-force      sync even if nothing changed
+       # -sync-dry-run    only log the diff against the last sync
+       # -sync-guild=ID   also sync to a development guild
+       dry_run = '-sync-dry-run' in sys.argv
+       force = '-sync-force' in sys.argv
+       if any(arg.startswith('-sync') for arg in sys.argv):
+           # Syncing without them would remove their commands from Discord.
+           for name in set(self.deferred.values()):
+               await self.load_deferred(name)
+       if '-sync' in sys.argv or force or dry_run:
+           synced_commmands = await self.command_sync.sync(dry_run=dry_run, force=force)
+           if synced_commmands is not None:
+               log.info(f"Successfully synced {synced_commmands} commands.")
+       for arg in sys.argv:
+           if arg.startswith('-sync-guild='):
+               guild = discord.Object(int(arg.partition('=')[2]))
+               synced_commmands = await self.command_sync.sync(guild, dry_run=dry_run, force=force)
+               if synced_commmands is not None:
+                   log.info(f"Successfully synced {synced_commmands} commands to guild {guild.id}.")
         
+    async def reload_plugins(self, extensions: Optional[Iterable[str]] = None) -> List[ReloadResult]:
+        """Re-import plugins in place, keeping shard connections and caches.
+
+        Other modules in a plugin's package are dropped from ``sys.modules``
+        so they are re-imported with it. If a reload fails, discord.py puts
+        the previous version of the extension back and the dropped modules
+        are restored.
+        """
+        if extensions is None:
+            extensions = [name for name in self.extensions if name.startswith("cogs.")]
+
+        results: List[ReloadResult] = []
+        for name in extensions:
+            package = name.rpartition(".")[0] + "."
+            siblings = {
+                module: sys.modules[module]
+                for module in list(sys.modules)
+                if module.startswith(package) and module != name
+            }
+            for module in siblings:
+                del sys.modules[module]
+
+            started = perf_counter()
+            try:
+                await self.reload_extension(name)
+            except commands.ExtensionError as e:
+                sys.modules.update(siblings)
+                log.exception(f"Failed to reload {name}, kept the previous version.")
+                results.append(ReloadResult(name, perf_counter() - started, e))
+            else:
+                log.info(f"Reloaded {name} in {(perf_counter() - started) * 1000:.1f}ms")
+                results.append(ReloadResult(name, perf_counter() - started))
+        self.rate_limits.reload()
+        return results
+
+    def record_command(self, interaction: discord.Interaction, command: str, status: str) -> None:
+        started = interaction.extras.get("started")
+        if started is not None:
+            self.metrics.observe("command_seconds", perf_counter() - started, command=command)
+        self.metrics.inc("commands_total", command=command, status=status)
+
+    async def on_app_command_completion(
+        self,
+        interaction: discord.Interaction,
+        command: Union[discord.app_commands.Command, discord.app_commands.ContextMenu]
+    ) -> None:
+        self.record_command(interaction, command.qualified_name, "ok")
+
+    async def _run_event(self, coro: Any, event_name: str, *args: Any, **kwargs: Any) -> None:
+        started = perf_counter()
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            self.metrics.observe("event_handler_seconds", perf_counter() - started, event=event_name)
+
+    def _collect_metrics(self, metrics: Metrics) -> None:
+        for shard_id, latency in self.latencies:
+            metrics.set("shard_latency_seconds", latency, shard=shard_id)
+        metrics.set("guilds", len(self.guilds))
+        metrics.set("reminders_pending", len(self.reminders))
+        metrics.set("cases_queued", len(self.cases))
+        metrics.set("guild_settings_loaded", len(self.settings))
+        metrics.set("invite_guilds_tracked", len(self.invites))
+        metrics.set("role_index_bytes", self.role_members.memory_usage())
+        metrics.set("log_records_dropped", dropped_records())
+        for name, value in self.responses.stats().items():
+            metrics.set(f"response_cache_{name}", value)
+
+    async def close(self) -> None:
+        await self.loop_lag.close()
+        await self.joins.close()
+        await self.invites.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+        await self.reminders.close()
+        await self.cases.close()
+        if self.cluster is not None:
+            await self.cluster.close()
+        await super().close()
+        await self.db.close()
+
+    async def deliver_reminders(self, user_id: int, reminders: List[Reminder]) -> None:
+        user = self.get_user(user_id) or await self.fetch_user(user_id)
+        embed = Embed(title="Reminder", color=discord.Color.green(), timestamp=discord.utils.utcnow())
+        embed.description = "\n".join(f"- {reminder.message}" for reminder in reminders)[:4096]
+        try:
+            await user.send(embed=embed)
+        except discord.Forbidden:
+            channel = self.get_channel(reminders[0].channel_id) if reminders[0].channel_id else None
+            if channel is None:
+                raise
+            await channel.send(content=user.mention, embed=embed)
+
     async def success(
        self,  
        message: str,
@@ -43,11 +379,12 @@ class Bot(commands.AutoShardedBot):
     ) -> Optional[discord.WebhookMessage]:
         if embed:
             if interaction.response.is_done():
-                return await interaction.followup.send(
-                    embed=Embed(description=message, color=discord.Color.green())
+                return await self.respond(
+                    interaction, embed=Embed(description=message, color=discord.Color.green())
                 )
                 
-            return await interaction.response.send_message(
+            return await self.respond(
+                interaction,
                 embed=Embed(description=message, color=discord.Color.green()),
                 ephemeral=ephemeral
             )
@@ -62,17 +399,15 @@ class Bot(commands.AutoShardedBot):
     ) -> Optional[discord.WebhookMessage]:
         if embed:
             if interaction.response.is_done():
-                return await interaction.followup.send(
-                    embed=Embed(description=message, color=discord.Color.red())
+                return await self.respond(
+                    interaction, embed=Embed(description=message, color=discord.Color.red())
                 )
                 
-            return await interaction.response.send_message(
+            return await self.respond(
+                interaction,
                 embed=Embed(description=message, color=discord.Color.red()),
                 ephemeral=ephemeral
             )
         
         else:
-            if interaction.response.is_done():
-                return await interaction.followup.send(content=f"{message}", ephemeral=ephemeral)
-            return await interaction.response.send_message(content=f"{message}", ephemeral=ephemeral
-            )
+            return await self.respond(interaction, content=f"{message}", ephemeral=ephemeral)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import copy
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+import discord
+from .embed import Embed
+
+
+__all__ = ("ResponseCache",)
+
+# (guild id, command, target id).
+Key = Tuple[int, str, int]
+
+
+class ResponseCache:
+    """LRU cache of rendered embeds for read-only info commands.
+
+    Entries are dropped by the gateway events that change what they show,
+    so a cached embed is never stale. The cache stores dict payloads and
+    hands out a fresh :class:`Embed` each time, so callers may add
+    per-invocation fields to the result.
+    """
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Key, Dict[str, Any]] = OrderedDict()
+        self._by_guild: Dict[int, Set[Key]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_build(self, key: Key, build: Callable[[], discord.Embed]) -> Embed:
+        payload = self._entries.get(key)
+        if payload is None:
+            self.misses += 1
+            payload = build().to_dict()
+            self._put(key, payload)
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        # from_dict keeps references to the nested fields, so hand out a copy.
+        return Embed.from_dict(copy.deepcopy(payload))
+
+    def _put(self, key: Key, payload: Dict[str, Any]) -> None:
+        self._entries[key] = payload
+        self._by_guild.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            old, _ = self._entries.popitem(last=False)
+            self._forget(old)
+            self.evictions += 1
+
+    def _forget(self, key: Key) -> None:
+        keys = self._by_guild.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_guild[key[0]]
+
+    def invalidate(self, guild_id: int, command: Optional[str] = None, target_id: Optional[int] = None) -> None:
+        """Drop entries of a guild, optionally only those of one command or target."""
+        for key in list(self._by_guild.get(guild_id, ())):
+            if (command is None or key[1] == command) and (target_id is None or key[2] == target_id):
+                del self._entries[key]
+                self._forget(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild) -> None:
+        self.invalidate(after.id, "serverinfo")
+        self.invalidate(after.id, "serverfeatures")
+        self.invalidate(after.id, "serverbanner")
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.invalidate(guild.id)
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role) -> None:
+        self.invalidate(after.guild.id, "roleinfo", after.id)
+
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        self.invalidate(role.guild.id, "roleinfo", role.id)
+
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        self.invalidate(channel.guild.id, "serverinfo")
+
+    async def on_guild_channel_update(
+        self,
+        before: discord.abc.GuildChannel,
+        after: discord.abc.GuildChannel
+    ) -> None:
+        if isinstance(after, discord.CategoryChannel):
+            # Channel info shows the category name.
+            self.invalidate(after.guild.id, "channelinfo")
+        else:
+            self.invalidate(after.guild.id, "channelinfo", after.id)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        self.invalidate(channel.guild.id, "channelinfo", channel.id)
+        self.invalidate(channel.guild.id, "serverinfo")
@@ -0,0 +1,164 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+from .storage import Database
+from logging import getLogger
+log = getLogger("Cases")
+
+
+__all__ = ("Case", "CaseLog")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    guild_id INTEGER NOT NULL,
+    case_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    target_id INTEGER NOT NULL,
+    moderator_id INTEGER NOT NULL,
+    reason TEXT,
+    detail TEXT,
+    created REAL NOT NULL,
+    PRIMARY KEY (guild_id, case_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cases_target ON cases (guild_id, target_id, case_id);
+"""
+
+COLUMNS = "guild_id, case_id, action, target_id, moderator_id, reason, detail, created"
+
+
+class Case(NamedTuple):
+    guild_id: int
+    case_id: int
+    action: str
+    target_id: int
+    moderator_id: int
+    reason: Optional[str]
+    detail: Optional[str]
+    created: float
+
+    def describe(self) -> str:
+        # Purges target a channel, every other action a user.
+        target = f"<#{self.target_id}>" if self.action == "purge" else f"<@{self.target_id}>"
+        line = f"**#{self.case_id}** {self.action} {target} by <@{self.moderator_id}> <t:{int(self.created)}:R>"
+        if self.detail:
+            line += f" ({self.detail})"
+        if self.reason:
+            line += f"\n> {self.reason}"
+        return line
+
+
+class CaseLog:
+    """Numbered record of moderation actions, per guild.
+
+    :meth:`record` only hands out the next case id and queues the case, so
+    the command doing the action never waits on disk. A background task
+    writes the queue to SQLite every ``interval`` seconds, or as soon as
+    ``batch_size`` cases are waiting. Queries flush the queue first, so
+    they always see every recorded case.
+    """
+
+    def __init__(self, db: Database, *, interval: float = 2.0, batch_size: int = 500) -> None:
+        self.db = db
+        self.interval = interval
+        self.batch_size = batch_size
+        self._next_id: Dict[int, int] = {}
+        self._queue: List[Case] = []
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def __len__(self) -> int:
+        """Number of cases waiting to be written."""
+        return len(self._queue)
+
+    async def start(self) -> None:
+        await self.db.executescript(SCHEMA)
+        rows = await self.db.fetchall("SELECT guild_id, MAX(case_id) FROM cases GROUP BY guild_id")
+        self._next_id = {guild_id: last + 1 for guild_id, last in rows}
+        self._task = asyncio.create_task(self._run(), name="case-log")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def record(
+        self,
+        guild_id: int,
+        action: str,
+        target_id: int,
+        moderator_id: int,
+        reason: Optional[str] = None,
+        detail: Optional[str] = None
+    ) -> Case:
+        case_id = self._next_id.get(guild_id, 1)
+        self._next_id[guild_id] = case_id + 1
+        case = Case(guild_id, case_id, action, target_id, moderator_id, reason, detail, time.time())
+        self._queue.append(case)
+        if len(self._queue) >= self.batch_size:
+            self._full.set()
+        return case
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                log.exception(f"Writing {len(self._queue)} cases failed, retrying later.")
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            self._full.clear()
+            if not self._queue:
+                return
+            batch, self._queue = self._queue, []
+            try:
+                await self.db.executemany(
+                    f"INSERT INTO cases ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    batch
+                )
+            except Exception:
+                self._queue[:0] = batch
+                raise
+
+    async def get(self, guild_id: int, case_id: int) -> Optional[Case]:
+        await self.flush()
+        row = await self.db.fetchone(f"SELECT {COLUMNS} FROM cases WHERE guild_id = ? AND case_id = ?", (guild_id, case_id))
+        return Case(*row) if row else None
+
+    async def iterate(
+        self,
+        guild_id: int,
+        target_id: Optional[int] = None, *,
+        page_size: int = 50
+    ) -> AsyncIterator[Case]:
+        """Cases of a guild, or of one member in it, newest first.
+
+        Rows are read ``page_size`` at a time, each page continuing below
+        the last case id seen, so deep pages cost the same as the first.
+        """
+        await self.flush()
+        query = f"SELECT {COLUMNS} FROM cases WHERE guild_id = ? AND case_id < ?"
+        if target_id is not None:
+            query += " AND target_id = ?"
+        query += " ORDER BY case_id DESC LIMIT ?"
+        last = self._next_id.get(guild_id, 1)
+        while True:
+            rows = await self.db.fetchall(
+                query, [guild_id, last] + ([target_id] if target_id is not None else []) + [page_size]
+            )
+            for row in rows:
+                yield Case(*row)
+            if len(rows) < page_size:
+                return
+            last = rows[-1][1]
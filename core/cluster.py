@@ -0,0 +1,360 @@
+from __future__ import annotations
+import asyncio
+import itertools
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+import aiohttp
+from logging import getLogger
+log = getLogger("Cluster")
+
+
+__all__ = ("ClusterClient", "ClusterSupervisor", "shard_ranges", "fetch_shard_count", "run_fake_worker")
+
+# Environment handed from the supervisor to each worker process.
+ENV_CLUSTER_ID = "ATOMIX_CLUSTER_ID"
+ENV_SHARD_IDS = "ATOMIX_SHARD_IDS"
+ENV_SHARD_COUNT = "ATOMIX_SHARD_COUNT"
+ENV_SOCKET = "ATOMIX_IPC_SOCKET"
+
+Handler = Callable[[], Awaitable[Any]]
+
+
+def shard_ranges(shard_count: int, clusters: int) -> List[List[int]]:
+    """Split ``range(shard_count)`` into ``clusters`` contiguous, near-equal ranges."""
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for i in range(clusters):
+        end = start + size + (i < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def fetch_shard_count(token: str) -> int:
+    """Ask Discord how many shards it recommends for this bot."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot",
+            headers={"Authorization": f"Bot {token}"}
+        ) as response:
+            response.raise_for_status()
+            return (await response.json())["shards"]
+
+
+async def _send(writer: asyncio.StreamWriter, payload: Dict[str, Any]) -> None:
+    writer.write(json.dumps(payload, separators=(",", ":")).encode() + b"\n")
+    await writer.drain()
+
+
+class _Worker:
+    def __init__(self, cluster_id: int, shard_ids: Sequence[int]) -> None:
+        self.cluster_id = cluster_id
+        self.shard_ids = list(shard_ids)
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.restarts = 0
+        self.restart_requested = False
+
+
+class ClusterSupervisor:
+    """Spawns one worker process per shard range and relays IPC between them.
+
+    Workers connect back over a Unix socket and speak newline-delimited
+    JSON. A ``query`` from any worker is fanned out to every connected
+    worker and answered with the list of their replies. A worker that
+    exits, or is asked to ``restart``, is respawned on its own without
+    touching the others.
+    """
+
+    def __init__(
+        self,
+        command: Sequence[str],
+        shard_count: int,
+        clusters: int, *,
+        socket_path: str = "atomix-cluster.sock",
+        query_timeout: float = 5.0
+    ) -> None:
+        self.command = list(command)
+        self.shard_count = shard_count
+        # Workers may not share the working directory, so they get the absolute path.
+        self.socket_path = os.path.abspath(socket_path)
+        self.query_timeout = query_timeout
+        self.workers = [_Worker(i, ids) for i, ids in enumerate(shard_ranges(shard_count, clusters))]
+        self._nonce = itertools.count()
+        self._replies: Dict[int, Dict[int, Any]] = {}
+        self._waiters: Dict[int, asyncio.Event] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._closing = False
+
+    async def run(self) -> None:
+        if os.path.exists(self.socket_path):
+            try:
+                _, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError:
+                # Left behind by a supervisor that didn't shut down cleanly.
+                os.unlink(self.socket_path)
+            else:
+                writer.close()
+                raise RuntimeError(f"Another supervisor is already listening on {self.socket_path}")
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        log.info(
+            f"Starting {len(self.workers)} clusters for {self.shard_count} shards: "
+            + ", ".join(f"{w.cluster_id}={w.shard_ids[0]}-{w.shard_ids[-1]}" for w in self.workers if w.shard_ids)
+        )
+        try:
+            await asyncio.gather(*(self._supervise(worker) for worker in self.workers))
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        self._closing = True
+        for worker in self.workers:
+            if worker.process is not None and worker.process.returncode is None:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is not None:
+                await worker.process.wait()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _supervise(self, worker: _Worker) -> None:
+        while not self._closing:
+            env = dict(
+                os.environ,
+                **{
+                    ENV_CLUSTER_ID: str(worker.cluster_id),
+                    ENV_SHARD_IDS: ",".join(map(str, worker.shard_ids)),
+                    ENV_SHARD_COUNT: str(self.shard_count),
+                    ENV_SOCKET: self.socket_path
+                }
+            )
+            worker.process = await asyncio.create_subprocess_exec(*self.command, env=env)
+            log.info(f"Cluster {worker.cluster_id} started with pid {worker.process.pid}.")
+            code = await worker.process.wait()
+            worker.writer = None
+            if self._closing:
+                return
+            if worker.restart_requested:
+                worker.restart_requested = False
+                delay = 0
+            else:
+                worker.restarts += 1
+                delay = min(2 ** min(worker.restarts, 6), 60) if code else 0
+            log.warning(f"Cluster {worker.cluster_id} exited with {code}, restarting in {delay}s.")
+            await asyncio.sleep(delay)
+
+    def restart(self, cluster_id: int) -> bool:
+        valid = isinstance(cluster_id, int) and 0 <= cluster_id < len(self.workers)
+        worker = self.workers[cluster_id] if valid else None
+        if worker is None or worker.process is None or worker.process.returncode is not None:
+            return False
+        worker.restarts = 0
+        worker.restart_requested = True
+        worker.process.terminate()
+        return True
+
+    async def query(self, name: str) -> List[Any]:
+        """Ask every connected worker for ``name`` and return their replies in cluster order."""
+        nonce = next(self._nonce)
+        connected = [w for w in self.workers if w.writer is not None]
+        self._replies[nonce] = {}
+        self._waiters[nonce] = event = asyncio.Event()
+        try:
+            for worker in connected:
+                await _send(worker.writer, {"op": "query", "id": nonce, "name": name})
+            try:
+                await asyncio.wait_for(event.wait(), timeout=self.query_timeout)
+            except asyncio.TimeoutError:
+                log.warning(f"Query {name!r} timed out, answering with partial results.")
+            replies = self._replies[nonce]
+            return [replies[w.cluster_id] for w in connected if w.cluster_id in replies]
+        finally:
+            del self._replies[nonce], self._waiters[nonce]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        worker: Optional[_Worker] = None
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                op = message.get("op")
+                if op == "identify":
+                    cluster_id = message.get("cluster")
+                    if not isinstance(cluster_id, int) or not 0 <= cluster_id < len(self.workers):
+                        log.warning(f"IPC client identified as unknown cluster {cluster_id!r}, closing it.")
+                        break
+                    worker = self.workers[cluster_id]
+                    worker.writer = writer
+                    log.info(f"Cluster {worker.cluster_id} connected to IPC.")
+                elif op == "reply" and worker is not None:
+                    replies = self._replies.get(message["id"])
+                    if replies is not None:
+                        replies[worker.cluster_id] = message.get("data")
+                        if len(replies) == sum(w.writer is not None for w in self.workers):
+                            self._waiters[message["id"]].set()
+                elif op == "query":
+                    asyncio.create_task(self._answer(writer, message))
+                elif op == "restart":
+                    ok = self.restart(message["cluster"])
+                    await _send(writer, {"op": "reply", "id": message["id"], "data": ok})
+        except (ConnectionError, ValueError) as e:
+            log.warning(f"IPC connection dropped: {e}")
+        except (KeyError, TypeError) as e:
+            log.warning(f"Malformed IPC message from cluster {worker.cluster_id if worker else '?'}: {e!r}")
+        finally:
+            if worker is not None and worker.writer is writer:
+                worker.writer = None
+            writer.close()
+
+    async def _answer(self, writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+        data = await self.query(message["name"])
+        await _send(writer, {"op": "reply", "id": message["id"], "data": data})
+
+
+class ClusterClient:
+    """A worker's connection to the supervisor.
+
+    ``handlers`` answer queries from other clusters; ``request`` asks every
+    cluster, including this one, and returns all of their answers. If the
+    connection drops, calls fail until it is reconnected, which is retried
+    with a backoff of up to ``max_retry_delay`` seconds.
+    """
+
+    def __init__(self, cluster_id: int, socket_path: str, *, max_retry_delay: float = 30.0) -> None:
+        self.cluster_id = cluster_id
+        self.socket_path = socket_path
+        self.max_retry_delay = max_retry_delay
+        self.handlers: Dict[str, Handler] = {}
+        self._nonce = itertools.count()
+        self._pending: Dict[int, asyncio.Future[Any]] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task[None]] = None
+
+    @classmethod
+    def from_env(cls) -> Optional[ClusterClient]:
+        if ENV_CLUSTER_ID not in os.environ:
+            return None
+        return cls(int(os.environ[ENV_CLUSTER_ID]), os.environ[ENV_SOCKET])
+
+    @staticmethod
+    def shard_config() -> Dict[str, Any]:
+        """``shard_ids``/``shard_count`` keyword arguments for this worker's Bot."""
+        if ENV_SHARD_IDS not in os.environ:
+            return {}
+        return {
+            "shard_ids": [int(i) for i in os.environ[ENV_SHARD_IDS].split(",") if i],
+            "shard_count": int(os.environ[ENV_SHARD_COUNT])
+        }
+
+    async def _open(self) -> asyncio.StreamReader:
+        reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        await _send(self._writer, {"op": "identify", "cluster": self.cluster_id})
+        return reader
+
+    async def connect(self) -> None:
+        reader = await self._open()
+        self._task = asyncio.create_task(self._run(reader), name="cluster-ipc")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+    async def _run(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            await self._listen(reader)
+            log.warning("Lost the IPC connection to the supervisor, reconnecting.")
+            self._writer = None
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("IPC connection closed"))
+            self._pending.clear()
+            delay = 1.0
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    reader = await self._open()
+                except OSError as e:
+                    log.warning(f"Reconnecting to the supervisor failed: {e}")
+                    delay = min(delay * 2, self.max_retry_delay)
+                else:
+                    log.info("Reconnected to the supervisor.")
+                    break
+
+    async def _listen(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                if message["op"] == "query":
+                    asyncio.create_task(self._reply(message))
+                elif message["op"] == "reply":
+                    future = self._pending.pop(message["id"], None)
+                    if future is not None and not future.done():
+                        future.set_result(message.get("data"))
+        except (ConnectionError, ValueError, KeyError) as e:
+            log.warning(f"IPC connection to the supervisor broke: {e!r}")
+
+    async def _reply(self, message: Dict[str, Any]) -> None:
+        handler = self.handlers.get(message["name"])
+        data = None
+        if handler is not None:
+            try:
+                data = await handler()
+            except Exception:
+                log.exception(f"IPC handler {message['name']!r} failed")
+        if self._writer is None:
+            return
+        try:
+            await _send(self._writer, {"op": "reply", "id": message["id"], "data": data})
+        except ConnectionError:
+            pass
+
+    async def _call(self, payload: Dict[str, Any], timeout: float) -> Any:
+        if self._writer is None:
+            raise ConnectionError("Not connected to the cluster supervisor")
+        nonce = next(self._nonce)
+        future = self._pending[nonce] = asyncio.get_running_loop().create_future()
+        await _send(self._writer, dict(payload, id=nonce))
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self._pending.pop(nonce, None)
+
+    async def request(self, name: str, *, timeout: float = 10.0) -> List[Any]:
+        return await self._call({"op": "query", "name": name}, timeout)
+
+    async def restart(self, cluster_id: int, *, timeout: float = 10.0) -> bool:
+        return await self._call({"op": "restart", "cluster": cluster_id}, timeout)
+
+
+async def run_fake_worker() -> None:
+    """Stand-in for a worker that answers IPC without connecting to Discord.
+
+    Each fake shard pretends to hold 100 guilds, which is enough to exercise
+    the supervisor, aggregate queries and per-cluster restarts locally.
+    """
+    client = ClusterClient.from_env()
+    if client is None:
+        raise RuntimeError("run_fake_worker must be started by ClusterSupervisor")
+    shard_ids = ClusterClient.shard_config()["shard_ids"]
+
+    async def guild_count() -> int:
+        return len(shard_ids) * 100
+
+    async def shards() -> List[int]:
+        return shard_ids
+
+    async def pid() -> int:
+        return os.getpid()
+
+    client.handlers.update(guild_count=guild_count, shards=shards, pid=pid)
+    await client.connect()
+    log.info(f"Fake cluster {client.cluster_id} serving shards {shard_ids} (pid {os.getpid()}).")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await client.close()
+
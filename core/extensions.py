@@ -0,0 +1,73 @@
+from __future__ import annotations
+import importlib
+import importlib.util
+import json
+import os
+import pkgutil
+from typing import Dict, List, NamedTuple, Optional
+from logging import getLogger
+log = getLogger("Extensions")
+
+
+__all__ = ("discover", "ExtensionManifest", "LoadTiming")
+
+# Next to main.py rather than in the working directory, so every way of
+# starting the bot shares it.
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".extensions.json")
+
+
+class LoadTiming(NamedTuple):
+    extension: str
+    # Executing the module and its setup(), minus the time spent in add_cog.
+    load: float
+    cog_load: float
+    error: Optional[Exception] = None
+
+
+def discover(package: str = "cogs") -> List[str]:
+    """The ``plugin`` module of every sub-package of ``package``.
+
+    Sub-packages are found through the package's ``__path__``, so this
+    works from any working directory.
+    """
+    module = importlib.import_module(package)
+    names: List[str] = []
+    for info in pkgutil.iter_modules(module.__path__):
+        if not info.ispkg or info.name.startswith("_"):
+            continue
+        name = f"{package}.{info.name}.plugin"
+        if importlib.util.find_spec(name) is not None:
+            names.append(name)
+    return sorted(names)
+
+
+class ExtensionManifest:
+    """Top-level app command names of each extension, as of its last load.
+
+    Lets the bot answer a command of an extension it hasn't imported yet by
+    loading that extension first.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH) -> None:
+        self.path = path
+        self.commands: Dict[str, List[str]] = {}
+        try:
+            with open(path, encoding="utf-8") as fp:
+                self.commands = json.load(fp)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            log.warning(f"{path} is corrupt, deferred extensions will be loaded at startup.")
+
+    def __contains__(self, extension: str) -> bool:
+        return extension in self.commands
+
+    def record(self, extension: str, commands: List[str]) -> None:
+        commands = sorted(commands)
+        if self.commands.get(extension) == commands:
+            return
+        self.commands[extension] = commands
+        temp = f"{self.path}.tmp"
+        with open(temp, "w", encoding="utf-8") as fp:
+            json.dump(self.commands, fp, indent=2, sort_keys=True)
+        os.replace(temp, self.path)
@@ -0,0 +1,237 @@
+from __future__ import annotations
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Generic, Iterable, List, Optional, TypeVar
+import discord
+from logging import getLogger
+log = getLogger("Index")
+
+
+__all__ = ("GuildIndex", "MemberStats", "MemberStatsIndex", "RoleMembers", "RoleIndex")
+
+T = TypeVar("T")
+
+STATUSES = ("online", "idle", "dnd", "offline")
+
+
+class GuildIndex(ABC, Generic[T]):
+    """Base for per-guild indexes kept up to date from gateway events.
+
+    An entry is built from the member cache the first time a guild is
+    looked up, and rebuilt once when the guild finishes chunking, since
+    anything built before that only saw part of the member list. When a
+    guild becomes available again, or is chunked on demand, its entry is
+    checked against a fresh build.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[int, T] = {}
+        self._chunked: Dict[int, bool] = {}
+
+    @abstractmethod
+    def build(self, guild: discord.Guild) -> T:
+        ...
+
+    def get(self, guild: discord.Guild) -> T:
+        entry = self._entries.get(guild.id)
+        if entry is None or (guild.chunked and not self._chunked[guild.id]):
+            entry = self.rebuild(guild)
+        return entry
+
+    def peek(self, guild_id: int) -> Optional[T]:
+        """The entry for a guild if one has been built, without building it."""
+        return self._entries.get(guild_id)
+
+    def rebuild(self, guild: discord.Guild) -> T:
+        entry = self._entries[guild.id] = self.build(guild)
+        self._chunked[guild.id] = guild.chunked
+        return entry
+
+    def check(self, guild: discord.Guild) -> bool:
+        """Compare the entry against a fresh build, rebuilding it on mismatch."""
+        fresh = self.build(guild)
+        if not self._chunked.get(guild.id):
+            # Nothing to compare with, or it only saw part of the members.
+            self._entries[guild.id] = fresh
+            self._chunked[guild.id] = guild.chunked
+            return True
+        consistent = self._entries[guild.id] == fresh
+        if not consistent:
+            log.warning(f"{type(self).__name__} for guild {guild.id} drifted, rebuilding.")
+            self._entries[guild.id] = fresh
+        self._chunked[guild.id] = guild.chunked
+        return consistent
+
+    def drop(self, guild_id: int) -> None:
+        self._entries.pop(guild_id, None)
+        self._chunked.pop(guild_id, None)
+
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        # Events missed while the guild was unavailable may have left the entry stale.
+        if guild.id in self._entries:
+            self.check(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.drop(guild.id)
+
+
+class MemberStats:
+    __slots__ = ("bots", "statuses")
+
+    def __init__(self) -> None:
+        self.bots = 0
+        self.statuses: Dict[str, int] = dict.fromkeys(STATUSES, 0)
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, MemberStats)
+            and self.bots == other.bots
+            and self.statuses == other.statuses
+        )
+
+    @property
+    def total(self) -> int:
+        return sum(self.statuses.values())
+
+    @property
+    def online(self) -> int:
+        """Members whose status is anything but offline."""
+        return self.total - self.statuses["offline"]
+
+    def count(self, status: discord.Status) -> int:
+        return self.statuses.get(_status_key(status), 0)
+
+    def add(self, member: discord.Member, sign: int = 1) -> None:
+        if member.bot:
+            self.bots += sign
+        self.statuses[_status_key(member.status)] += sign
+
+
+def _status_key(status: discord.Status) -> str:
+    # Invisible members are reported to everyone else as offline, and so
+    # is any status this doesn't know.
+    key = str(status)
+    return key if key in STATUSES else "offline"
+
+
+class MemberStatsIndex(GuildIndex[MemberStats]):
+    """Bot and per-status member counts for each guild, updated in O(1)."""
+
+    def build(self, guild: discord.Guild) -> MemberStats:
+        stats = MemberStats()
+        for member in guild.members:
+            stats.add(member)
+        return stats
+
+    async def on_member_join(self, member: discord.Member) -> None:
+        stats = self.peek(member.guild.id)
+        if stats is not None:
+            stats.add(member)
+
+    async def on_member_remove(self, member: discord.Member) -> None:
+        stats = self.peek(member.guild.id)
+        if stats is not None:
+            stats.add(member, -1)
+
+    async def on_presence_update(self, before: discord.Member, after: discord.Member) -> None:
+        stats = self.peek(after.guild.id)
+        if stats is not None and before.status != after.status:
+            stats.statuses[_status_key(before.status)] -= 1
+            stats.statuses[_status_key(after.status)] += 1
+
+
+class RoleMembers:
+    """Role id to a sorted ``array('Q')`` of the ids of members holding it.
+
+    The default role is never stored, every member has it.
+    """
+
+    __slots__ = ("roles",)
+
+    def __init__(self) -> None:
+        self.roles: Dict[int, array] = {}
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, RoleMembers) and self.roles == other.roles
+
+    def count(self, role_id: int) -> int:
+        members = self.roles.get(role_id)
+        return 0 if members is None else len(members)
+
+    def members(self, role_id: int) -> Iterable[int]:
+        return self.roles.get(role_id, ())
+
+    def add(self, role_id: int, member_id: int) -> None:
+        members = self.roles.get(role_id)
+        if members is None:
+            self.roles[role_id] = array("Q", (member_id,))
+            return
+        i = bisect_left(members, member_id)
+        if i == len(members) or members[i] != member_id:
+            members.insert(i, member_id)
+
+    def remove(self, role_id: int, member_id: int) -> None:
+        members = self.roles.get(role_id)
+        if members is None:
+            return
+        i = bisect_left(members, member_id)
+        if i < len(members) and members[i] == member_id:
+            del members[i]
+            if not members:
+                del self.roles[role_id]
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by this entry, including the id arrays."""
+        return sys.getsizeof(self.roles) + sum(
+            sys.getsizeof(role_id) + sys.getsizeof(members) for role_id, members in self.roles.items()
+        )
+
+
+def _role_ids(member: discord.Member) -> List[int]:
+    return [role.id for role in member.roles if not role.is_default()]
+
+
+class RoleIndex(GuildIndex[RoleMembers]):
+    """Per-guild inverted index from roles to the members holding them."""
+
+    def build(self, guild: discord.Guild) -> RoleMembers:
+        by_role: Dict[int, List[int]] = defaultdict(list)
+        for member in guild.members:
+            for role_id in _role_ids(member):
+                by_role[role_id].append(member.id)
+        entry = RoleMembers()
+        entry.roles = {role_id: array("Q", sorted(ids)) for role_id, ids in by_role.items()}
+        return entry
+
+    def memory_usage(self) -> int:
+        return sum(entry.memory_usage() for entry in self._entries.values())
+
+    async def on_member_join(self, member: discord.Member) -> None:
+        entry = self.peek(member.guild.id)
+        if entry is not None:
+            for role_id in _role_ids(member):
+                entry.add(role_id, member.id)
+
+    async def on_member_remove(self, member: discord.Member) -> None:
+        entry = self.peek(member.guild.id)
+        if entry is not None:
+            for role_id in _role_ids(member):
+                entry.remove(role_id, member.id)
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        entry = self.peek(after.guild.id)
+        if entry is None or before.roles == after.roles:
+            return
+        old, new = set(_role_ids(before)), set(_role_ids(after))
+        for role_id in old - new:
+            entry.remove(role_id, after.id)
+        for role_id in new - old:
+            entry.add(role_id, after.id)
+
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        entry = self.peek(role.guild.id)
+        if entry is not None:
+            entry.roles.pop(role.id, None)
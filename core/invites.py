@@ -0,0 +1,287 @@
+from __future__ import annotations
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Set, Tuple
+import discord
+from logging import getLogger
+log = getLogger("Invites")
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+
+__all__ = ("InviteState", "InviteTracker", "InviteUse")
+
+# A reused invite has at least this much time left when it is handed out.
+REUSE_MARGIN = timedelta(minutes=10)
+
+
+class InviteState(NamedTuple):
+    code: str
+    uses: int
+    max_uses: int
+    inviter_id: Optional[int]
+    channel_id: Optional[int]
+
+    @classmethod
+    def of(cls, invite: discord.Invite) -> InviteState:
+        return cls(
+            invite.code,
+            invite.uses or 0,
+            invite.max_uses or 0,
+            invite.inviter.id if invite.inviter else None,
+            invite.channel.id if invite.channel else None
+        )
+
+
+class InviteUse(NamedTuple):
+    """The invite a member joined with; ``code`` is None when it couldn't be told apart."""
+
+    code: Optional[str]
+    inviter_id: Optional[int] = None
+    channel_id: Optional[int] = None
+
+    def describe(self) -> str:
+        if self.code is None:
+            return "unknown"
+        if self.code == "vanity":
+            return "the vanity URL"
+        line = f"`{self.code}`"
+        if self.inviter_id is not None:
+            line += f" by <@{self.inviter_id}>"
+        if self.channel_id is not None:
+            line += f" in <#{self.channel_id}>"
+        return line
+
+
+class InviteTracker:
+    """Invite use counts of every guild, to tell which invite a member joined with.
+
+    A guild's invites are fetched once when it becomes available and then
+    kept up to date from invite create and delete events. Member joins
+    don't say which invite was used and invite events don't carry use
+    counts, so when members join the invites are fetched again and
+    compared with the snapshot: the invite whose uses went up is the one
+    they used. Joins that arrive while a fetch is running share the next
+    one, so a burst of joins costs one request per round trip rather than
+    one per member. When several invites went up at once the joins can't
+    be told apart and are recorded as unknown.
+
+    No fetch is made when only one way in exists: a guild whose vanity URL
+    is its only invite, or with a single invite and no vanity URL. Members
+    added without an invite, such as through Server Discovery, are then
+    attributed to it too.
+
+    Invites the bot created are also kept per channel and handed out
+    again by :meth:`channel_invite` until they are close to expiring.
+    """
+
+    def __init__(self, bot: Bot, *, max_joins: int = 10_000) -> None:
+        self.bot = bot
+        self.max_joins = max_joins
+        # Guild id -> code -> state, only for guilds whose invites could be fetched.
+        self._invites: Dict[int, Dict[str, InviteState]] = {}
+        # Invites deleted since the last fetch; one that ran out of uses was probably just used.
+        self._deleted: Dict[int, Dict[str, InviteState]] = {}
+        self._loading: Dict[int, asyncio.Task[bool]] = {}
+        self._pending: Dict[int, List[discord.Member]] = {}
+        self._attributing: Set[int] = set()
+        # (guild id, member id) -> the invite they joined with, most recent last.
+        self.joins: OrderedDict[Tuple[int, int], InviteUse] = OrderedDict()
+        self._channel_invites: Dict[int, discord.Invite] = {}
+        self._creating: Dict[int, asyncio.Task[discord.Invite]] = {}
+        self._tasks: Set[asyncio.Task[None]] = set()
+
+    def __len__(self) -> int:
+        """Number of guilds whose invites are tracked."""
+        return len(self._invites)
+
+    def get(self, guild_id: int) -> Optional[Dict[str, InviteState]]:
+        return self._invites.get(guild_id)
+
+    def joined_with(self, guild_id: int, member_id: int) -> Optional[InviteUse]:
+        return self.joins.get((guild_id, member_id))
+
+    async def close(self) -> None:
+        tasks = [*self._tasks, *self._loading.values(), *self._creating.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, coro: object, name: str) -> None:
+        task = asyncio.create_task(coro, name=name)  # type: ignore
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, guild: discord.Guild) -> Optional[Dict[str, InviteState]]:
+        if guild.me is None or not guild.me.guild_permissions.manage_guild:
+            return None
+        try:
+            invites = await guild.invites()
+        except discord.HTTPException as e:
+            log.warning(f"Fetching the invites of {guild.id} failed: {e}")
+            return None
+        now = discord.utils.utcnow()
+        assert self.bot.user is not None
+        for invite in invites:
+            # Pick up links the bot made before a restart, so they are reused too.
+            if (
+                invite.inviter is not None and invite.inviter.id == self.bot.user.id
+                and invite.channel is not None and self._reusable(invite, now)
+            ):
+                self._channel_invites.setdefault(invite.channel.id, invite)
+        return {invite.code: InviteState.of(invite) for invite in invites}
+
+    async def load(self, guild: discord.Guild) -> bool:
+        """Take a snapshot of a guild's invites, returning whether it could."""
+        task = self._loading.get(guild.id)
+        if task is None:
+            task = self._loading[guild.id] = asyncio.create_task(self._load(guild), name=f"invites-{guild.id}")
+            task.add_done_callback(lambda _: self._loading.pop(guild.id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, guild: discord.Guild) -> bool:
+        invites = await self._fetch(guild)
+        if invites is None:
+            return False
+        self._invites[guild.id] = invites
+        self._deleted.pop(guild.id, None)
+        return True
+
+    def _record(self, guild_id: int, member_id: int, use: InviteUse) -> None:
+        key = (guild_id, member_id)
+        self.joins[key] = use
+        self.joins.move_to_end(key)
+        while len(self.joins) > self.max_joins:
+            self.joins.popitem(last=False)
+        result = "unknown" if use.code is None else "vanity" if use.code == "vanity" else "attributed"
+        self.bot.metrics.inc("invite_joins_total", result=result)
+
+    async def _attribute(self, guild: discord.Guild) -> None:
+        try:
+            while members := self._pending.pop(guild.id, []):
+                before = self._invites.get(guild.id)
+                only = self._only_way_in(guild, before)
+                if only is not None:
+                    assert before is not None
+                    if only.code in before:
+                        before[only.code] = before[only.code]._replace(uses=before[only.code].uses + len(members))
+                    self._announce(guild, members, only)
+                    continue
+                after = await self._fetch(guild)
+                if after is None:
+                    continue
+                self._invites[guild.id] = after
+                deleted = self._deleted.pop(guild.id, {})
+                if before is None:
+                    # Nothing to compare against yet; later joins can be attributed.
+                    continue
+
+                used = [
+                    (state, state.uses - (before[code].uses if code in before else 0))
+                    for code, state in after.items()
+                    if state.uses > (before[code].uses if code in before else 0)
+                ]
+                used.extend(
+                    (state, 1) for state in deleted.values()
+                    if state.max_uses and state.uses + 1 >= state.max_uses
+                )
+                # Members who joined while the fetch ran may already be counted in it.
+                waiting = self._pending.get(guild.id, [])
+                extra = min(sum(count for _, count in used) - len(members), len(waiting))
+                if extra > 0:
+                    members.extend(waiting[:extra])
+                    del waiting[:extra]
+                if len(used) == 1:
+                    state = used[0][0]
+                    use = InviteUse(state.code, state.inviter_id, state.channel_id)
+                elif not used and "VANITY_URL" in guild.features:
+                    use = InviteUse("vanity")
+                else:
+                    use = InviteUse(None)
+                self._announce(guild, members, use)
+        finally:
+            self._attributing.discard(guild.id)
+
+    def _only_way_in(self, guild: discord.Guild, invites: Optional[Dict[str, InviteState]]) -> Optional[InviteUse]:
+        """The invite every join must have used, if the snapshot leaves just one."""
+        if invites is None or self._deleted.get(guild.id):
+            return None
+        vanity = "VANITY_URL" in guild.features
+        if not invites and vanity:
+            return InviteUse("vanity")
+        if len(invites) == 1 and not vanity:
+            state = next(iter(invites.values()))
+            return InviteUse(state.code, state.inviter_id, state.channel_id)
+        return None
+
+    def _announce(self, guild: discord.Guild, members: List[discord.Member], use: InviteUse) -> None:
+        for member in members:
+            self._record(guild.id, member.id, use)
+            log.info(
+                f"{member} ({member.id}) joined {guild.id} with {use.code or 'an unknown invite'}",
+                extra={"guild_id": guild.id, "member_id": member.id, "invite": use.code}
+            )
+            self.bot.dispatch("invite_join", member, use)
+
+    async def channel_invite(self, channel: discord.abc.GuildChannel, max_age: int = 3600) -> discord.Invite:
+        """An invite to ``channel``, reusing the last one the bot made while it has time left."""
+        invite = self._channel_invites.get(channel.id)
+        if invite is not None and self._reusable(invite, discord.utils.utcnow()):
+            return invite
+        task = self._creating.get(channel.id)
+        if task is None:
+            task = self._creating[channel.id] = asyncio.create_task(
+                self._create(channel, max_age), name=f"invite-{channel.id}"
+            )
+            task.add_done_callback(lambda _: self._creating.pop(channel.id, None))
+        return await asyncio.shield(task)
+
+    async def _create(self, channel: discord.abc.GuildChannel, max_age: int) -> discord.Invite:
+        invite = await channel.create_invite(max_age=max_age, reason="Invite link command")
+        self._channel_invites[channel.id] = invite
+        return invite
+
+    @staticmethod
+    def _reusable(invite: discord.Invite, now: datetime) -> bool:
+        if invite.max_uses or invite.temporary:
+            return False
+        return invite.expires_at is None or invite.expires_at - now > REUSE_MARGIN
+
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        if guild.id not in self._invites:
+            self._spawn(self.load(guild), f"invites-{guild.id}")
+
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        await self.on_guild_available(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self._invites.pop(guild.id, None)
+        self._deleted.pop(guild.id, None)
+        self._pending.pop(guild.id, None)
+        for channel in guild.channels:
+            self._channel_invites.pop(channel.id, None)
+
+    async def on_member_join(self, member: discord.Member) -> None:
+        guild = member.guild
+        self._pending.setdefault(guild.id, []).append(member)
+        if guild.id not in self._attributing:
+            self._attributing.add(guild.id)
+            self._spawn(self._attribute(guild), f"invite-joins-{guild.id}")
+
+    async def on_invite_create(self, invite: discord.Invite) -> None:
+        guild_id = getattr(invite.guild, "id", None)
+        invites = self._invites.get(guild_id) if guild_id is not None else None
+        if invites is not None:
+            invites[invite.code] = InviteState.of(invite)
+
+    async def on_invite_delete(self, invite: discord.Invite) -> None:
+        guild_id = getattr(invite.guild, "id", None)
+        invites = self._invites.get(guild_id) if guild_id is not None else None
+        if invites is not None and invite.code in invites:
+            self._deleted.setdefault(guild_id, {})[invite.code] = invites.pop(invite.code)  # type: ignore
+        channel_id = getattr(invite.channel, "id", None)
+        cached = self._channel_invites.get(channel_id) if channel_id is not None else None
+        if cached is not None and cached.code == invite.code:
+            del self._channel_invites[channel_id]  # type: ignore
@@ -0,0 +1,163 @@
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Set, Tuple, Union
+import discord
+from .embed import Embed
+from logging import getLogger
+log = getLogger("Joins")
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+
+__all__ = ("JoinPipeline",)
+
+# Members named in one summary; the rest are only counted.
+SUMMARY_MENTIONS = 40
+
+
+class JoinPipeline:
+    """Welcomes new members without flooding the welcome channel.
+
+    Joins of a guild are collected for ``coalesce`` seconds and announced
+    together in one message, ``raid_coalesce`` seconds while the guild is
+    in raid mode. A guild enters raid mode when ``raid_joins`` members join
+    within ``raid_window`` seconds, both taken from the guild's settings.
+    Raid mode dispatches ``raid_detected``
+    with the members of that window, then ``raid_member_join`` for every
+    further join, and ``raid_ended`` once the join rate stayed below the
+    threshold for ``raid_cooldown`` seconds.
+    """
+
+    def __init__(
+        self,
+        bot: Bot, *,
+        coalesce: float = 3.0,
+        raid_coalesce: float = 15.0,
+        raid_cooldown: float = 120.0
+    ) -> None:
+        self.bot = bot
+        self.coalesce = coalesce
+        self.raid_coalesce = raid_coalesce
+        self.raid_cooldown = raid_cooldown
+        self._recent: Dict[int, Deque[Tuple[float, discord.Member]]] = {}
+        self._pending: Dict[int, List[discord.Member]] = {}
+        self._counts: Dict[int, int] = {}
+        # Guild id -> monotonic time raid mode lasts until, extended by every burst.
+        self.raids: Dict[int, float] = {}
+        # Guild id -> (configured channel id, resolved channel).
+        self._channels: Dict[int, Tuple[Optional[int], Optional[discord.abc.Messageable]]] = {}
+        self._tasks: Set[asyncio.Task[None]] = set()
+
+    def _spawn(self, coro: object, name: str) -> None:
+        task = asyncio.create_task(coro, name=name)  # type: ignore
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def rate(self, guild_id: int) -> int:
+        """Joins of a guild within the last ``raid_window`` seconds."""
+        recent = self._recent.get(guild_id)
+        if not recent:
+            return 0
+        cutoff = time.monotonic() - self.bot.settings.get(guild_id).raid_window
+        while recent and recent[0][0] < cutoff:
+            recent.popleft()
+        return len(recent)
+
+    def raiding(self, guild_id: int) -> bool:
+        return guild_id in self.raids
+
+    def add(self, member: discord.Member) -> None:
+        guild = member.guild
+        now = time.monotonic()
+        self._recent.setdefault(guild.id, deque()).append((now, member))
+        rate = self.rate(guild.id)
+        settings = self.bot.settings.get(guild.id)
+
+        if guild.id in self.raids:
+            if rate >= settings.raid_joins:
+                self.raids[guild.id] = now + self.raid_cooldown
+            self.bot.dispatch("raid_member_join", member)
+        elif rate >= settings.raid_joins:
+            self.raids[guild.id] = now + self.raid_cooldown
+            members = [m for _, m in self._recent[guild.id]]
+            log.warning(f"Raid detected in {guild} ({guild.id}): {rate} joins in {settings.raid_window:.0f}s")
+            self.bot.dispatch("raid_detected", guild, members)
+            self._spawn(self._watch_raid(guild), f"raid-{guild.id}")
+
+        pending = self._pending.setdefault(guild.id, [])
+        if len(pending) < SUMMARY_MENTIONS:
+            pending.append(member)
+        self._counts[guild.id] = self._counts.get(guild.id, 0) + 1
+        if self._counts[guild.id] == 1:
+            self._spawn(self._announce_later(guild), f"joins-{guild.id}")
+
+    async def _watch_raid(self, guild: discord.Guild) -> None:
+        while (remaining := self.raids[guild.id] - time.monotonic()) > 0:
+            await asyncio.sleep(remaining)
+        del self.raids[guild.id]
+        log.info(f"Raid mode ended in {guild} ({guild.id})")
+        self.bot.dispatch("raid_ended", guild)
+
+    async def _announce_later(self, guild: discord.Guild) -> None:
+        await asyncio.sleep(self.raid_coalesce if guild.id in self.raids else self.coalesce)
+        members = self._pending.pop(guild.id, [])
+        count = self._counts.pop(guild.id, 0)
+        if not self.rate(guild.id):
+            self._recent.pop(guild.id, None)
+        if not count:
+            return
+
+        channel = self.channel(guild)
+        if channel is None:
+            return
+        if count == 1:
+            embed = Embed(title="New Member Joined!", description=f"{members[0].mention} just joined the server!")
+        else:
+            mentions = ", ".join(member.mention for member in members)
+            if count > len(members):
+                mentions += f" and {count - len(members)} more"
+            embed = Embed(title=f"{count} New Members Joined!", description=mentions[:4096])
+        if guild.id in self.raids:
+            embed.color = discord.Color.red()
+            embed.set_footer(text="Raid mode is active")
+        try:
+            await channel.send(embed=embed)
+        except discord.HTTPException:
+            log.exception(f"Sending the join message for {guild.id} failed")
+
+    def channel(self, guild: discord.Guild) -> Optional[discord.abc.Messageable]:
+        """The welcome channel of a guild, resolved once and cached.
+
+        A guild without one is cached as None, so it isn't looked up again
+        until its join channel setting changes.
+        """
+        channel_id = self.bot.settings.get(guild.id).join_channel_id
+        cached = self._channels.get(guild.id)
+        if cached is not None and cached[0] == channel_id:
+            return cached[1]
+        channel: Optional[Union[discord.abc.GuildChannel, discord.Thread]] = None
+        if channel_id is not None:
+            channel = guild.get_channel_or_thread(channel_id)
+        if channel is not None and not isinstance(channel, discord.abc.Messageable):
+            log.warning(f"Join channel {channel_id} of {guild.id} is not a text channel")
+            channel = None
+        self._channels[guild.id] = (channel_id, channel)  # type: ignore
+        return channel  # type: ignore
+
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel) -> None:
+        self._channels.pop(channel.guild.id, None)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        self._channels.pop(channel.guild.id, None)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self._channels.pop(guild.id, None)
+        self._recent.pop(guild.id, None)
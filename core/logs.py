@@ -0,0 +1,177 @@
+from __future__ import annotations
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+
+__all__ = ("JsonFormatter", "SamplingFilter", "dropped_records", "setup_logging")
+
+# Attributes every LogRecord has; anything else was passed with ``extra=``.
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line.
+
+    Fields passed with ``extra=`` are included as they are, and ``fields``
+    are added to every record, e.g. the cluster id.
+    """
+
+    def __init__(self, fields: Optional[Mapping[str, Any]] = None) -> None:
+        super().__init__()
+        self.fields = dict(fields or {})
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **self.fields
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Lets at most ``rate`` records per ``per`` seconds through from noisy loggers.
+
+    ``limits`` maps logger names to ``(rate, per)``; a limit covers the
+    logger's children too. Records at ERROR and above always pass. The
+    first record let through after some were dropped carries their count
+    in a ``suppressed`` field.
+    """
+
+    def __init__(self, limits: Mapping[str, Tuple[int, float]]) -> None:
+        super().__init__()
+        self.limits = dict(limits)
+        # Logger name -> the configured name whose limit applies, or None.
+        self._resolved: Dict[str, Optional[str]] = {}
+        # Configured name -> [window start, records let through, records dropped].
+        self._windows: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def _resolve(self, name: str) -> Optional[str]:
+        try:
+            return self._resolved[name]
+        except KeyError:
+            pass
+        parts = name.split(".")
+        match = None
+        for i in range(len(parts), 0, -1):
+            candidate = ".".join(parts[:i])
+            if candidate in self.limits:
+                match = candidate
+                break
+        self._resolved[name] = match
+        return match
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        name = self._resolve(record.name)
+        if name is None:
+            return True
+        rate, per = self.limits[name]
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(name)
+            if window is None or now - window[0] >= per:
+                if window is not None and window[2]:
+                    record.suppressed = int(window[2])
+                window = self._windows[name] = [now, 0, 0]
+            if window[1] >= rate:
+                window[2] += 1
+                return False
+            window[1] += 1
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Puts records on the queue without formatting them and without ever blocking.
+
+    Only the message is resolved here, since its arguments may change
+    before the listener thread gets to it. Tracebacks are formatted by the
+    listener. When the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def dropped_records() -> int:
+    """Records dropped so far because the queue of :func:`setup_logging` was full."""
+    return sum(h.dropped for h in logging.getLogger().handlers if isinstance(h, _QueueHandler))
+
+
+def setup_logging(
+    *,
+    level: int = logging.INFO,
+    path: Optional[str] = None,
+    console: str = "text",
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    sampling: Optional[Mapping[str, Tuple[int, float]]] = None,
+    fields: Optional[Mapping[str, Any]] = None,
+    queue_size: int = 10_000
+) -> logging.handlers.QueueListener:
+    """Route every log record through a queue to a background writer thread.
+
+    Loggers on the event loop only put records on a bounded queue. A
+    listener thread formats them and writes them to stderr, as text or as
+    JSON lines depending on ``console``, and as JSON lines to ``path``,
+    rotated every ``max_bytes``. ``sampling`` limits noisy loggers, see
+    :class:`SamplingFilter`. Call ``stop()`` on the returned listener
+    before exiting to flush what is still queued.
+    """
+    handlers: List[logging.Handler] = []
+    stream = logging.StreamHandler(sys.stderr)
+    if console == "json":
+        stream.setFormatter(JsonFormatter(fields))
+    else:
+        stream.setFormatter(logging.Formatter("[{asctime}] [{levelname:<8}] {name}: {message}", "%Y-%m-%d %H:%M:%S", style="{"))
+    handlers.append(stream)
+    if path is not None:
+        file = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file.setFormatter(JsonFormatter(fields))
+        handlers.append(file)
+
+    log_queue: queue.Queue = queue.Queue(queue_size)
+    handler = _QueueHandler(log_queue)
+    if sampling:
+        handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
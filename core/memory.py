@@ -0,0 +1,221 @@
+from __future__ import annotations
+import asyncio
+import itertools
+import sys
+import time
+import tracemalloc
+import types
+from collections import Counter, deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import discord
+from .profiles import rss_bytes
+from logging import getLogger
+log = getLogger("Memory")
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+
+__all__ = ("GuildFootprint", "MemoryReport", "TraceSnapshots", "deep_size", "memory_report")
+
+# Objects every cached object points at; they are counted once on their own, not per reference.
+_SHARED = (
+    discord.Client, discord.Guild, discord.abc.GuildChannel, discord.Thread, discord.Role,
+    discord.state.ConnectionState, type, types.ModuleType, types.FunctionType, types.MethodType
+)
+_ATOMS = (str, bytes, int, float, bool, type(None))
+
+
+def deep_size(obj: Any, seen: Optional[Set[int]] = None, depth: int = 4) -> int:
+    """Approximate bytes of ``obj`` and what it references, ``depth`` levels deep.
+
+    Guilds, channels, roles and the client are not followed, since they
+    are shared by everything that references them.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, _SHARED):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if depth == 0 or isinstance(obj, _ATOMS):
+        return size
+    children: Iterable[Any]
+    if isinstance(obj, dict):
+        children = itertools.chain(obj.keys(), obj.values())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        children = obj
+    else:
+        children = []
+        for cls in type(obj).__mro__:
+            slots = cls.__dict__.get("__slots__", ())
+            for slot in (slots,) if isinstance(slots, str) else slots:
+                if slot not in ("__dict__", "__weakref__"):
+                    children.append(getattr(obj, slot, None))
+        if hasattr(obj, "__dict__"):
+            children.append(obj.__dict__)
+    return size + sum(deep_size(child, seen, depth - 1) for child in children)
+
+
+def _own_size(obj: Any) -> int:
+    """Size of a shared object such as a role, which deep_size skips."""
+    seen: Set[int] = {id(obj)}
+    return sys.getsizeof(obj) + sum(
+        deep_size(getattr(obj, slot, None), seen)
+        for cls in type(obj).__mro__
+        for slot in cls.__dict__.get("__slots__", ())
+        if slot not in ("__dict__", "__weakref__")
+    )
+
+
+def _average(objects: Iterable[Any], sample: int) -> float:
+    sizes = [deep_size(obj) for obj in itertools.islice(objects, sample)]
+    return sum(sizes) / len(sizes) if sizes else 0.0
+
+
+class GuildFootprint(NamedTuple):
+    guild_id: int
+    name: str
+    members: int
+    presences: int
+    messages: int
+    roles: int
+    emojis: int
+    # Estimated bytes of each kind of object.
+    member_bytes: int
+    presence_bytes: int
+    message_bytes: int
+    role_bytes: int
+    emoji_bytes: int
+
+    @property
+    def total_bytes(self) -> int:
+        return self.member_bytes + self.presence_bytes + self.message_bytes + self.role_bytes + self.emoji_bytes
+
+
+class MemoryReport(NamedTuple):
+    rss: int
+    users: int
+    guilds: List[GuildFootprint]
+    # Bytes or entries of the bot's own caches, by name.
+    caches: Dict[str, int]
+
+
+def memory_report(bot: Bot, sample: int = 200) -> MemoryReport:
+    """Counts and estimated sizes of what the bot caches, per guild.
+
+    Sizes are averages over ``sample`` objects of each kind, taken from
+    the largest guilds, times the counts. Only public discord.py
+    attributes are read; they copy references to the cached objects,
+    which is fast enough to run on the event loop.
+    """
+    guilds = sorted(bot.guilds, key=lambda g: g.member_count or 0, reverse=True)
+    sampled = list(itertools.islice(itertools.chain.from_iterable(g.members for g in guilds), sample))
+    member_size = _average(sampled, sample)
+    with_presence = [m for m in sampled if m.activities or m.raw_status != "offline"]
+    presence_share = len(with_presence) / len(sampled) if sampled else 0.0
+    presence_size = _average(((m.client_status, m.activities) for m in with_presence), sample)
+
+    messages: Counter[int] = Counter(m.guild.id for m in bot.cached_messages if m.guild is not None)
+    message_size = _average(bot.cached_messages, sample)
+    roles = [_own_size(r) for r in itertools.islice(itertools.chain.from_iterable(g.roles for g in guilds), sample)]
+    role_size = sum(roles) / len(roles) if roles else 0.0
+    emoji_size = _average(itertools.chain.from_iterable(g.emojis for g in guilds), sample)
+
+    footprints = []
+    for guild in guilds:
+        stats = bot.member_stats.peek(guild.id)
+        count = len(guild.members)
+        role_count = len(guild.roles)
+        presences = stats.online if stats is not None else round(count * presence_share)
+        footprints.append(GuildFootprint(
+            guild.id, guild.name, count, presences, messages[guild.id], role_count, len(guild.emojis),
+            int(count * member_size), int(presences * presence_size), int(messages[guild.id] * message_size),
+            int(role_count * role_size), int(len(guild.emojis) * emoji_size)
+        ))
+    footprints.sort(key=lambda f: f.total_bytes, reverse=True)
+
+    caches = {
+        "role_index_bytes": bot.role_members.memory_usage(),
+        "response_cache_entries": len(bot.responses),
+        "settings_loaded": len(bot.settings),
+        "rate_limit_buckets": len(bot.rate_limits),
+        "search_index_bytes": bot.search_index.bytes,
+        "reminders_pending": len(bot.reminders),
+        "cases_queued": len(bot.cases)
+    }
+    return MemoryReport(rss_bytes(), len(bot.users), footprints, caches)
+
+
+class _Snapshot(NamedTuple):
+    number: int
+    taken: float
+    snapshot: tracemalloc.Snapshot
+
+
+class TraceSnapshots:
+    """tracemalloc snapshots of the process, kept to diff them later.
+
+    Tracing slows every allocation down, so it only runs between
+    :meth:`take` and :meth:`stop`. Taking, filtering and comparing
+    snapshots runs in a worker thread. At most ``keep`` snapshots are kept.
+    """
+
+    def __init__(self, keep: int = 5, frames: int = 10) -> None:
+        self.keep = keep
+        self.frames = frames
+        self.snapshots: Deque[_Snapshot] = deque(maxlen=keep)
+        self._numbers = itertools.count(1)
+        self._lock = asyncio.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    @staticmethod
+    def _filter(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+        return snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>")
+        ))
+
+    async def take(self) -> Tuple[int, List[tracemalloc.Statistic]]:
+        """Take a snapshot, starting tracing if needed.
+
+        Returns the snapshot's number and its top allocation sites. The
+        first snapshot after tracing starts only sees allocations made
+        since then.
+        """
+        async with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self.snapshots.clear()
+                log.info(f"Started tracemalloc with {self.frames} frames")
+
+            def take() -> Tuple[tracemalloc.Snapshot, List[tracemalloc.Statistic]]:
+                snapshot = self._filter(tracemalloc.take_snapshot())
+                return snapshot, snapshot.statistics("lineno")[:10]
+
+            snapshot, top = await asyncio.to_thread(take)
+            number = next(self._numbers)
+            self.snapshots.append(_Snapshot(number, time.time(), snapshot))
+            return number, top
+
+    def get(self, number: int) -> Optional[_Snapshot]:
+        return next((s for s in self.snapshots if s.number == number), None)
+
+    async def diff(self, before: _Snapshot, after: _Snapshot, limit: int = 10) -> List[tracemalloc.StatisticDiff]:
+        """Allocation sites that grew the most between two snapshots."""
+
+        def compare() -> List[tracemalloc.StatisticDiff]:
+            diffs = after.snapshot.compare_to(before.snapshot, "lineno")
+            return sorted(diffs, key=lambda d: d.size_diff, reverse=True)[:limit]
+
+        return await asyncio.to_thread(compare)
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.snapshots.clear()
+        log.info("Stopped tracemalloc")
@@ -0,0 +1,183 @@
+from __future__ import annotations
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from aiohttp import web
+from logging import getLogger
+log = getLogger("Metrics")
+
+
+__all__ = ("Histogram", "Metrics", "MetricsServer", "LoopLagProbe")
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+Collector = Callable[["Metrics"], None]
+
+
+class Histogram:
+    """Fixed-bucket histogram.
+
+    ``counts[i]`` holds the values in ``(buckets[i - 1], buckets[i]]``; the
+    last slot holds everything above the largest bucket.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                low = self.buckets[i - 1] if i else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format(name: str, labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = labels + ((extra,) if extra else ())
+    if not pairs:
+        return name
+    escaped = (
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return f"{name}{{{','.join(escaped)}}}"
+
+
+class Metrics:
+    """In-process registry of counters, gauges and histograms.
+
+    ``collectors`` run right before each render, so gauges that are cheap
+    to read but change constantly (shard latency, cache sizes) are only
+    computed when someone looks.
+    """
+
+    def __init__(self, prefix: str = "atomix_") -> None:
+        self.prefix = prefix
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.gauges: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.collectors: List[Collector] = []
+
+    def inc(self, name: str, value: float = 1.0, **labels: object) -> None:
+        series = self.counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: object) -> None:
+        self.gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: object) -> None:
+        series = self.histograms.setdefault(name, {})
+        key = _labels(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def collect(self) -> None:
+        for collector in self.collectors:
+            try:
+                collector(self)
+            except Exception:
+                log.exception(f"Metrics collector {collector!r} failed")
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format."""
+        self.collect()
+        lines: List[str] = []
+        for kind, registry in (("counter", self.counters), ("gauge", self.gauges)):
+            for name, series in sorted(registry.items()):
+                full = self.prefix + name
+                lines.append(f"# TYPE {full} {kind}")
+                lines.extend(f"{_format(full, labels)} {value}" for labels, value in sorted(series.items()))
+        for name, series in sorted(self.histograms.items()):
+            full = self.prefix + name
+            lines.append(f"# TYPE {full} histogram")
+            for labels, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{_format(full + '_bucket', labels, ('le', str(bound)))} {cumulative}")
+                lines.append(f"{_format(full + '_bucket', labels, ('le', '+Inf'))} {histogram.count}")
+                lines.append(f"{_format(full + '_sum', labels)} {histogram.sum}")
+                lines.append(f"{_format(full + '_count', labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves ``/metrics`` for Prometheus to scrape."""
+
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9100) -> None:
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.metrics.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        log.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class LoopLagProbe:
+    """Measures how late the event loop wakes a task that asked to sleep ``interval``."""
+
+    def __init__(self, metrics: Metrics, interval: float = 0.5) -> None:
+        self.metrics = metrics
+        self.interval = interval
+        self.last = 0.0
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="loop-lag-probe")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last = max(time.perf_counter() - started - self.interval, 0.0)
+            self.metrics.observe("event_loop_lag_seconds", self.last)
+            self.metrics.set("event_loop_lag_last_seconds", self.last)
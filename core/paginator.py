@@ -0,0 +1,174 @@
+from __future__ import annotations
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Union
+import discord
+from .embed import Embed
+
+
+__all__ = ("Paginator",)
+
+Source = Callable[[], Union[Iterable[str], AsyncIterable[str]]]
+
+
+async def _aiter(items: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+class Paginator(discord.ui.View):
+    """Pages through a list that may not fit into one embed.
+
+    Items are pulled from ``source`` only as far as the page being shown,
+    so nothing past the current page is built up front. Rendered pages are
+    kept for ``ttl`` seconds; an expired page is rebuilt by calling
+    ``source`` again and skipping to where that page started.
+    """
+
+    def __init__(
+        self,
+        title: str,
+        source: Source, *,
+        separator: str = ", ",
+        limit: int = 4096,
+        ttl: float = 60.0,
+        empty: str = "Nothing to show.",
+        author_id: Optional[int] = None,
+        timeout: Optional[float] = 180.0
+    ) -> None:
+        super().__init__(timeout=timeout)
+        self.title = title
+        self.source = source
+        self.separator = separator
+        self.limit = limit
+        self.ttl = ttl
+        self.empty = empty
+        self.author_id = author_id
+        self.index = 0
+        self.message: Optional[discord.InteractionMessage] = None
+        self._pages: Dict[int, Tuple[str, float]] = {}
+        self._offsets: List[int] = [0]
+        self._iterator: Optional[AsyncIterator[str]] = None
+        self._cursor = 0
+        self._lookahead: Optional[str] = None
+        self._exhausted = False
+
+    @property
+    def page_count(self) -> Optional[int]:
+        """Total number of pages, or None while the source isn't exhausted."""
+        return len(self._offsets) if self._exhausted else None
+
+    async def _pull(self) -> Optional[str]:
+        assert self._iterator is not None
+        if self._lookahead is not None:
+            item, self._lookahead = self._lookahead, None
+        else:
+            try:
+                item = (await self._iterator.__anext__())[:self.limit]
+            except StopAsyncIteration:
+                return None
+        self._cursor += 1
+        return item
+
+    def _push_back(self, item: str) -> None:
+        self._lookahead = item
+        self._cursor -= 1
+
+    async def _build(self, index: int) -> str:
+        start = self._offsets[index]
+        if self._iterator is None or self._cursor != start:
+            self._iterator = _aiter(self.source()).__aiter__()
+            self._cursor = 0
+            self._lookahead = None
+            while self._cursor < start and await self._pull() is not None:
+                pass
+
+        parts: List[str] = []
+        size = 0
+        while (item := await self._pull()) is not None:
+            added = len(item) + (len(self.separator) if parts else 0)
+            if parts and size + added > self.limit:
+                self._push_back(item)
+                break
+            parts.append(item)
+            size += added
+
+        if index == len(self._offsets) - 1 and not self._exhausted:
+            # Look one item ahead so the last page is known as soon as it is shown.
+            following = await self._pull()
+            if following is None:
+                self._exhausted = True
+            else:
+                self._push_back(following)
+                self._offsets.append(self._cursor)
+        return self.separator.join(parts)
+
+    async def render(self, index: int) -> Embed:
+        cached = self._pages.get(index)
+        now = time.monotonic()
+        if cached is not None and cached[1] > now:
+            text = cached[0]
+        else:
+            text = await self._build(index)
+            self._pages[index] = (text, now + self.ttl)
+
+        embed = Embed(title=self.title, description=text or self.empty)
+        total = self.page_count
+        embed.set_footer(text=f"Page {index + 1}/{total}" if total else f"Page {index + 1}")
+        return embed
+
+    def _update_buttons(self) -> None:
+        self.previous_page.disabled = self.index == 0
+        self.next_page.disabled = self._exhausted and self.index >= len(self._offsets) - 1
+
+    async def send(self, interaction: discord.Interaction, *, ephemeral: bool = False) -> None:
+        """Send the first page, attaching the buttons only if there is a second one."""
+        embed = await self.render(0)
+        if self.page_count == 1:
+            self.stop()
+            await _respond(interaction, embed=embed, ephemeral=ephemeral)
+            return
+
+        self._update_buttons()
+        await _respond(interaction, embed=embed, view=self, ephemeral=ephemeral)
+        self.message = await interaction.original_response()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if self.author_id is not None and interaction.user.id != self.author_id:
+            await interaction.response.send_message("This menu isn't for you.", ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction, index: int) -> None:
+        self.index = index
+        embed = await self.render(index)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        await self._show(interaction, max(self.index - 1, 0))
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        await self._show(interaction, self.index + 1)
+
+    async def on_timeout(self) -> None:
+        self._pages.clear()
+        if self.message is not None:
+            for item in self.children:
+                item.disabled = True
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+
+async def _respond(interaction: discord.Interaction, **kwargs: Any) -> None:
+    if interaction.response.is_done():
+        await interaction.followup.send(**kwargs)
+    else:
+        await interaction.response.send_message(**kwargs)
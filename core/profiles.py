@@ -0,0 +1,100 @@
+from __future__ import annotations
+import os
+import sys
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+import discord
+
+
+__all__ = ("CacheProfile", "PROFILES", "get_profile", "rss_bytes")
+
+
+@dataclass(frozen=True)
+class CacheProfile:
+    """Intents and cache settings that decide how much state the bot keeps."""
+
+    name: str
+    intents: discord.Intents
+    member_cache_flags: discord.MemberCacheFlags
+    max_messages: Optional[int]
+    chunk_guilds_at_startup: bool
+    # Memory budget of the /search message index, 0 turns it off.
+    search_index_bytes: int
+
+
+def _lean() -> CacheProfile:
+    # Members only, no presences or message cache; guilds are chunked on demand.
+    # /serverinfo and /membercountbystatus can't tell who is online without presences.
+    intents = discord.Intents.default()
+    intents.members = True
+    intents.typing = False
+    intents.voice_states = False
+    return CacheProfile(
+        name="lean",
+        intents=intents,
+        member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+        max_messages=None,
+        chunk_guilds_at_startup=False,
+        search_index_bytes=0
+    )
+
+
+def _moderation() -> CacheProfile:
+    # Adds message content, a small message cache and the /search index for automod and purges.
+    intents = discord.Intents.default()
+    intents.members = True
+    intents.message_content = True
+    intents.typing = False
+    return CacheProfile(
+        name="moderation",
+        intents=intents,
+        member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+        max_messages=1000,
+        chunk_guilds_at_startup=False,
+        search_index_bytes=16 * 1024 * 1024
+    )
+
+
+def _full() -> CacheProfile:
+    intents = discord.Intents.all()
+    return CacheProfile(
+        name="full",
+        intents=intents,
+        member_cache_flags=discord.MemberCacheFlags.all(),
+        max_messages=1000,
+        chunk_guilds_at_startup=True,
+        search_index_bytes=64 * 1024 * 1024
+    )
+
+
+PROFILES: Dict[str, Callable[[], CacheProfile]] = {
+    "lean": _lean,
+    "moderation": _moderation,
+    "full": _full
+}
+
+
+def get_profile(name: str) -> CacheProfile:
+    try:
+        return PROFILES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown cache profile {name!r}, expected one of {', '.join(PROFILES)}") from None
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process.
+
+    Falls back to the peak RSS where /proc is unavailable, and to 0 on
+    platforms without :mod:`resource`.
+    """
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
@@ -0,0 +1,186 @@
+from __future__ import annotations
+import heapq
+import time
+from typing import Any, Callable, Dict, List, Literal, Mapping, NamedTuple, Optional, Tuple, TypeVar, Union
+import discord
+from discord import app_commands
+from .metrics import Metrics
+from logging import getLogger
+log = getLogger("RateLimit")
+
+
+__all__ = ("CommandRateLimited", "RateLimit", "RateLimiter", "rate_limit")
+
+T = TypeVar("T")
+
+Scope = Literal["user", "member", "guild", "channel"]
+
+
+class RateLimit(NamedTuple):
+    """``rate`` uses of a command per ``per`` seconds for each ``scope``.
+
+    ``user`` counts a user everywhere, ``member`` a user within one guild,
+    ``guild`` and ``channel`` everyone in them together.
+    """
+
+    rate: int
+    per: float
+    scope: Scope = "user"
+
+
+class CommandRateLimited(app_commands.CheckFailure):
+    def __init__(self, command: str, retry_after: float) -> None:
+        super().__init__(f"/{command} is rate limited, try again in {retry_after:.1f}s")
+        self.command = command
+        self.retry_after = retry_after
+
+
+def rate_limit(rate: int, per: float, scope: Scope = "user") -> Callable[[T], T]:
+    """Limit an app command to ``rate`` uses per ``per`` seconds for each ``scope``.
+
+    Works above or below ``app_commands.command``: the limit is stored in
+    the command's ``extras``, or on the callback until the command exists.
+    It is enforced by the bot's command tree. On a group it applies to
+    every subcommand without a limit of its own.
+    """
+    limit = RateLimit(rate, per, scope)
+
+    def decorator(func: T) -> T:
+        if isinstance(func, (app_commands.Command, app_commands.Group)):
+            func.extras["rate_limit"] = limit
+        else:
+            func.__rate_limit__ = limit  # type: ignore
+        return func
+
+    return decorator
+
+
+def _scope_id(scope: Scope, interaction: discord.Interaction) -> int:
+    if scope == "user":
+        return interaction.user.id
+    if scope == "member":
+        return ((interaction.guild_id or 0) << 64) | interaction.user.id
+    if scope == "guild":
+        return interaction.guild_id or interaction.user.id
+    return interaction.channel_id or interaction.user.id
+
+
+class RateLimiter:
+    """Token buckets for app commands, in one bounded dict.
+
+    A bucket is stored as a single float, its "theoretical arrival time":
+    every use pushes it ``per / rate`` seconds further, and a use is
+    rejected when that would put it more than ``per`` seconds ahead of
+    now. That is a token bucket holding ``rate`` tokens, refilled one at a
+    time. A bucket whose time has passed is full and is dropped, found
+    through a heap of those times, so idle users cost nothing whatever
+    their command's ``per``. Beyond ``max_buckets``, the buckets closest
+    to full are dropped too, which only ever lets a user through a little
+    early. Keys pack the command and the scope's ids into one int.
+
+    ``overrides`` maps qualified command names to ``(rate, per, scope)``
+    limits that replace the ones set with :func:`rate_limit`, or to None
+    to lift them.
+    """
+
+    def __init__(
+        self,
+        metrics: Optional[Metrics] = None, *,
+        max_buckets: int = 100_000,
+        overrides: Optional[Mapping[str, Optional[Tuple[Any, ...]]]] = None
+    ) -> None:
+        self.metrics = metrics
+        self.max_buckets = max_buckets
+        self.overrides: Dict[str, Optional[RateLimit]] = {
+            name: None if limit is None else RateLimit(*limit) for name, limit in (overrides or {}).items()
+        }
+        self._buckets: Dict[int, float] = {}
+        # One (time, key) per bucket, as of when it was pushed. Uses move a
+        # bucket's time later without touching its entry, so a popped entry
+        # that is out of date is pushed back with the bucket's current time.
+        self._expiries: List[Tuple[float, int]] = []
+        # Qualified command name -> its part of the bucket keys, which never changes.
+        self._indexes: Dict[str, int] = {}
+        self._limits: Dict[str, Optional[RateLimit]] = {}
+        self.evictions = 0
+        if metrics is not None:
+            metrics.collectors.append(self._collect)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _collect(self, metrics: Metrics) -> None:
+        self._expire(time.monotonic())
+        metrics.set("ratelimit_buckets", len(self._buckets))
+        metrics.set("ratelimit_bucket_fill_ratio", len(self._buckets) / self.max_buckets)
+        metrics.set("ratelimit_evicted_buckets", self.evictions)
+
+    def limit_of(self, command: Union[app_commands.Command[Any, ..., Any], app_commands.ContextMenu]) -> Optional[RateLimit]:
+        name = command.qualified_name
+        if name in self.overrides:
+            return self.overrides[name]
+        limit = command.extras.get("rate_limit")
+        if limit is None:
+            limit = getattr(getattr(command, "callback", None), "__rate_limit__", None)
+        parent = getattr(command, "parent", None)
+        while limit is None and parent is not None:
+            limit = parent.extras.get("rate_limit")
+            parent = parent.parent
+        return limit
+
+    def reload(self) -> None:
+        """Forget the limits looked up so far, after commands were reloaded."""
+        self._limits.clear()
+
+    def _evict(self) -> None:
+        """Drop the bucket that is soonest full."""
+        buckets, expiries = self._buckets, self._expiries
+        while True:
+            tat, key = heapq.heappop(expiries)
+            current = buckets[key]
+            if current == tat:
+                del buckets[key]
+                return
+            heapq.heappush(expiries, (current, key))
+
+    def _expire(self, now: float) -> None:
+        expiries = self._expiries
+        while expiries and expiries[0][0] <= now:
+            tat, key = heapq.heappop(expiries)
+            current = self._buckets[key]
+            if current <= now:
+                del self._buckets[key]
+            else:
+                heapq.heappush(expiries, (current, key))
+
+    def hit(
+        self,
+        interaction: discord.Interaction,
+        command: Union[app_commands.Command[Any, ..., Any], app_commands.ContextMenu]
+    ) -> float:
+        """Use a command once, returning 0.0 or the seconds until it is allowed again."""
+        name = command.qualified_name
+        try:
+            limit = self._limits[name]
+        except KeyError:
+            limit = self._limits[name] = self.limit_of(command)
+        if limit is None:
+            return 0.0
+        index = self._indexes.setdefault(name, len(self._indexes))
+        now = time.monotonic()
+        key = (_scope_id(limit.scope, interaction) << 12) | index
+        interval = limit.per / limit.rate
+        tat = max(self._buckets.get(key, now), now) + interval
+        if tat - now > limit.per + 1e-9:
+            if self.metrics is not None:
+                self.metrics.inc("ratelimit_rejections_total", command=name, scope=limit.scope)
+            return tat - now - limit.per
+
+        if key not in self._buckets:
+            heapq.heappush(self._expiries, (tat, key))
+        self._buckets[key] = tat
+        self._expire(now)
+        while len(self._buckets) > self.max_buckets:
+            self._evict()
+            self.evictions += 1
+        return 0.0
@@ -0,0 +1,219 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+import discord
+from .storage import Database
+from logging import getLogger
+log = getLogger("Reminders")
+
+
+__all__ = ("Reminder", "ReminderScheduler")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    channel_id INTEGER,
+    due REAL NOT NULL,
+    message TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reminders_user ON reminders (user_id);
+"""
+
+
+class Reminder(NamedTuple):
+    id: int
+    user_id: int
+    channel_id: Optional[int]
+    due: float
+    message: str
+    created: float
+
+
+Deliver = Callable[[int, List[Reminder]], Awaitable[None]]
+
+
+class ReminderScheduler:
+    """Runs every pending reminder from one timer task.
+
+    Reminders live in a min-heap keyed by due time and are persisted to
+    SQLite, so they survive a restart. Everything already due when the
+    timer fires is delivered together, grouped per user, with at most
+    ``concurrency`` deliveries in flight. A reminder is only removed once
+    it was delivered or can never be (the user or channel is gone or
+    unreachable); other failures are retried after ``retry_delay``
+    seconds, doubling up to ``max_retry_delay``.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        deliver: Deliver, *,
+        concurrency: int = 10,
+        retry_delay: float = 30.0,
+        max_retry_delay: float = 3600.0
+    ) -> None:
+        self.db = db
+        self.deliver = deliver
+        self.concurrency = concurrency
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        # Reminder id -> failed deliveries so far.
+        self._attempts: Dict[int, int] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._pending: Dict[int, Reminder] = {}
+        self._by_user: Dict[int, Set[int]] = defaultdict(set)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+        self._firing: Set[asyncio.Task[None]] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def start(self) -> None:
+        await self.db.executescript(SCHEMA)
+        rows = await self.db.fetchall(
+            "SELECT id, user_id, channel_id, due, message, created FROM reminders"
+        )
+        for row in rows:
+            reminder = Reminder(*row)
+            self._track(reminder)
+            self._heap.append((reminder.due, reminder.id))
+        heapq.heapify(self._heap)
+        log.info(f"Loaded {len(rows)} pending reminders.")
+        self._task = asyncio.create_task(self._run(), name="reminder-scheduler")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Reminders still being delivered stay in the database and go out again after a restart.
+        for task in list(self._firing):
+            task.cancel()
+        await asyncio.gather(*self._firing, return_exceptions=True)
+
+    def _track(self, reminder: Reminder) -> None:
+        self._pending[reminder.id] = reminder
+        self._by_user[reminder.user_id].add(reminder.id)
+
+    def _untrack(self, reminder_id: int) -> Optional[Reminder]:
+        reminder = self._pending.pop(reminder_id, None)
+        if reminder is not None:
+            ids = self._by_user[reminder.user_id]
+            ids.discard(reminder_id)
+            if not ids:
+                del self._by_user[reminder.user_id]
+        return reminder
+
+    async def add(
+        self,
+        user_id: int,
+        channel_id: Optional[int],
+        delay: float,
+        message: str
+    ) -> Reminder:
+        created = time.time()
+        due = created + delay
+        reminder_id = await self.db.execute(
+            "INSERT INTO reminders (user_id, channel_id, due, message, created) VALUES (?, ?, ?, ?, ?)",
+            (user_id, channel_id, due, message, created)
+        )
+        reminder = Reminder(reminder_id, user_id, channel_id, due, message, created)
+        self._track(reminder)
+        heapq.heappush(self._heap, (due, reminder.id))
+        if self._heap[0][1] == reminder.id:
+            self._wakeup.set()
+        return reminder
+
+    def list(self, user_id: int) -> List[Reminder]:
+        return sorted(
+            (self._pending[i] for i in self._by_user.get(user_id, ())),
+            key=lambda r: r.due
+        )
+
+    async def cancel(self, user_id: int, reminder_id: int) -> bool:
+        reminder = self._pending.get(reminder_id)
+        if reminder is None or reminder.user_id != user_id:
+            return False
+        # The heap entry is left in place and skipped when it surfaces.
+        self._untrack(reminder_id)
+        self._attempts.pop(reminder_id, None)
+        await self.db.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
+        return True
+
+    def _pop_due(self, now: float) -> List[Reminder]:
+        due: List[Reminder] = []
+        while self._heap and self._heap[0][0] <= now:
+            _, reminder_id = heapq.heappop(self._heap)
+            reminder = self._untrack(reminder_id)
+            if reminder is not None:
+                due.append(reminder)
+        return due
+
+    async def _run(self) -> None:
+        while True:
+            while self._heap and self._heap[0][1] not in self._pending:
+                heapq.heappop(self._heap)
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            batch = self._pop_due(time.time())
+            if batch:
+                task = asyncio.create_task(self._fire(batch))
+                self._firing.add(task)
+                task.add_done_callback(self._firing.discard)
+
+    async def _fire(self, batch: List[Reminder]) -> None:
+        by_user: Dict[int, List[Reminder]] = defaultdict(list)
+        for reminder in batch:
+            by_user[reminder.user_id].append(reminder)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        finished: List[Reminder] = []
+
+        async def send(user_id: int, reminders: List[Reminder]) -> None:
+            async with semaphore:
+                try:
+                    await self.deliver(user_id, reminders)
+                except (discord.Forbidden, discord.NotFound) as e:
+                    log.warning(f"Dropping {len(reminders)} reminder(s) for {user_id}, they can't be delivered: {e}")
+                except Exception:
+                    log.exception(f"Failed to deliver {len(reminders)} reminder(s) to {user_id}, retrying later")
+                    self._retry(reminders)
+                    return
+                finished.extend(reminders)
+
+        await asyncio.gather(*(send(u, r) for u, r in by_user.items()))
+        for reminder in finished:
+            self._attempts.pop(reminder.id, None)
+        if finished:
+            await self.db.executemany(
+                "DELETE FROM reminders WHERE id = ?", [(r.id,) for r in finished]
+            )
+
+    def _retry(self, reminders: List[Reminder]) -> None:
+        now = time.time()
+        for reminder in reminders:
+            attempts = self._attempts[reminder.id] = self._attempts.get(reminder.id, 0) + 1
+            delay = min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+            self._track(reminder)
+            heapq.heappush(self._heap, (now + delay, reminder.id))
+        self._wakeup.set()
@@ -0,0 +1,389 @@
+from __future__ import annotations
+import re
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+import discord
+from .metrics import Metrics
+from logging import getLogger
+log = getLogger("Search")
+
+
+__all__ = ("IndexedMessage", "MessageIndex", "SearchResult", "tokenize")
+
+_WORD = re.compile(r"\w+")
+MIN_TOKEN = 2
+MAX_TOKEN = 32
+# Words past this many in one message are not indexed.
+MAX_TOKENS = 128
+# Characters of each message kept to show in results.
+SNIPPET = 200
+# Rough bytes of an entry besides its snippet, and of each of its tokens
+# (one id in a posting array plus one tuple slot).
+ENTRY_BYTES = 300
+TOKEN_BYTES = 16
+
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    """Distinct lowercase words of ``text``, in order, as the index stores them."""
+    seen: Dict[str, None] = {}
+    for word in _WORD.findall(text.casefold()):
+        if MIN_TOKEN <= len(word) <= MAX_TOKEN and word not in seen:
+            seen[sys.intern(word)] = None
+            if len(seen) == MAX_TOKENS:
+                break
+    return tuple(seen)
+
+
+def _insert(ids: array, message_id: int) -> None:
+    # Messages mostly arrive in id order, so this is nearly always an append.
+    if not ids or ids[-1] < message_id:
+        ids.append(message_id)
+        return
+    i = bisect_left(ids, message_id)
+    if i == len(ids) or ids[i] != message_id:
+        ids.insert(i, message_id)
+
+
+def _remove(ids: array, message_id: int) -> None:
+    i = bisect_left(ids, message_id)
+    if i < len(ids) and ids[i] == message_id:
+        del ids[i]
+
+
+def _contains(ids: array, message_id: int) -> bool:
+    i = bisect_left(ids, message_id)
+    return i < len(ids) and ids[i] == message_id
+
+
+class IndexedMessage(NamedTuple):
+    id: int
+    channel_id: int
+    guild_id: int
+    author_id: int
+    # The first SNIPPET characters of the content.
+    content: str
+    tokens: Tuple[str, ...]
+    # False for webhook and system messages, whose author isn't a member.
+    from_member: bool = True
+
+    @property
+    def created_at(self) -> datetime:
+        return discord.utils.snowflake_time(self.id)
+
+    @property
+    def jump_url(self) -> str:
+        return f"https://discord.com/channels/{self.guild_id}/{self.channel_id}/{self.id}"
+
+    @property
+    def cost(self) -> int:
+        return ENTRY_BYTES + len(self.content) + TOKEN_BYTES * len(self.tokens)
+
+
+class SearchResult(NamedTuple):
+    query: str
+    messages: List[IndexedMessage]
+    created: float
+
+    @property
+    def author_ids(self) -> FrozenSet[int]:
+        """Authors of the results that were posted by members."""
+        return frozenset(m.author_id for m in self.messages if m.from_member)
+
+    def message_ids(self, channel_id: int) -> List[int]:
+        return [m.id for m in self.messages if m.channel_id == channel_id]
+
+
+class _Channel:
+    """Recent messages of one channel with their word and author postings.
+
+    Postings are sorted ``array('Q')`` of message ids, 8 bytes per entry.
+    """
+
+    __slots__ = ("guild_id", "messages", "postings", "authors", "bytes")
+
+    def __init__(self, guild_id: int) -> None:
+        self.guild_id = guild_id
+        # Message id -> entry, in the order they arrived, which is oldest first.
+        self.messages: OrderedDict[int, IndexedMessage] = OrderedDict()
+        self.postings: Dict[str, array] = {}
+        self.authors: Dict[int, array] = {}
+        self.bytes = 0
+
+    def add(self, entry: IndexedMessage) -> None:
+        self.messages[entry.id] = entry
+        self.bytes += entry.cost
+        _insert(self.authors.setdefault(entry.author_id, array("Q")), entry.id)
+        for token in entry.tokens:
+            _insert(self.postings.setdefault(token, array("Q")), entry.id)
+
+    def _unpost(self, tokens: Iterable[str], message_id: int) -> None:
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is not None:
+                _remove(ids, message_id)
+                if not ids:
+                    del self.postings[token]
+
+    def remove(self, message_id: int) -> Optional[IndexedMessage]:
+        entry = self.messages.pop(message_id, None)
+        if entry is not None:
+            self._drop(entry)
+        return entry
+
+    def pop_oldest(self) -> IndexedMessage:
+        _, entry = self.messages.popitem(last=False)
+        self._drop(entry)
+        return entry
+
+    def _drop(self, entry: IndexedMessage) -> None:
+        self.bytes -= entry.cost
+        self._unpost(entry.tokens, entry.id)
+        ids = self.authors[entry.author_id]
+        _remove(ids, entry.id)
+        if not ids:
+            del self.authors[entry.author_id]
+
+    def replace(self, entry: IndexedMessage) -> None:
+        """Swap an edited message's content, keeping its place."""
+        old = self.messages[entry.id]
+        self._unpost(set(old.tokens) - set(entry.tokens), entry.id)
+        for token in entry.tokens:
+            _insert(self.postings.setdefault(token, array("Q")), entry.id)
+        self.messages[entry.id] = entry
+        self.bytes += entry.cost - old.cost
+
+    def find(self, tokens: Tuple[str, ...], author_id: Optional[int], limit: int) -> List[IndexedMessage]:
+        """Newest messages with every token, by ``author_id`` if given."""
+        lists: List[array] = []
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is None:
+                return []
+            lists.append(ids)
+        if author_id is not None:
+            ids = self.authors.get(author_id)
+            if ids is None:
+                return []
+            lists.append(ids)
+        if not lists:
+            return []
+        lists.sort(key=len)
+        shortest, rest = lists[0], lists[1:]
+        found: List[IndexedMessage] = []
+        for message_id in reversed(shortest):
+            if all(_contains(ids, message_id) for ids in rest):
+                found.append(self.messages[message_id])
+                if len(found) == limit:
+                    break
+        return found
+
+
+class MessageIndex:
+    """Inverted index of recent guild messages, fed from gateway events.
+
+    Each channel keeps its messages oldest first with a posting array of
+    message ids per word and per author, so a search intersects a few
+    sorted arrays instead of paging through the channel's history over
+    REST. Only a snippet of each message is stored.
+
+    Messages older than ``max_age`` seconds and those beyond
+    ``max_per_channel`` in a channel are dropped oldest first. Once the
+    estimated size of everything passes ``max_bytes``, the oldest messages
+    of the channel that has been quiet the longest go first. Raw edit and
+    delete events are used, since the message cache may no longer hold
+    the message.
+    """
+
+    def __init__(
+        self,
+        metrics: Optional[Metrics] = None, *,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_per_channel: int = 5000,
+        max_age: float = 24 * 3600.0,
+        results_ttl: float = 900.0,
+        max_results: int = 256
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_per_channel = max_per_channel
+        self.max_age = max_age
+        self.results_ttl = results_ttl
+        self.max_results = max_results
+        # Least recently written channel first.
+        self._channels: OrderedDict[int, _Channel] = OrderedDict()
+        self._guilds: Dict[int, Set[int]] = {}
+        # (guild id, moderator id) -> their last search, for /purge and the mass commands.
+        self._results: OrderedDict[Tuple[int, int], SearchResult] = OrderedDict()
+        self.bytes = 0
+        self.count = 0
+        self.evictions = 0
+        if metrics is not None:
+            metrics.collectors.append(self._collect)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _collect(self, metrics: Metrics) -> None:
+        self.expire()
+        metrics.set("search_index_messages", self.count)
+        metrics.set("search_index_channels", len(self._channels))
+        metrics.set("search_index_bytes", self.bytes)
+        metrics.set("search_index_evicted_messages", self.evictions)
+
+    def _cutoff(self) -> int:
+        return discord.utils.time_snowflake(discord.utils.utcnow()) - (int(self.max_age * 1000) << 22)
+
+    def _trim(self, channel_id: int, channel: _Channel, cutoff: int) -> None:
+        messages = channel.messages
+        while messages and (len(messages) > self.max_per_channel or next(iter(messages)) < cutoff):
+            self._evict(channel)
+        if not messages:
+            self._drop_channel(channel_id)
+
+    def _evict(self, channel: _Channel) -> None:
+        entry = channel.pop_oldest()
+        self.bytes -= entry.cost
+        self.count -= 1
+        self.evictions += 1
+
+    def _drop_channel(self, channel_id: int) -> None:
+        channel = self._channels.pop(channel_id, None)
+        if channel is None:
+            return
+        self.bytes -= channel.bytes
+        self.count -= len(channel.messages)
+        ids = self._guilds.get(channel.guild_id)
+        if ids is not None:
+            ids.discard(channel_id)
+            if not ids:
+                del self._guilds[channel.guild_id]
+
+    def add(self, message: discord.Message) -> None:
+        if message.guild is None:
+            return
+        channel = self._channels.get(message.channel.id)
+        if channel is None:
+            channel = self._channels[message.channel.id] = _Channel(message.guild.id)
+            self._guilds.setdefault(message.guild.id, set()).add(message.channel.id)
+        else:
+            self._channels.move_to_end(message.channel.id)
+        if message.id in channel.messages:
+            return
+        entry = IndexedMessage(
+            message.id, message.channel.id, message.guild.id, message.author.id,
+            message.content[:SNIPPET], tokenize(message.content),
+            message.webhook_id is None and not message.is_system()
+        )
+        channel.add(entry)
+        self.bytes += entry.cost
+        self.count += 1
+        self._trim(message.channel.id, channel, self._cutoff())
+        while self.bytes > self.max_bytes and self._channels:
+            channel_id, oldest = next(iter(self._channels.items()))
+            self._evict(oldest)
+            if not oldest.messages:
+                self._drop_channel(channel_id)
+
+    def edit(self, channel_id: int, message_id: int, content: str) -> None:
+        channel = self._channels.get(channel_id)
+        old = channel.messages.get(message_id) if channel is not None else None
+        if old is None:
+            return
+        entry = old._replace(content=content[:SNIPPET], tokens=tokenize(content))
+        if entry == old:
+            return
+        channel.replace(entry)
+        self.bytes += entry.cost - old.cost
+
+    def remove(self, channel_id: int, message_ids: Iterable[int]) -> None:
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            return
+        for message_id in message_ids:
+            entry = channel.remove(message_id)
+            if entry is not None:
+                self.bytes -= entry.cost
+                self.count -= 1
+        if not channel.messages:
+            self._drop_channel(channel_id)
+
+    def expire(self) -> None:
+        """Drop messages older than ``max_age`` from every channel."""
+        cutoff = self._cutoff()
+        for channel_id, channel in list(self._channels.items()):
+            self._trim(channel_id, channel, cutoff)
+
+    def channels(self, guild_id: int) -> Set[int]:
+        """Ids of the guild's channels that have indexed messages."""
+        return set(self._guilds.get(guild_id, ()))
+
+    def search(
+        self,
+        channel_ids: Iterable[int],
+        query: Optional[str] = None,
+        author_id: Optional[int] = None,
+        limit: int = 100
+    ) -> List[IndexedMessage]:
+        """Newest indexed messages in ``channel_ids`` containing every word of ``query``.
+
+        Words match whole, ignoring case. With ``author_id`` only that
+        user's messages are returned. At least one of the two is needed.
+        """
+        tokens = tokenize(query or "")
+        if not tokens and author_id is None:
+            return []
+        cutoff = self._cutoff()
+        found: List[IndexedMessage] = []
+        for channel_id in channel_ids:
+            channel = self._channels.get(channel_id)
+            if channel is None:
+                continue
+            self._trim(channel_id, channel, cutoff)
+            found.extend(channel.find(tokens, author_id, limit))
+        found.sort(key=lambda m: m.id, reverse=True)
+        return found[:limit]
+
+    def remember(self, guild_id: int, user_id: int, result: SearchResult) -> None:
+        """Keep a moderator's last search so other commands can act on it."""
+        key = (guild_id, user_id)
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    def last(self, guild_id: int, user_id: int) -> Optional[SearchResult]:
+        result = self._results.get((guild_id, user_id))
+        if result is not None and time.monotonic() - result.created > self.results_ttl:
+            del self._results[(guild_id, user_id)]
+            return None
+        return result
+
+    async def on_message(self, message: discord.Message) -> None:
+        self.add(message)
+
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent) -> None:
+        content = payload.data.get("content")
+        if content is not None:
+            self.edit(payload.channel_id, payload.message_id, content)
+
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
+        self.remove(payload.channel_id, (payload.message_id,))
+
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent) -> None:
+        self.remove(payload.channel_id, payload.message_ids)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        self._drop_channel(channel.id)
+
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent) -> None:
+        self._drop_channel(payload.thread_id)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        for channel_id in self.channels(guild.id):
+            self._drop_channel(channel_id)
+        for key in [key for key in self._results if key[0] == guild.id]:
+            del self._results[key]
@@ -0,0 +1,135 @@
+from __future__ import annotations
+import asyncio
+import json
+from typing import Any, Dict, NamedTuple, Optional
+import discord
+from .storage import Database
+from logging import getLogger
+log = getLogger("Settings")
+
+
+__all__ = ("GuildSettings", "SettingsStore")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (guild_id, name)
+) WITHOUT ROWID;
+"""
+
+
+class GuildSettings(NamedTuple):
+    join_channel_id: Optional[int] = None
+    # A guild is in raid mode after raid_joins joins within raid_window seconds.
+    raid_joins: int = 10
+    raid_window: float = 10.0
+    # None, "timeout" or "kick", applied to the members who join during a raid.
+    raid_action: Optional[str] = None
+    # "delete" only removes messages caught by automod, "timeout" and "ban"
+    # also act on their author.
+    automod_action: str = "delete"
+    automod_timeout: float = 600.0
+    # Spam is more than spam_messages messages, spam_mentions mentions or
+    # spam_duplicates repeats of one message within spam_window seconds.
+    spam_filter: bool = False
+    spam_messages: int = 8
+    spam_mentions: int = 10
+    spam_duplicates: int = 4
+    spam_window: float = 5.0
+
+
+class SettingsStore:
+    """Per-guild settings, kept in memory and written through to SQLite.
+
+    Only the settings a guild changed are stored; everything else comes
+    from ``defaults``. A guild's settings are read from disk the first time
+    the guild becomes available, so :meth:`get` is a dict lookup. Should it
+    be called for a guild that isn't loaded yet, it starts the load and
+    answers with the defaults until then.
+    """
+
+    def __init__(self, db: Database, defaults: GuildSettings = GuildSettings()) -> None:
+        self.db = db
+        self.defaults = defaults
+        self._cache: Dict[int, GuildSettings] = {}
+        self._loading: Dict[int, asyncio.Task[GuildSettings]] = {}
+
+    def __len__(self) -> int:
+        """Number of guilds whose settings are loaded."""
+        return len(self._cache)
+
+    async def start(self) -> None:
+        await self.db.executescript(SCHEMA)
+
+    def get(self, guild_id: int) -> GuildSettings:
+        settings = self._cache.get(guild_id)
+        if settings is None:
+            self._load_later(guild_id)
+            return self.defaults
+        return settings
+
+    def _load_later(self, guild_id: int) -> asyncio.Task[GuildSettings]:
+        task = self._loading.get(guild_id)
+        if task is None:
+            task = self._loading[guild_id] = asyncio.create_task(self._load(guild_id), name=f"settings-{guild_id}")
+            task.add_done_callback(lambda _: self._loading.pop(guild_id, None))
+        return task
+
+    async def load(self, guild_id: int) -> GuildSettings:
+        """The settings of a guild, reading them from disk if they aren't loaded yet."""
+        settings = self._cache.get(guild_id)
+        if settings is not None:
+            return settings
+        return await asyncio.shield(self._load_later(guild_id))
+
+    async def _load(self, guild_id: int) -> GuildSettings:
+        rows = await self.db.fetchall("SELECT name, value FROM guild_settings WHERE guild_id = ?", (guild_id,))
+        changes: Dict[str, Any] = {}
+        for name, value in rows:
+            if name in GuildSettings._fields:
+                changes[name] = json.loads(value)
+            else:
+                log.debug(f"Ignoring unknown setting {name!r} of guild {guild_id}")
+        # Guilds on the defaults share one instance.
+        settings = self.defaults._replace(**changes) if changes else self.defaults
+        return self._cache.setdefault(guild_id, settings)
+
+    async def update(self, guild_id: int, **changes: Any) -> GuildSettings:
+        """Change settings of a guild, on disk and then in memory."""
+        unknown = set(changes) - set(GuildSettings._fields)
+        if unknown:
+            raise TypeError(f"Unknown settings: {', '.join(sorted(unknown))}")
+        await self.load(guild_id)
+        await self.db.executemany(
+            "INSERT OR REPLACE INTO guild_settings (guild_id, name, value) VALUES (?, ?, ?)",
+            [(guild_id, name, json.dumps(value)) for name, value in changes.items()]
+        )
+        # Re-read after the write so concurrent updates don't undo each other.
+        settings = self._cache[guild_id] = self._cache[guild_id]._replace(**changes)
+        return settings
+
+    async def reset(self, guild_id: int, *names: str) -> GuildSettings:
+        """Put settings of a guild back to the defaults, or all of them if none are named."""
+        names = names or GuildSettings._fields
+        unknown = set(names) - set(GuildSettings._fields)
+        if unknown:
+            raise TypeError(f"Unknown settings: {', '.join(sorted(unknown))}")
+        await self.load(guild_id)
+        await self.db.executemany(
+            "DELETE FROM guild_settings WHERE guild_id = ? AND name = ?",
+            [(guild_id, name) for name in names]
+        )
+        settings = self._cache[guild_id]._replace(**{name: getattr(self.defaults, name) for name in names})
+        self._cache[guild_id] = self.defaults if settings == self.defaults else settings
+        return self._cache[guild_id]
+
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        await self.load(guild.id)
+
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        await self.load(guild.id)
+
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self._cache.pop(guild.id, None)
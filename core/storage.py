@@ -0,0 +1,64 @@
+from __future__ import annotations
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, List, Optional, Sequence
+from logging import getLogger
+log = getLogger("Storage")
+
+
+__all__ = ("Database",)
+
+class Database:
+    """A single SQLite connection owned by one worker thread.
+
+    Every query runs on the worker, so callers on the event loop only ever
+    await a future and never block on disk.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    async def _run(self, func: Any, *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def executescript(self, script: str) -> None:
+        await self._run(lambda: self._connect().executescript(script))
+
+    async def execute(self, query: str, params: Sequence[Any] = ()) -> int:
+        """Run a single statement and return ``lastrowid``."""
+        return await self._run(lambda: self._connect().execute(query, params).lastrowid)
+
+    async def executemany(self, query: str, rows: Iterable[Sequence[Any]]) -> None:
+        def run() -> None:
+            conn = self._connect()
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany(query, rows)
+
+        await self._run(run)
+
+    async def fetchall(self, query: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return await self._run(lambda: self._connect().execute(query, params).fetchall())
+
+    async def fetchone(self, query: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        return await self._run(lambda: self._connect().execute(query, params).fetchone())
+
+    async def close(self) -> None:
+        def run() -> None:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        await self._run(run)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import asyncio
+import difflib
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Set
+import discord
+from discord import app_commands
+from logging import getLogger
+log = getLogger("Sync")
+
+
+__all__ = ("CommandSync",)
+
+# Next to main.py rather than in the working directory, so every way of
+# starting the bot shares it.
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".command_tree.json")
+
+
+class CommandSync:
+    """Syncs the command tree only when its serialized form changed.
+
+    The hash and payload of the last successful sync of each scope (global
+    or a guild id) are kept in a JSON file, and each scope is synced at
+    most once per process no matter how often shards reconnect.
+    """
+
+    def __init__(self, tree: app_commands.CommandTree, path: str = DEFAULT_PATH) -> None:
+        self.tree = tree
+        self.path = path
+        self._state: Optional[Dict[str, Dict[str, Any]]] = None
+        self._done: Set[str] = set()
+
+    def payload(self, guild: Optional[discord.abc.Snowflake] = None) -> List[Dict[str, Any]]:
+        commands = [command.to_dict(self.tree) for command in self.tree.get_commands(guild=guild)]
+        return sorted(commands, key=lambda c: (c.get("type", 1), c["name"]))
+
+    @staticmethod
+    def digest(payload: List[Dict[str, Any]]) -> str:
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._state is None:
+            try:
+                with open(self.path, encoding="utf-8") as fp:
+                    self._state = json.load(fp)
+            except FileNotFoundError:
+                self._state = {}
+            except ValueError:
+                log.warning(f"{self.path} is corrupt, the next sync will be a full one.")
+                self._state = {}
+        return self._state
+
+    def _save(self) -> None:
+        temp = f"{self.path}.tmp"
+        with open(temp, "w", encoding="utf-8") as fp:
+            json.dump(self._state, fp, indent=2, sort_keys=True)
+        os.replace(temp, self.path)
+
+    def diff(self, scope: str, payload: List[Dict[str, Any]]) -> str:
+        stored = self._load().get(scope, {}).get("commands", [])
+        return "".join(difflib.unified_diff(
+            json.dumps(stored, indent=2, sort_keys=True).splitlines(keepends=True),
+            json.dumps(payload, indent=2, sort_keys=True).splitlines(keepends=True),
+            fromfile=f"{scope} (last sync)",
+            tofile=f"{scope} (current)"
+        ))
+
+    async def sync(
+        self,
+        guild: Optional[discord.abc.Snowflake] = None, *,
+        dry_run: bool = False,
+        force: bool = False
+    ) -> Optional[int]:
+        """Sync one scope if needed, returning the number of synced commands.
+
+        Returns None when nothing was sent to Discord.
+        """
+        scope = "global" if guild is None else str(guild.id)
+        if scope in self._done:
+            return None
+        self._done.add(scope)
+
+        if guild is not None:
+            self.tree.copy_global_to(guild=guild)
+        payload = self.payload(guild)
+        digest = self.digest(payload)
+        state = self._load()
+
+        if dry_run:
+            diff = self.diff(scope, payload)
+            log.info(f"Dry run for {scope}:\n{diff}" if diff else f"Dry run for {scope}: no changes.")
+            return None
+
+        if not force and state.get(scope, {}).get("hash") == digest:
+            log.info(f"Command tree for {scope} is unchanged, skipping sync.")
+            return None
+
+        try:
+            synced = await self.tree.sync(guild=guild)
+        except Exception:
+            self._done.discard(scope)
+            raise
+        state[scope] = {"hash": digest, "commands": payload}
+        await asyncio.to_thread(self._save)
+        return len(synced)
@@ -0,0 +1,51 @@
+from __future__ import annotations
+import time
+from time import perf_counter
+from typing import TYPE_CHECKING
+import discord
+from discord import app_commands
+from .ratelimit import CommandRateLimited
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+
+__all__ = ("Tree",)
+
+
+class Tree(app_commands.CommandTree["Bot"]):
+    """Command tree that times every app command invocation.
+
+    The start time is stored in ``interaction.extras``; the latency is
+    recorded by :meth:`Bot.on_app_command_completion` on success and by
+    :meth:`on_error` on failure. Commands of deferred extensions load
+    their extension before being dispatched. Rate limits set with
+    :func:`rate_limit` are enforced before a command runs.
+    """
+
+    async def interaction_check(self, interaction: discord.Interaction["Bot"]) -> bool:
+        interaction.extras["started"] = perf_counter()
+        # Runs before the tree looks the command up. interaction.command is
+        # cached on first access, so it must not be read before this.
+        extension = interaction.client.deferred.get((interaction.data or {}).get("name"))
+        if extension is not None:
+            await interaction.client.load_deferred(extension)
+        command = interaction.command
+        if command is not None and interaction.type is discord.InteractionType.application_command:
+            retry_after = interaction.client.rate_limits.hit(interaction, command)
+            if retry_after:
+                raise CommandRateLimited(command.qualified_name, retry_after)
+        return True
+
+    async def on_error(
+        self,
+        interaction: discord.Interaction["Bot"],
+        error: app_commands.AppCommandError
+    ) -> None:
+        command = interaction.command.qualified_name if interaction.command else "unknown"
+        interaction.client.record_command(interaction, command, type(error).__name__)
+        if isinstance(error, CommandRateLimited):
+            retry_at = int(time.time() + error.retry_after) + 1
+            await interaction.client.error(f"Slow down, you can use /{error.command} again <t:{retry_at}:R>.", interaction)
+            return
+        await super().on_error(interaction, error)
@@ -1,12 +1,76 @@
 from __future__ import annotations
-import discord, asyncio
-from core import Bot
-from config import TOKEN
+import asyncio, logging, os, sys
+from core import (
+    Bot, ClusterClient, ClusterSupervisor, GuildSettings, fetch_shard_count, run_fake_worker, setup_logging
+)
+from config import (
+    CACHE_PROFILE, CLUSTER_SOCKET, CLUSTERS, DATABASE, DEFERRED_EXTENSIONS, JOIN_CHANNEL_ID, LOG_FILE, LOG_FORMAT, LOG_LEVEL,
+    LOG_SAMPLING, METRICS_PORT, RAID_ACTION, RAID_JOINS, RAID_WINDOW, RATE_LIMITS, SHARD_COUNT, TOKEN
+)
+
+
+async def supervise():
+    # -cluster-fake runs workers that never connect to Discord, for local testing.
+    fake = '-cluster-fake' in sys.argv
+    shard_count = SHARD_COUNT or (CLUSTERS * 2 if fake else await fetch_shard_count(TOKEN))
+    args = [arg for arg in sys.argv[1:] if arg != '-cluster']
+    supervisor = ClusterSupervisor(
+        [sys.executable, sys.argv[0], *args], shard_count, CLUSTERS, socket_path=CLUSTER_SOCKET
+    )
+    await supervisor.run()
+
+
+def start_logging(cluster: ClusterClient | None) -> logging.handlers.QueueListener:
+    path = LOG_FILE
+    fields = {}
+    if cluster is not None:
+        fields["cluster"] = cluster.cluster_id
+        if path is not None:
+            root, ext = os.path.splitext(path)
+            path = f"{root}-{cluster.cluster_id}{ext}"
+    return setup_logging(
+        level=logging.getLevelName(LOG_LEVEL), path=path, console=LOG_FORMAT, sampling=LOG_SAMPLING, fields=fields
+    )
 
 
 async def main():
-    discord.utils.setup_logging()
-    async with Bot() as bot:
+    cluster = ClusterClient.from_env()
+    listener = start_logging(cluster)
+    try:
+        await run(cluster)
+    finally:
+        listener.stop()
+
+
+async def run(cluster: ClusterClient | None):
+    if '-cluster' in sys.argv:
+        return await supervise()
+
+    database = DATABASE
+    metrics_port = METRICS_PORT
+    if cluster is not None:
+        if '-cluster-fake' in sys.argv:
+            return await run_fake_worker()
+        # Each cluster owns the guilds on its shards, so each gets its own database.
+        root, ext = os.path.splitext(DATABASE)
+        database = f"{root}-{cluster.cluster_id}{ext}"
+        if metrics_port is not None:
+            metrics_port += cluster.cluster_id
+
+    async with Bot(
+        database=database,
+        profile=CACHE_PROFILE,
+        cluster=cluster,
+        metrics_port=metrics_port,
+        deferred=DEFERRED_EXTENSIONS,
+        settings=GuildSettings(
+            join_channel_id=JOIN_CHANNEL_ID,
+            raid_joins=RAID_JOINS,
+            raid_window=RAID_WINDOW,
+            raid_action=RAID_ACTION
+        ),
+        rate_limits=RATE_LIMITS
+    ) as bot:
         await bot.start(TOKEN, reconnect=True)
         
     
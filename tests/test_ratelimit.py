@@ -0,0 +1,56 @@
+from unittest import mock
+from discord import app_commands
+from core.ratelimit import RateLimiter, rate_limit
+
+
+@app_commands.command(name="ping")
+@rate_limit(1000, 3600.0)
+async def ping(interaction):
+    pass
+
+
+@app_commands.command(name="pong")
+@rate_limit(1, 1.0)
+async def pong(interaction):
+    pass
+
+
+class FakeInteraction:
+    def __init__(self, user_id: int) -> None:
+        self.user = mock.Mock(id=user_id)
+        self.guild_id = 1
+        self.channel_id = 1
+
+
+def test_heap_has_one_entry_per_bucket():
+    limiter = RateLimiter(max_buckets=100)
+    now = 1000.0
+    with mock.patch("time.monotonic", lambda: now):
+        for _ in range(500):
+            assert limiter.hit(FakeInteraction(1), ping) == 0.0
+        for user_id in range(2, 100 + 50):
+            limiter.hit(FakeInteraction(user_id), ping)
+    assert len(limiter) == 100
+    assert len(limiter._expiries) <= limiter.max_buckets
+    assert limiter.evictions == 49
+
+
+def test_expired_buckets_behind_a_live_one_are_dropped():
+    limiter = RateLimiter()
+    now = 1000.0
+    with mock.patch("time.monotonic", lambda: now):
+        limiter.hit(FakeInteraction(1), ping)
+        for user_id in range(2, 1001):
+            limiter.hit(FakeInteraction(user_id), pong)
+        now += 2.0
+        limiter.hit(FakeInteraction(5000), pong)
+    assert len(limiter) == 2
+    assert len(limiter._expiries) == 2
+
+
+def test_rejects_past_the_rate():
+    limiter = RateLimiter()
+    now = 1000.0
+    with mock.patch("time.monotonic", lambda: now):
+        assert limiter.hit(FakeInteraction(1), pong) == 0.0
+        assert limiter.hit(FakeInteraction(1), pong) > 0.0
@@ -0,0 +1,18 @@
+from cogs.Automod.spam import SpamLimits, SpamTracker
+
+LIMITS = SpamLimits(messages=100, mentions=100, duplicates=3, window=60.0)
+
+
+def test_duplicates_allowed_up_to_the_limit():
+    tracker = SpamTracker()
+    for i in range(LIMITS.duplicates):
+        assert tracker.check(1, 1, "hello", 0, LIMITS, now=1000.0 + i) is None
+    assert tracker.check(1, 1, "hello", 0, LIMITS, now=1010.0) == "the same message more than 3 times"
+
+
+def test_different_message_resets_duplicates():
+    tracker = SpamTracker()
+    for i in range(LIMITS.duplicates):
+        tracker.check(1, 1, "hello", 0, LIMITS, now=1000.0 + i)
+    assert tracker.check(1, 1, "bye", 0, LIMITS, now=1010.0) is None
+    assert tracker.check(1, 1, "hello", 0, LIMITS, now=1011.0) is None